@@ -4,21 +4,11 @@ import json
 import argparse
 import time
 from pathlib import Path
-from dotenv import load_dotenv
-import google.generativeai as genai
 from PIL import Image
 from audit import ScanMonitor
-
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-
-if not api_key:
-    print("Error: GOOGLE_API_KEY not found in .env file.")
-    print("Please create a .env file with GOOGLE_API_KEY=your_key_here")
-    exit(1)
-
-genai.configure(api_key=api_key)
+from clients import get_model, configure_or_exit
+from budget import before_dispatch, BudgetExceeded
+from job_errors import JobCancelled
 
 # Initialize Model
 # Using gemini-3-flash-preview as requested for Harvester
@@ -33,8 +23,6 @@ def analyze_image(image_path, monitor=None):
         # Load image
         img = Image.open(image_path)
         
-        # Configure model
-        model = genai.GenerativeModel(MODEL_NAME)
         
         prompt = """
         You are an expert flipper. Analyze this image and text.
@@ -58,12 +46,15 @@ def analyze_image(image_path, monitor=None):
         }
         """
         
+        # Shared model handle (configured once per process); raises if the scan's budget is spent
+        model_name = before_dispatch(monitor, "analyze_images", MODEL_NAME, len(prompt))
+        model = get_model(model_name)
         response = model.generate_content([prompt, img])
         
         if monitor and response.usage_metadata:
              monitor.log_tokens(
                  "analyze_images", 
-                 MODEL_NAME, 
+                 model_name, 
                  response.usage_metadata.prompt_token_count, 
                  response.usage_metadata.candidates_token_count
              )
@@ -82,48 +73,24 @@ def analyze_image(image_path, monitor=None):
             print(f"Failed to parse JSON from AI response for {image_path}")
             return None
             
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error analyzing {image_path}: {e}")
         return None
 
-def main():
-    parser = argparse.ArgumentParser(description="Analyze Marketplace Listings with Gemini Vision")
-    parser.add_argument("--input-dir", required=True, help="Directory containing listings.json and images")
-    parser.add_argument("--scan-id", help="Scan ID for audit logging")
-    
-    args = parser.parse_args()
-    
-    # Support relative paths from default data dir if needed, but usually input-dir is passed full or relative to execution
-    input_dir = Path(args.input_dir)
-    
-    # If input_dir is just a name and not a path, check if it's in data/
-    if not input_dir.exists() and (Path("data") / input_dir).exists():
-        input_dir = Path("data") / input_dir
-        
-    listings_file = input_dir / "listings.json"
+def analyze_listings(listings, input_dir, monitor=None, cancel_event=None):
+    """
+    Stage API: runs the Harvester over the scraped listings and returns the enriched inventory.
+    Results are saved incrementally to market_inventory.json in input_dir so an interrupted
+    run resumes where it left off. Setting cancel_event (a threading.Event) stops the run
+    before the next listing with JobCancelled.
+    """
+    input_dir = Path(input_dir)
     output_file = input_dir / "market_inventory.json"
-    
-    if not listings_file.exists():
-        print(f"Error: {listings_file} not found.")
-        return
 
-    print(f"Loading listings from {listings_file}...")
-    with open(listings_file, "r", encoding="utf-8") as f:
-        listings = json.load(f)
-        
     print(f"Found {len(listings)} items. Starting analysis with {MODEL_NAME}...")
-    
-    monitor = None
-    if args.scan_id:
-        # Determine data_dir. Input dir is likely inside data/screenshots_...
-        # We can try to traverse up to find data dir, or assume standard structure.
-        # Deep dive uses passed data-dir. Analyze images just gets input-dir.
-        # Let's try to infer data_dir from input_dir parent.
-        # If input_dir is /app/data/screenshots_..., parent is /app/data.
-        data_dir = input_dir.parent
-        monitor = ScanMonitor(args.scan_id, data_dir=data_dir)
-        monitor.start_step("analyze_images")
-    
+
     analyzed_listings = []
     
     # Load existing if resuming
@@ -142,6 +109,8 @@ def main():
         for i, item in enumerate(listings):
             if item["id"] in processed_ids:
                 continue
+            if cancel_event is not None and cancel_event.is_set():
+                raise JobCancelled("Image analysis cancelled")
                 
             print(f"Processing {i+1}/{len(listings)}: {item.get('title', 'Unknown')} (ID: {item['id']})")
             
@@ -168,8 +137,11 @@ def main():
                 with open(output_file, "w", encoding="utf-8") as f:
                     json.dump(analyzed_listings, f, indent=2, ensure_ascii=False)
                 
-                # Rate limit politeness
-                time.sleep(1) 
+                # Rate limit politeness (cut short by a cancel)
+                if cancel_event is not None:
+                    cancel_event.wait(1)
+                else:
+                    time.sleep(1)
             else:
                 print("Skipping item due to analysis failure.")
     except KeyboardInterrupt:
@@ -177,12 +149,54 @@ def main():
         with open(output_file, "w", encoding="utf-8") as f:
             json.dump(analyzed_listings, f, indent=2, ensure_ascii=False)
         print("Progress saved. Exiting gracefully.")
+        raise
+
+    print(f"Analysis complete. Saved to {output_file}")
+    return analyzed_listings
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze Marketplace Listings with Gemini Vision")
+    parser.add_argument("--input-dir", required=True, help="Directory containing listings.json and images")
+    parser.add_argument("--scan-id", help="Scan ID for audit logging")
+    
+    args = parser.parse_args()
+    configure_or_exit()
+    
+    # Support relative paths from default data dir if needed, but usually input-dir is passed full or relative to execution
+    input_dir = Path(args.input_dir)
+    
+    # If input_dir is just a name and not a path, check if it's in data/
+    if not input_dir.exists() and (Path("data") / input_dir).exists():
+        input_dir = Path("data") / input_dir
+        
+    listings_file = input_dir / "listings.json"
+    
+    if not listings_file.exists():
+        print(f"Error: {listings_file} not found.")
+        return
+
+    print(f"Loading listings from {listings_file}...")
+    with open(listings_file, "r", encoding="utf-8") as f:
+        listings = json.load(f)
+    
+    monitor = None
+    if args.scan_id:
+        # Determine data_dir. Input dir is likely inside data/screenshots_...
+        # We can try to traverse up to find data dir, or assume standard structure.
+        # Deep dive uses passed data-dir. Analyze images just gets input-dir.
+        # Let's try to infer data_dir from input_dir parent.
+        # If input_dir is /app/data/screenshots_..., parent is /app/data.
+        data_dir = input_dir.parent
+        monitor = ScanMonitor(args.scan_id, data_dir=data_dir)
+        monitor.start_step("analyze_images")
+
+    try:
+        analyze_listings(listings, input_dir, monitor)
+    except KeyboardInterrupt:
         return
 
     if monitor:
         monitor.stop_step("analyze_images")
-        
-    print(f"Analysis complete. Saved to {output_file}")
 
 if __name__ == "__main__":
     main()
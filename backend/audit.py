@@ -1,26 +1,61 @@
 import time
 import json
 import os
+import threading
 from pathlib import Path
 from datetime import datetime
+from log_sink import log_record, process_log, PROCESS_LOG_JSONL
+from job_catalog import get_catalog
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: snapshot writes are still atomic, just not serialized across processes
+
+# Scan audit state.
+# The monitor keeps its state in memory and appends compact events (step start/stop,
+# token usage, field updates) to jobs/{scan_id}/events.jsonl. Every process working on
+# a scan appends to the same log (O_APPEND, one small line per event) and folds in
+# everyone's events before it writes, so concurrent token logs are never lost.
+# audit.json is a materialized snapshot of that log (with the byte offset it covers),
+# written atomically (tmp + rename) under a per-job file lock, so readers never see a
+# half-written file and a stale writer never overwrites a newer snapshot.
+# Each snapshot is also upserted into the job catalog (job_catalog.py) under the same lock.
+
+EVENTS_FILE = "events.jsonl"
+AUDIT_LOCK_FILE = ".audit.lock"
+# Token/step-start events refresh audit.json at most this often; stops, updates and finish always do
+SNAPSHOT_INTERVAL_SECONDS = 1.0
 
 class ScanMonitor:
-    def __init__(self, scan_id, data_dir="data", query=None, location=None, radius=None, min_listings=None, user_intent=None, source="manual"):
+    def __init__(self, scan_id, data_dir="data", query=None, location=None, radius=None, min_listings=None, user_intent=None, source="manual", schedule_id=None):
         self.scan_id = scan_id
         self.data_dir = Path(data_dir)
         # Reorganized structure: data/jobs/{scan_id}/
         self.job_dir = self.data_dir / "jobs" / scan_id
         self.job_dir.mkdir(parents=True, exist_ok=True)
-        
+
         self.log_file = self.job_dir / "audit.json"
         self.process_log_file = self.job_dir / "process.log"
-        
+        self.process_jsonl_file = self.job_dir / PROCESS_LOG_JSONL
+        self.events_file = self.job_dir / EVENTS_FILE
+        self.lock_file = self.job_dir / AUDIT_LOCK_FILE
+        # In-process pipeline stages share one monitor across threads/tasks
+        self._lock = threading.RLock()
+        # Spend governor (budget.ScanBudget), attached by the pipeline
+        self.budget = None
+        # Bytes of events.jsonl folded into self.data
+        self._offset = 0
+        self._last_snapshot = 0.0
+
         # Initialize Process Logger
         self._setup_logging()
-        
-        self.data = {
+
+        self.data = {}
+        self._initial = {
             "scan_id": scan_id,
             "source": source,
+            "schedule_id": schedule_id,
             "query": query,
             "location": location,
             "radius": radius,
@@ -34,17 +69,20 @@ class ScanMonitor:
             "steps": {},
             "job_dir": str(self.job_dir)
         }
-        
+
         # Pricing (USD per 1M tokens)
         self.PRICING = {
             "gemini-1.5-flash": {"input": 0.35, "output": 1.05}, # Updated Flash Pricing
             "gemini-1.5-pro": {"input": 3.50, "output": 10.50},  # Updated Pro Pricing
             "gemini-2.0-flash": {"input": 0.10, "output": 0.40}, # 2.0 Flash Preview estimate
+            "gemini-3-flash-preview": {"input": 0.50, "output": 3.00}, # 3 Flash Preview (Harvester / pre-screen)
             "gemini-3-pro-preview": {"input": 2.00, "output": 12.00} # Placeholder for 3-pro if used (using Pro rates)
         }
-        
-        # Load existing if available (for subprocesses appending)
+
+        # Load existing state (snapshot + newer events); a new scan records its initial fields
         self.load()
+        if not self.data:
+            self._append({"t": "init", "data": self._initial}, snapshot=True)
 
     def _setup_logging(self):
         # Configure a specific logger for this scan to write to process.log
@@ -53,93 +91,174 @@ class ScanMonitor:
         if not self.process_log_file.exists():
             self.process_log_file.touch()
 
-    def log_process(self, message: str):
-        """Append a message to the process.log file."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        with open(self.process_log_file, "a") as f:
-            f.write(f"[{timestamp}] {message}\n")
+    def log_process(self, message: str, level=None, stage=None):
+        """
+        Queue a message for process.log (text) and process.jsonl (level + stage).
+        Buffered; written by the log sink's background thread.
+        """
+        log_record(self.process_log_file, self.process_jsonl_file, message, level, stage)
+
+    def flush_logs(self):
+        process_log.flush([self.process_log_file, self.process_jsonl_file])
+
+    # --- Event log ---
+
+    def _apply(self, event):
+        kind = event["t"]
+        data = self.data
+        if kind == "init":
+            # First writer wins if two processes create the same scan at once
+            if not data:
+                data.update(json.loads(json.dumps(event["data"])))
+            return
+        if not data:
+            data.update(json.loads(json.dumps(self._initial)))
+
+        if kind == "set":
+            data.update(event["fields"])
+        elif kind == "start":
+            step = data["steps"].setdefault(event["step"], {
+                "start_time": event["ts"],
+                "duration_seconds": 0.0,
+                "tokens": {"input": 0, "output": 0},
+                "cost_usd": 0.0
+            })
+            step["start_time"] = event["ts"]
+        elif kind == "stop":
+            step = data["steps"].get(event["step"])
+            if step and step.get("start_time"):
+                duration = (datetime.fromisoformat(event["ts"]) - datetime.fromisoformat(step["start_time"])).total_seconds()
+                step["duration_seconds"] += duration
+                # Accumulate if step runs multiple times (e.g. per item deep dive)
+        elif kind == "tokens":
+            step = data["steps"].setdefault(event["step"], {
+                "start_time": event["ts"],
+                "duration_seconds": 0.0,
+                "tokens": {"input": 0, "output": 0},
+                "cost_usd": 0.0
+            })
+            # Update Step Tokens
+            step["tokens"]["input"] += event["in"]
+            step["tokens"]["output"] += event["out"]
+            step["cost_usd"] += event["cost"]
+            # Update Totals
+            data["total_tokens"]["input"] += event["in"]
+            data["total_tokens"]["output"] += event["out"]
+            data["total_cost_usd"] += event["cost"]
+        elif kind == "finish":
+            data["end_time"] = event["ts"]
+            start = datetime.fromisoformat(data["start_time"])
+            data["total_duration_seconds"] = (datetime.fromisoformat(event["ts"]) - start).total_seconds()
+            # e.g. "cancelled" or "failed"; a clean finish replaces "running"
+            data["status"] = event.get("status") or "complete"
+
+    def _catch_up(self):
+        """Folds events appended since our offset (by any process) into self.data."""
+        try:
+            with open(self.events_file, "rb") as f:
+                f.seek(self._offset)
+                chunk = f.read()
+        except FileNotFoundError:
+            return
+        # Only whole lines; a line still being written is picked up next time
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if line.strip():
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    pass # Torn/foreign line, skip it
+        self._offset += end
+
+    def _append(self, event, snapshot=False):
+        line = json.dumps(event, separators=(",", ":")) + "\n"
+        with self._lock:
+            # O_APPEND: each event lands whole at the end, whatever other processes are doing
+            with open(self.events_file, "ab") as f:
+                f.write(line.encode("utf-8"))
+            self._catch_up()
+            if snapshot or time.monotonic() - self._last_snapshot >= SNAPSHOT_INTERVAL_SECONDS:
+                self.save()
+
+    # --- State ---
 
     def load(self):
-        if self.log_file.exists():
-            try:
-                with open(self.log_file, "r") as f:
-                    self.data = json.load(f)
-            except:
-                pass # Start fresh if error
+        """Loads the audit.json snapshot (first time only) and folds in newer events."""
+        with self._lock:
+            if not self.data and self.log_file.exists():
+                try:
+                    with open(self.log_file, "r") as f:
+                        snapshot = json.load(f)
+                    self._offset = snapshot.pop("events_offset", 0)
+                    self.data = snapshot
+                except:
+                    pass # Rebuild from the event log
+            self._catch_up()
 
     def load_from_disk(self):
         self.load()
 
     def save(self):
-        with open(self.log_file, "w") as f:
-            json.dump(self.data, f, indent=2)
+        """Writes the audit.json snapshot atomically, serialized across processes."""
+        with self._lock:
+            lock = open(self.lock_file, "a")
+            try:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                # Under the lock: include every event written so far, so the newest snapshot wins
+                self._catch_up()
+                snapshot = dict(self.data, events_offset=self._offset)
+                tmp = self.log_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "w") as f:
+                    json.dump(snapshot, f, indent=2)
+                os.replace(tmp, self.log_file)
+                self._last_snapshot = time.monotonic()
+                try:
+                    get_catalog(self.data_dir).upsert(snapshot)
+                except Exception as e:
+                    print(f"[!] Could not update job catalog for {self.scan_id}: {e}")
+            finally:
+                lock.close() # Releases the flock
+
+    def update(self, **fields):
+        """Sets top-level audit fields (output_dir, status, budget, ...)."""
+        self._append({"t": "set", "fields": fields}, snapshot=True)
 
     def start_step(self, step_name):
-        self.load() # Reload latest state
-        if step_name not in self.data["steps"]:
-            self.data["steps"][step_name] = {
-                "start_time": datetime.now().isoformat(),
-                "duration_seconds": 0.0,
-                "tokens": {"input": 0, "output": 0},
-                "cost_usd": 0.0
-            }
-        else:
-            self.data["steps"][step_name]["start_time"] = datetime.now().isoformat()
-        self.save()
+        self._append({"t": "start", "step": step_name, "ts": datetime.now().isoformat()})
 
     def stop_step(self, step_name):
-        self.load() # Reload latest state
-        if step_name in self.data["steps"]:
-            start_str = self.data["steps"][step_name].get("start_time")
-            if start_str:
-                start_dt = datetime.fromisoformat(start_str)
-                duration = (datetime.now() - start_dt).total_seconds()
-                self.data["steps"][step_name]["duration_seconds"] += duration 
-                # Accumulate if step runs multiple times (e.g. per item deep dive)
-        self.save()
+        self._append({"t": "stop", "step": step_name, "ts": datetime.now().isoformat()}, snapshot=True)
 
     def log_tokens(self, step_name, model_name, input_t, output_t):
-        self.load() # Reload latest state
-        if step_name not in self.data["steps"]:
-            self.start_step(step_name) # Ensure step exists (via self call which saves, but we reload/save again here which is safe)
-            
-        # Update Step Tokens
-        self.data["steps"][step_name]["tokens"]["input"] += input_t
-        self.data["steps"][step_name]["tokens"]["output"] += output_t
-        
-        # Calculate Step Cost
+        # Cost is fixed when logged, so replaying the log never depends on current pricing
         cost = self._calculate_cost(model_name, input_t, output_t)
-        self.data["steps"][step_name]["cost_usd"] += cost
-        
-        # Update Totals
-        self.data["total_tokens"]["input"] += input_t
-        self.data["total_tokens"]["output"] += output_t
-        self.data["total_cost_usd"] += cost
-        
-        self.save()
-        
+        self._append({
+            "t": "tokens", "step": step_name, "model": model_name,
+            "in": input_t, "out": output_t, "cost": cost,
+            "ts": datetime.now().isoformat()
+        })
+
     def _calculate_cost(self, model_name, input_t, output_t):
         # Normalize model name to finding pricing key
         pricing_key = "gemini-1.5-flash" # Default low
-        
+
         for key in self.PRICING:
             if key in model_name.lower():
                 pricing_key = key
                 break
-                
+
         rates = self.PRICING.get(pricing_key, self.PRICING["gemini-1.5-flash"])
-        
+
         input_cost = (input_t / 1_000_000) * rates["input"]
         output_cost = (output_t / 1_000_000) * rates["output"]
-        
+
         return input_cost + output_cost
 
-    def finish_scan(self):
-        self.load() # Reload latest state
-        self.data["end_time"] = datetime.now().isoformat()
-        start = datetime.fromisoformat(self.data["start_time"])
-        self.data["total_duration_seconds"] = (datetime.now() - start).total_seconds()
-        self.save()
-        
+    def finish_scan(self, status=None):
+        # Log first: once audit.json shows the finish, readers (the SSE stream) expect the full log
         self.log_process("Scan finished. Audit log saved.")
+        self.flush_logs()
+        self._append({"t": "finish", "ts": datetime.now().isoformat(), "status": status}, snapshot=True)
+
         print(f"Audit log saved to {self.log_file}")
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import argparse
+import threading
+from pathlib import Path
+
+from config import DATA_DIR
+
+# Content-addressed screenshot store (DATA_DIR/blobs/ab/cd/<sha256>.png).
+# Each scan still writes item_{id}.png / deep_dive_{id}_*.png into its screenshots_* dir,
+# so the scraper, analysis, deep dive, email and /data URLs are unchanged. When a stage
+# completes, its screenshots are interned: hashed, stored once in the blob store, and the
+# scan's copy replaced by a hard link to that blob. The same listing photographed by
+# hourly scans then takes the disk space of one image.
+#
+# A blob's reference count is its hard link count: one link in the store plus one per scan
+# file using it. Each scan dir has a manifest (blobs.json: file -> item id, sha256, size),
+# so deleting a scan only checks the blobs it lists (blob_store.release), not the store.
+# Where hard links aren't available (another filesystem), scan files stay plain copies.
+#
+#   python blob_store.py --intern-all   # dedupe existing scans
+#   python blob_store.py --gc           # sweep unreferenced blobs
+#   python blob_store.py --stats
+
+BLOB_DIR = Path(DATA_DIR) / "blobs"
+MANIFEST_FILE = "blobs.json"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp"}
+
+ITEM_ID_PATTERN = re.compile(r"^(?:item|deep_dive)_([^_.]+)")
+
+_manifest_lock = threading.Lock()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def blob_path(sha, suffix, blob_dir=BLOB_DIR):
+    return Path(blob_dir) / sha[:2] / sha[2:4] / f"{sha}{suffix}"
+
+def load_manifest(output_dir):
+    try:
+        with open(Path(output_dir) / MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+
+def save_manifest(output_dir, manifest):
+    path = Path(output_dir) / MANIFEST_FILE
+    tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+def link_into(target, path):
+    """Atomically replaces path with a hard link to target."""
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.link")
+    os.link(target, tmp)
+    os.replace(tmp, path)
+
+def link_or_copy(src, dest):
+    # Hard links share the screenshots without doubling disk use; copy across filesystems
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+def unshare_for_write(path):
+    """
+    Call before (re)writing a scan file in place. An interned file is a hard link to a
+    shared blob; truncating it would corrupt every scan using that blob. Unlinking first
+    makes the write create a new file, which the next intern_dir picks up again.
+    """
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def is_interned(path, entry, blob_dir=BLOB_DIR):
+    """True if the scan file is still the hard link to the blob its manifest entry names."""
+    try:
+        return os.path.samestat(path.stat(), blob_path(entry["sha256"], path.suffix.lower(), blob_dir).stat())
+    except FileNotFoundError:
+        return False
+
+def intern_file(path, blob_dir=BLOB_DIR):
+    """
+    Stores one screenshot in the blob store and links the scan's file to it.
+    Returns (sha256, size, deduplicated: bool).
+    """
+    path = Path(path)
+    sha = file_sha256(path)
+    blob = blob_path(sha, path.suffix.lower(), blob_dir)
+    blob.parent.mkdir(parents=True, exist_ok=True)
+    for _ in range(3):
+        try:
+            # First copy of this content: the scan file itself becomes the blob
+            os.link(path, blob)
+            return sha, path.stat().st_size, False
+        except FileExistsError:
+            pass
+        try:
+            if os.path.samestat(blob.stat(), path.stat()):
+                return sha, path.stat().st_size, False # Already linked (re-intern)
+            link_into(blob, path)
+            return sha, path.stat().st_size, True
+        except FileNotFoundError:
+            continue # Blob was just collected by a concurrent release; store it again
+    raise OSError(f"Could not intern {path}")
+
+def intern_dir(output_dir, blob_dir=BLOB_DIR):
+    """
+    Interns every screenshot in a scan's output dir not yet in its manifest, and re-interns
+    files rewritten since (no longer linked to their recorded blob).
+    Returns (files interned, bytes saved by deduplication).
+    """
+    output_dir = Path(output_dir)
+    if not output_dir.exists():
+        return 0, 0
+    with _manifest_lock:
+        manifest = load_manifest(output_dir)
+        files = manifest.setdefault("files", {})
+        count = saved = 0
+        for path in sorted(output_dir.iterdir()):
+            if path.suffix.lower() not in IMAGE_SUFFIXES or not path.is_file():
+                continue
+            previous = files.get(path.name)
+            if previous and is_interned(path, previous, blob_dir):
+                continue
+            try:
+                sha, size, deduplicated = intern_file(path, blob_dir)
+            except OSError as e:
+                # No hard links here (e.g. another filesystem): keep the scan's own copy
+                print(f"[!] Could not intern {path.name}: {e}")
+                continue
+            match = ITEM_ID_PATTERN.match(path.name)
+            files[path.name] = {"item_id": match.group(1) if match else None, "sha256": sha, "size": size}
+            if previous:
+                # Rewritten file: drop the old blob if this scan was its last user
+                release({"files": {path.name: previous}}, blob_dir)
+            count += 1
+            saved += size if deduplicated else 0
+        if count:
+            save_manifest(output_dir, manifest)
+    return count, saved
+
+def release(manifest, blob_dir=BLOB_DIR):
+    """
+    After a scan's files are deleted: removes the blobs in its manifest that no other scan
+    links to (link count 1 = only the store's own link). O(manifest). Returns bytes freed.
+    """
+    freed = 0
+    for name, entry in manifest.get("files", {}).items():
+        blob = blob_path(entry["sha256"], Path(name).suffix.lower(), blob_dir)
+        try:
+            st = blob.stat()
+            if st.st_nlink <= 1:
+                blob.unlink()
+                freed += st.st_size
+        except FileNotFoundError:
+            pass
+    return freed
+
+def delete_output_dir(output_dir, blob_dir=BLOB_DIR):
+    """Deletes a scan's screenshots dir and releases its blobs. Returns bytes freed from the store."""
+    output_dir = Path(output_dir)
+    manifest = load_manifest(output_dir)
+    shutil.rmtree(output_dir)
+    return release(manifest, blob_dir)
+
+def gc(blob_dir=BLOB_DIR):
+    """Full sweep: removes every blob no scan links to. Returns (blobs removed, bytes freed)."""
+    removed = freed = 0
+    for blob in Path(blob_dir).glob("*/*/*"):
+        try:
+            st = blob.stat()
+            if st.st_nlink <= 1:
+                blob.unlink()
+                removed += 1
+                freed += st.st_size
+        except FileNotFoundError:
+            pass
+    return removed, freed
+
+def stats(blob_dir=BLOB_DIR):
+    blobs = size = references = 0
+    for blob in Path(blob_dir).glob("*/*/*"):
+        try:
+            st = blob.stat()
+        except FileNotFoundError:
+            continue
+        blobs += 1
+        size += st.st_size
+        references += st.st_nlink - 1
+    return {"blobs": blobs, "bytes": size, "references": references}
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed screenshot store")
+    parser.add_argument("--intern-all", action="store_true", help="Intern the screenshots of every existing scan")
+    parser.add_argument("--gc", action="store_true", help="Remove blobs no scan references")
+    parser.add_argument("--stats", action="store_true", help="Blob count, size and references")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"Data directory (default: {DATA_DIR})")
+    args = parser.parse_args()
+
+    blob_dir = Path(args.data_dir) / "blobs"
+    if args.intern_all:
+        total = saved = 0
+        for output_dir in sorted(Path(args.data_dir).glob("screenshots_*")):
+            count, dir_saved = intern_dir(output_dir, blob_dir)
+            total += count
+            saved += dir_saved
+        print(f"Interned {total} screenshots, {saved / 1024 / 1024:.1f} MB deduplicated")
+    if args.gc:
+        removed, freed = gc(blob_dir)
+        print(f"Removed {removed} unreferenced blobs ({freed / 1024 / 1024:.1f} MB)")
+    if args.stats or not (args.intern_all or args.gc):
+        s = stats(blob_dir)
+        print(f"{s['blobs']} blobs, {s['bytes'] / 1024 / 1024:.1f} MB, {s['references']} scan references")
+
+if __name__ == "__main__":
+    main()
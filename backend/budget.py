@@ -0,0 +1,153 @@
+import os
+import threading
+from datetime import datetime
+
+# Per-scan spend governor.
+# ScanMonitor.log_tokens records spend after each call; this checks it *before* every
+# model dispatch (and at stage boundaries) against token, USD and wall-clock limits.
+# Limits are global (env) and can be overridden per schedule (params["budget"]).
+# As a scan nears its tightest limit it degrades, and it aborts once a limit is hit:
+#   BUDGET_DEGRADE_AT         Pro calls switch to Flash, the ranker's inventory batch is trimmed
+#   BUDGET_SKIP_DEEP_DIVE_AT  remaining deep dive candidates are skipped
+#   1.0                       BudgetExceeded - the scan stops and the reason goes into audit.json
+
+SCAN_MAX_TOKENS = int(os.getenv("SCAN_MAX_TOKENS", "0"))          # 0 = unlimited
+SCAN_MAX_COST_USD = float(os.getenv("SCAN_MAX_COST_USD", "0"))    # 0 = unlimited
+SCAN_MAX_MINUTES = float(os.getenv("SCAN_MAX_MINUTES", "0"))      # 0 = unlimited
+BUDGET_DEGRADE_AT = float(os.getenv("BUDGET_DEGRADE_AT", "0.7"))
+BUDGET_SKIP_DEEP_DIVE_AT = float(os.getenv("BUDGET_SKIP_DEEP_DIVE_AT", "0.9"))
+
+# Cheaper model used in place of Pro once degraded
+DEGRADED_MODEL = "gemini-3-flash-preview"
+# Most inventory items sent to the ranker once degraded (highest deal_rating first)
+DEGRADED_RANK_MAX_ITEMS = int(os.getenv("DEGRADED_RANK_MAX_ITEMS", "40"))
+
+# Rough chars-per-token ratio, for estimating a prompt before it is sent
+CHARS_PER_TOKEN = 4
+
+class BudgetExceeded(Exception):
+    pass
+
+class ScanBudget:
+    """
+    Limits for one scan, read against its ScanMonitor totals. Wall-clock time counts
+    from when this run started (a resumed scan gets a fresh clock, not a fresh spend).
+    """
+    def __init__(self, monitor, max_tokens=SCAN_MAX_TOKENS, max_cost_usd=SCAN_MAX_COST_USD, max_minutes=SCAN_MAX_MINUTES):
+        self.monitor = monitor
+        self.limits = {"tokens": max_tokens or 0, "cost_usd": max_cost_usd or 0, "minutes": max_minutes or 0}
+        self.started_at = datetime.now()
+        self.actions = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_params(cls, monitor, params):
+        """Global limits, overridden by any non-null per-schedule limits in params["budget"]."""
+        overrides = params.get("budget") or {}
+        return cls(
+            monitor,
+            max_tokens=overrides.get("max_tokens") or SCAN_MAX_TOKENS,
+            max_cost_usd=overrides.get("max_cost_usd") or SCAN_MAX_COST_USD,
+            max_minutes=overrides.get("max_minutes") or SCAN_MAX_MINUTES
+        )
+
+    def enabled(self):
+        return any(self.limits.values())
+
+    def usage(self, extra_tokens=0):
+        with self.monitor._lock:
+            tokens = self.monitor.data["total_tokens"]["input"] + self.monitor.data["total_tokens"]["output"]
+            cost = self.monitor.data.get("total_cost_usd", 0.0)
+        return {
+            "tokens": tokens + extra_tokens,
+            # Estimated tokens are priced as input at the most expensive rate we use
+            "cost_usd": cost + extra_tokens / 1_000_000 * self.monitor.PRICING["gemini-3-pro-preview"]["input"],
+            "minutes": (datetime.now() - self.started_at).total_seconds() / 60
+        }
+
+    def fraction(self, extra_tokens=0):
+        """Returns (fraction of the tightest limit used, that limit's name)."""
+        usage = self.usage(extra_tokens)
+        worst = (0.0, None)
+        for name, limit in self.limits.items():
+            if limit and usage[name] / limit > worst[0]:
+                worst = (usage[name] / limit, name)
+        return worst
+
+    def check(self, step, extra_tokens=0):
+        """Raises BudgetExceeded if a limit is (or would be) hit. Returns the fraction used."""
+        fraction, name = self.fraction(extra_tokens)
+        if fraction >= 1:
+            usage = self.usage(extra_tokens)
+            reason = f"{name} budget {self.limits[name]:g} exceeded before {step} (at {usage[name]:.4g})"
+            self.record("exceeded", reason)
+            raise BudgetExceeded(reason)
+        return fraction
+
+    def degrade(self, action):
+        """Records a degradation step (once each) in process.log and audit.json."""
+        with self._lock:
+            if action in self.actions:
+                return
+            self.actions.append(action)
+        self.monitor.log_process(f"Budget: {action}")
+        self.record("degraded")
+
+    def record(self, status, reason=None):
+        self.monitor.update(budget={
+            "status": status,
+            "limits": self.limits,
+            "usage": self.usage(),
+            "actions": list(self.actions),
+            "reason": reason
+        })
+
+def scan_budget(monitor):
+    budget = getattr(monitor, "budget", None) if monitor else None
+    return budget if budget and budget.enabled() else None
+
+def check(monitor, step):
+    """Stage boundary / wall-clock check. Raises BudgetExceeded."""
+    budget = scan_budget(monitor)
+    if budget:
+        budget.check(step)
+
+def before_dispatch(monitor, step, model_name, prompt_chars=0):
+    """
+    Call before every model request. Raises BudgetExceeded if the request would exceed
+    the scan's budget; returns the model to use (Flash in place of Pro once degraded).
+    """
+    budget = scan_budget(monitor)
+    if not budget:
+        return model_name
+    fraction = budget.check(step, prompt_chars // CHARS_PER_TOKEN)
+    if fraction >= BUDGET_DEGRADE_AT and model_name != DEGRADED_MODEL:
+        budget.degrade(f"{step} switched from {model_name} to {DEGRADED_MODEL}")
+        return DEGRADED_MODEL
+    return model_name
+
+def shrink_batch(monitor, step, items, prompt_chars, rank_key):
+    """
+    Trims a batch (e.g. the ranker's inventory) to its DEGRADED_RANK_MAX_ITEMS best items
+    by rank_key when sending it whole would push the scan past BUDGET_DEGRADE_AT.
+    """
+    budget = scan_budget(monitor)
+    if not budget or len(items) <= DEGRADED_RANK_MAX_ITEMS:
+        return items
+    fraction, _ = budget.fraction(prompt_chars // CHARS_PER_TOKEN)
+    if fraction < BUDGET_DEGRADE_AT:
+        return items
+    kept = sorted(items, key=rank_key, reverse=True)[:DEGRADED_RANK_MAX_ITEMS]
+    budget.degrade(f"{step} batch trimmed from {len(items)} to {len(kept)} items")
+    return kept
+
+def skip_reason(monitor, step):
+    """Returns why optional work (deep dive candidates) should be skipped, or None."""
+    budget = scan_budget(monitor)
+    if not budget:
+        return None
+    fraction, name = budget.fraction()
+    if fraction >= BUDGET_SKIP_DEEP_DIVE_AT:
+        budget.degrade(f"{step} skipped remaining candidates")
+        return f"Scan {name} budget {fraction:.0%} used"
+    return None
@@ -0,0 +1,47 @@
+import os
+from pathlib import Path
+from dotenv import load_dotenv
+import google.generativeai as genai
+
+# Shared Gemini client setup.
+# Stages import this instead of each running load_dotenv/genai.configure on import,
+# so an in-process pipeline configures the SDK once and reuses model handles.
+
+load_dotenv()
+# Also pick up the project root .env when running from backend/
+load_dotenv(dotenv_path=Path(__file__).parent.parent / ".env")
+
+_configured = False
+_models = {}
+
+def configure_genai():
+    """
+    Configures the Gemini SDK once per process.
+    Raises RuntimeError if GOOGLE_API_KEY is missing.
+    """
+    global _configured
+    if _configured:
+        return
+
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise RuntimeError("GOOGLE_API_KEY not found in .env file.")
+
+    genai.configure(api_key=api_key)
+    _configured = True
+
+def get_model(model_name):
+    """Returns a cached GenerativeModel handle for model_name."""
+    configure_genai()
+    if model_name not in _models:
+        _models[model_name] = genai.GenerativeModel(model_name)
+    return _models[model_name]
+
+def configure_or_exit():
+    """CLI entry points: print the usual hint and exit if the API key is missing."""
+    try:
+        configure_genai()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        print("Please create a .env file with GOOGLE_API_KEY=your_key_here")
+        exit(1)
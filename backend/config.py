@@ -0,0 +1,51 @@
+import os
+from pathlib import Path
+
+# Shared path configuration for the API server, scheduler and pipeline.
+# main.py and scheduler.py used to resolve these separately and had drifted
+# (different auth.json locations, settings.json read from backend/data).
+
+# Determine data directory
+# DATA_DIR env wins (shared mount for worker nodes)
+# Default to /app/data (Docker)
+# Fallback 1: ./data (Local backend relative)
+# Fallback 2: ../data (Local project root relative)
+if os.getenv("DATA_DIR"):
+    DATA_DIR = os.getenv("DATA_DIR")
+elif os.path.exists("/.dockerenv"):
+    DATA_DIR = "/app/data"
+else:
+    # Try backend-relative first
+    backend_data = Path(__file__).parent / "data"
+    # Try project-root relative
+    project_data = Path(__file__).parent.parent / "data"
+
+    # Priority: Project Root Data > Backend Data
+    if project_data.exists():
+        DATA_DIR = str(project_data)
+    elif backend_data.exists():
+        DATA_DIR = str(backend_data)
+    else:
+        # Default to project root and create it
+        DATA_DIR = str(project_data)
+
+# Determine auth file path
+if os.getenv("AUTH_FILE"):
+    AUTH_FILE = os.getenv("AUTH_FILE")
+elif os.path.exists("/.dockerenv"):
+    AUTH_FILE = "/app/auth.json"
+else:
+    # Try backend-relative first (if moved to backend)
+    backend_auth = Path(__file__).parent / "auth.json"
+    # Try project-root relative (usual location)
+    project_auth = Path(__file__).parent.parent / "auth.json"
+
+    if project_auth.exists():
+        AUTH_FILE = str(project_auth)
+    elif backend_auth.exists():
+        AUTH_FILE = str(backend_auth)
+    else:
+        # Default fallback
+        AUTH_FILE = str(project_auth)
+
+SETTINGS_FILE = Path(DATA_DIR) / "settings.json"
@@ -4,30 +4,424 @@ import json
 import argparse
 import time
 import asyncio
+import threading
 from pathlib import Path
-from dotenv import load_dotenv
-import google.generativeai as genai
 from playwright.async_api import async_playwright
 import base64
+import hashlib
+from datetime import datetime, timedelta
 from audit import ScanMonitor
-
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-
-if not api_key:
-    print("Error: GOOGLE_API_KEY not found in .env file.")
-    exit(1)
-
-genai.configure(api_key=api_key)
+from clients import get_model, configure_or_exit
+from budget import before_dispatch, skip_reason, BudgetExceeded
+from blob_store import link_or_copy, unshare_for_write
 
 # Initialize The Judge Model
 # User requested gemini-3-pro or 1.5-pro fallback. 
 # Trying 3-pro first as requested for the Ranker previously.
-MODEL_NAME = "gemini-3-pro-preview" 
+MODEL_NAME = "gemini-3-pro-preview"
 
 import re
 
+# Max characters of listing text embedded in the Auditor prompt.
+# The full page text is written to disk next to the screenshots instead.
+DESCRIPTION_CHAR_BUDGET = int(os.getenv("DEEP_DIVE_DESCRIPTION_BUDGET", "3000"))
+
+# Cheap text-only screener used before escalating to the Pro auditor
+PRESCREEN_MODEL_NAME = "gemini-3-flash-preview"
+
+# Persisted verdicts for listings that were already audited (keyed by item id)
+VERDICT_CACHE_FILE = "deep_dive_cache.json"
+VERDICT_CACHE_TTL_HOURS = float(os.getenv("DEEP_DIVE_CACHE_TTL_HOURS", "24"))
+
+# Verdict fields worth replaying on a cache hit
+CACHED_FIELDS = ("verdict", "rejection_reason", "visual_confirmation", "verification_tier")
+
+# Per-scan deep dive budgets (0 = unlimited). Checked before each candidate.
+DEEP_DIVE_TARGET_STEALS = int(os.getenv("DEEP_DIVE_TARGET_STEALS", "0"))
+DEEP_DIVE_MAX_SCAN_COST_USD = float(os.getenv("DEEP_DIVE_MAX_SCAN_COST_USD", "0"))
+DEEP_DIVE_MAX_SCAN_MINUTES = float(os.getenv("DEEP_DIVE_MAX_SCAN_MINUTES", "0"))
+
+# Speculative mode: verify Harvester picks at/above this deal_rating while ranking is still running
+SPECULATIVE_RATING_THRESHOLD = float(os.getenv("SPECULATIVE_RATING_THRESHOLD", "9"))
+SPECULATIVE_VERDICTS_FILE = "speculative_verdicts.json"
+
+CONFIDENCE_WEIGHTS = {"high": 1.0, "medium": 0.6, "low": 0.3}
+
+# Rough chars-per-token ratio for Gemini on English text (used for savings estimates only)
+CHARS_PER_TOKEN = 4
+
+# Facebook UI chrome that shows up in inner_text but carries no listing information
+NOISE_LINES = {
+    "message", "save", "share", "send", "see more", "see less", "read more",
+    "send seller a message", "hi, is this available?", "is this still available?",
+    "seller details", "marketplace", "buy and sell groups", "see all",
+    "follow", "report", "view map", "sponsored", "create new listing",
+}
+
+# Headings after which the rest of the page is recommendations/ads/comments
+STOP_MARKERS = (
+    "today's picks", "related listings", "similar items", "sponsored",
+    "more from this seller", "suggested for you", "people also viewed",
+)
+
+def extract_listing_sections(raw_text, title=None):
+    """
+    Splits the listing page text into the blocks the Auditor actually needs:
+    header metadata (title/price/listed date), condition, seller description,
+    location and seller info. Navigation, chat widgets and recommendation
+    feeds are dropped.
+    """
+    lines = [l.strip() for l in (raw_text or "").splitlines()]
+    lines = [l for l in lines if l]
+
+    # Cut everything after the first recommendation/ads heading
+    for i, line in enumerate(lines):
+        if line.lower() in STOP_MARKERS:
+            lines = lines[:i]
+            break
+
+    # Start at the listing title if we can find it (skips left nav / breadcrumbs)
+    if title:
+        for i, line in enumerate(lines):
+            if line.lower() == str(title).strip().lower():
+                lines = lines[i:]
+                break
+
+    lines = [l for l in lines if l.lower() not in NOISE_LINES]
+
+    sections = {"metadata": [], "condition": None, "description": [], "location": None, "seller": []}
+    current = "metadata"
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        lower = line.lower()
+
+        if lower in ("details", "description", "seller's description"):
+            current = "description"
+        elif lower == "condition" and i + 1 < len(lines):
+            sections["condition"] = lines[i + 1]
+            i += 1
+        elif lower == "location is approximate":
+            # The location name is the line right above the map caption
+            if sections[current] and current == "description":
+                sections["location"] = sections["description"].pop()
+            current = "seller"
+        elif lower in ("seller information", "about this seller"):
+            current = "seller"
+        else:
+            if current == "metadata" and lower.startswith("listed ") and " in " in lower:
+                sections["location"] = sections["location"] or line.split(" in ", 1)[1]
+            sections[current].append(line)
+        i += 1
+
+    # Seller block is only useful for a couple of trust signals (join date, ratings)
+    sections["seller"] = sections["seller"][:6]
+    return sections
+
+def build_description_excerpt(raw_text, title=None, budget=DESCRIPTION_CHAR_BUDGET):
+    """
+    Formats the extracted sections into a compact prompt block that fits the budget.
+    Falls back to the de-noised page text when no sections were recognised.
+    """
+    sections = extract_listing_sections(raw_text, title)
+
+    header = " | ".join(sections["metadata"][:6])
+    parts = []
+    if header:
+        parts.append(f"LISTING: {header}")
+    if sections["condition"]:
+        parts.append(f"CONDITION: {sections['condition']}")
+    if sections["location"]:
+        parts.append(f"LOCATION: {sections['location']}")
+    if sections["seller"]:
+        parts.append(f"SELLER: {' | '.join(sections['seller'])}")
+
+    description = "\n".join(sections["description"])
+    if not description:
+        # No recognisable structure - keep whatever survived the noise filter
+        description = "\n".join(sections["metadata"][6:])
+
+    # Description gets whatever budget is left after the short metadata blocks
+    remaining = budget - sum(len(p) + 1 for p in parts) - len("DESCRIPTION:\n")
+    if remaining > 0 and description:
+        if len(description) > remaining:
+            description = description[:remaining].rstrip() + "…"
+        parts.append(f"DESCRIPTION:\n{description}")
+
+    return "\n".join(parts)[:budget]
+
+# Availability markers FB shows next to the title / on delisted items
+GHOST_PATTERNS = [
+    re.compile(r"^(sold|pending)\b", re.IGNORECASE),
+    re.compile(r"this listing is no longer available|listing (has been|was) (removed|deleted)|marked as sold", re.IGNORECASE),
+]
+
+# Explicit deal-breaker phrases - the only defect text rejected locally
+LEMON_PATTERN = re.compile(
+    r"\b(parts only|for parts|spares or repairs?|not working)\b",
+    re.IGNORECASE
+)
+NEGATION_PATTERN = re.compile(r"\b(not|never|no|isn'?t|wasn'?t)\s+$", re.IGNORECASE)
+# Single defect words are too easily negated or incidental ("never been broken", "nothing faulty",
+# "broken in") to reject on; they are passed to the Flash tier as a flag instead
+DEFECT_HINT_PATTERN = re.compile(
+    r"\b(doesn'?t work|does not work|untested|faulty|broken)\b",
+    re.IGNORECASE
+)
+
+# Phrases that suggest the headline price may not be for the headline item
+PRICE_QUALIFIER_PATTERN = re.compile(
+    r"\b(each|per item|per unit|price is for|starting (at|from)|from \$|deposit|swap|trade only)\b",
+    re.IGNORECASE
+)
+
+def parse_price(price_text):
+    """
+    Extracts a numeric price from marketplace text like '$1,200' or 'A$450'.
+    Returns 0.0 for 'Free' and None when no number is present.
+    """
+    if price_text is None:
+        return None
+    if isinstance(price_text, (int, float)):
+        return float(price_text)
+    text = str(price_text)
+    if text.strip().lower() == "free":
+        return 0.0
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", text)
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+def rule_prescreen(description_excerpt, price):
+    """
+    Local, zero-cost checks on the listing excerpt.
+    Returns {"decision": "REJECT" | "ESCALATE", "reason": str | None, "flags": [...]}.
+    Only unambiguous deal-breakers are rejected; softer signals are passed on as flags.
+    """
+    flags = []
+    lines = [l.strip() for l in description_excerpt.splitlines() if l.strip()]
+    header = lines[0] if lines else ""
+
+    # Ghost: status badge in the header fields or an explicit delisted notice anywhere
+    # First header field is the title itself, so "Sold ..." titles aren't mistaken for badges
+    for field in header.replace("LISTING:", "").split("|")[1:]:
+        if GHOST_PATTERNS[0].match(field.strip()):
+            return {"decision": "REJECT", "reason": f"Unavailable: listing marked '{field.strip()}'", "flags": flags}
+    if GHOST_PATTERNS[1].search(description_excerpt):
+        return {"decision": "REJECT", "reason": "Unavailable: listing no longer available", "flags": flags}
+
+    # Lemon: defect phrases that are not negated
+    for match in LEMON_PATTERN.finditer(description_excerpt):
+        preceding = description_excerpt[max(0, match.start() - 12):match.start()]
+        if not NEGATION_PATTERN.search(preceding):
+            return {"decision": "REJECT", "reason": f"Defect: description mentions '{match.group(0)}'", "flags": flags}
+
+    # Softer defect words - let the model tiers read them in context
+    hints = sorted({m.group(0).lower() for m in DEFECT_HINT_PATTERN.finditer(description_excerpt)})
+    if hints:
+        flags.append(f"defect_mention ({', '.join(hints)})")
+
+    # Bait & switch signals are ambiguous - flag them for the model tiers
+    if PRICE_QUALIFIER_PATTERN.search(description_excerpt):
+        flags.append("price_qualifier")
+
+    listed = parse_price(price)
+    if listed:
+        mentioned = [parse_price(m) for m in re.findall(r"\$\s?\d[\d,]*(?:\.\d+)?", description_excerpt)]
+        if any(p and p > listed * 1.5 for p in mentioned):
+            flags.append("price_mismatch")
+
+    return {"decision": "ESCALATE", "reason": None, "flags": flags}
+
+def expected_value(deal):
+    """
+    Scores a ranked candidate by how likely it is to be a real steal and how big the steal is.
+    Combines ranker confidence, discount vs. estimated new price, and the Harvester deal_rating.
+    """
+    confidence = CONFIDENCE_WEIGHTS.get(str(deal.get("confidence", "")).strip().lower(), 0.5)
+
+    discount = 0.5 # Unknown discount counts as average
+    price = parse_price(deal.get("price"))
+    estimated_new = parse_price(deal.get("estimated_new_price"))
+    if price is not None and estimated_new:
+        discount = min(max(1 - price / estimated_new, 0.0), 1.0)
+
+    rating = parse_price(deal.get("deal_rating"))
+    rating = min(max(rating / 10, 0.0), 1.0) if rating is not None else 0.5
+
+    return round(confidence * (0.6 * discount + 0.4 * rating), 4)
+
+def budget_stop_reason(monitor, started_at, verified_count, target_steals=0, max_cost_usd=0, max_minutes=0):
+    """
+    Returns why the deep dive should stop now, or None to keep going.
+    Cost and elapsed time come from the scan's ScanMonitor totals when available.
+    """
+    if target_steals and verified_count >= target_steals:
+        return f"Target of {target_steals} verified steals reached"
+
+    # Scan-wide budget governor (degrades by skipping the remaining candidates)
+    reason = skip_reason(monitor, "deep_dive")
+    if reason:
+        return reason
+
+    scan_start = started_at
+    if monitor:
+        monitor.load() # Pick up spend logged by earlier stages
+        if max_cost_usd and monitor.data.get("total_cost_usd", 0.0) >= max_cost_usd:
+            return f"Scan cost budget ${max_cost_usd:.2f} reached (${monitor.data['total_cost_usd']:.2f} spent)"
+        scan_start = datetime.fromisoformat(monitor.data["start_time"])
+
+    if max_minutes:
+        elapsed = (datetime.now() - scan_start).total_seconds() / 60
+        if elapsed >= max_minutes:
+            return f"Scan time budget {max_minutes:g} min reached ({elapsed:.1f} min elapsed)"
+
+    return None
+
+def listing_content_hash(raw_text, title, price, user_intent=None):
+    """
+    Hash of the parts of a listing that affect the verdict (description, condition,
+    location, price) plus the user intent the verdict was judged against.
+    Volatile header text like "Listed 3 days ago" is excluded.
+    """
+    sections = extract_listing_sections(raw_text, title)
+    payload = json.dumps({
+        "price": parse_price(price),
+        "condition": sections["condition"],
+        "location": sections["location"],
+        "description": sections["description"],
+        "user_intent": user_intent or None,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Scans in one process share the cache file; serialize the read-merge-write in save()
+_cache_save_lock = threading.Lock()
+
+class VerdictCache:
+    """
+    On-disk verdict cache shared by all scans in a data dir.
+    Entries are reused while the listing content hash matches and the TTL hasn't expired.
+    """
+    def __init__(self, path, ttl_hours=VERDICT_CACHE_TTL_HOURS):
+        self.path = Path(path)
+        self.ttl = timedelta(hours=ttl_hours)
+        self.entries = self._read()
+        self.updated = {} # Entries written by this scan, merged over the file on save
+        self.stats = {"hits": 0, "misses": 0, "changed": 0, "expired": 0, "rule_reject": 0}
+
+    def _read(self):
+        if self.path.exists():
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except:
+                pass # Corrupt cache just means re-verifying
+        return {}
+
+    def lookup(self, item_id):
+        """Returns the entry if it exists and is inside the TTL, else None."""
+        entry = self.entries.get(str(item_id))
+        if not entry:
+            return None
+        if datetime.now() - datetime.fromisoformat(entry["cached_at"]) > self.ttl:
+            return None
+        return entry
+
+    def record(self, outcome):
+        self.stats[outcome] += 1
+
+    def miss_outcome(self, item_id, cached, content_hash):
+        """Stats bucket for a lookup that isn't served from the cache."""
+        if cached:
+            # Unchanged listing rejected by the rules gate (e.g. now marked sold)
+            return "changed" if cached["content_hash"] != content_hash else "rule_reject"
+        return "expired" if str(item_id) in self.entries else "misses"
+
+    @staticmethod
+    def restore_screenshots(entry, output_dir):
+        """
+        Links the cached verdict's screenshots into output_dir under their original names.
+        Returns False if any of them is gone (e.g. its scan was deleted).
+        """
+        sources = [Path(p) for p in entry.get("screenshots", [])]
+        if not all(src.exists() for src in sources):
+            return False
+        for src in sources:
+            dest = Path(output_dir) / src.name
+            if not dest.exists():
+                link_or_copy(src, dest)
+        return True
+
+    def put(self, item_id, content_hash, verdict_data, screenshots=()):
+        entry = {
+            "content_hash": content_hash,
+            "cached_at": datetime.now().isoformat(),
+            "result": {k: verdict_data.get(k) for k in CACHED_FIELDS},
+            # Where the verdict's screenshots live, so a hit can reuse them in the new scan dir
+            "screenshots": [str(Path(p).resolve()) for p in screenshots]
+        }
+        self.entries[str(item_id)] = entry
+        self.updated[str(item_id)] = entry
+
+    def save(self):
+        # Concurrent scans share this file: re-read it and merge our entries over it,
+        # then write-then-rename (unique tmp per writer) so a crashed scan never leaves a half-written cache
+        with _cache_save_lock:
+            self.entries = self._read()
+            self.entries.update(self.updated)
+            tmp = self.path.with_suffix(f".{os.getpid()}.{id(self)}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+async def flash_prescreen(prescreen_model, item, description_excerpt, flags, user_intent=None, monitor=None):
+    """
+    Text-only Flash pass. Rejects clear deal-breakers, escalates anything uncertain.
+    Never returns a verified verdict - only the Pro auditor can verify.
+    """
+    prompt = f"""
+    You are a fast triage filter for a marketplace deal auditor.
+
+    Item: '{item.get("title", "Unknown Item")}'
+    Listed Price: '{item.get("price", "Unknown Price")}'
+    Why it was flagged: "{item.get("reason", "No specific hypothesis provided.")}"
+    Automatic flags: {", ".join(flags) if flags else "none"}
+    User Goal: "{user_intent if user_intent else 'General Deal Hunting'}"
+
+    LISTING TEXT:
+    "{description_excerpt}"
+
+    REJECT only if the text clearly shows a deal-breaker: sold/pending, parts-only or broken,
+    the listed price being for a different/cheaper item or accessory, or the item failing the User Goal.
+    A "defect_mention" flag only means a defect word appears somewhere; read it in context
+    ("never been broken" is fine, a faulty accessory may not matter).
+    If there is any doubt, ESCALATE.
+
+    Return RAW JSON ONLY. No markdown. No intro.
+    {{
+        "decision": "REJECT" | "ESCALATE",
+        "reason": "Specific deal-breaker if rejected, otherwise null"
+    }}
+    """
+    before_dispatch(monitor, "deep_dive_prescreen", PRESCREEN_MODEL_NAME, len(prompt))
+    response = await prescreen_model.generate_content_async(prompt)
+
+    if monitor and response.usage_metadata:
+        monitor.log_tokens(
+            "deep_dive_prescreen",
+            PRESCREEN_MODEL_NAME,
+            response.usage_metadata.prompt_token_count,
+            response.usage_metadata.candidates_token_count
+        )
+
+    result = await clean_json_response(response.text)
+    if not result or result.get("decision") != "REJECT":
+        return {"decision": "ESCALATE", "reason": None}
+    return {"decision": "REJECT", "reason": result.get("reason") or "Rejected by triage"}
+
 async def clean_json_response(text):
     """
     Robustly extracts JSON from AI response using regex.
@@ -46,7 +440,7 @@ async def clean_json_response(text):
         # print(f"Raw text was: {text}")
         return None
 
-async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=None):
+async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=None, prescreen_model=None, cache=None):
     item_id = item.get("id")
     url = item.get("url")
     price = item.get("price", "Unknown Price")
@@ -59,6 +453,9 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
     
     # Storage for images to send to AI
     captured_images = []
+
+    # A live cache entry means this visit is just an availability/change check
+    cached = cache.lookup(item_id) if cache else None
     
     try:
         # Set fixed viewport for consistent "smart" screenshots - 1280x800 as requested
@@ -67,8 +464,8 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
         await page.goto(url, timeout=60000)
         await page.wait_for_load_state("domcontentloaded")
         
-        # Human-like pause
-        await asyncio.sleep(2)
+        # Human-like pause (shorter when we only need the text for a cache check)
+        await asyncio.sleep(0.5 if cached else 2)
         
         # 1. Expand Description
         try:
@@ -100,6 +497,78 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
             except:
                 description_text = "Could not extract text."
 
+        # Keep the full page text on disk for auditing; only the excerpt goes to the model
+        raw_text_file = output_dir / f"deep_dive_{item_id}_page.txt"
+        try:
+            with open(raw_text_file, "w", encoding="utf-8") as f:
+                f.write(description_text)
+        except Exception as e:
+            print(f"Error saving raw page text: {e}")
+
+        description_excerpt = build_description_excerpt(description_text, title)
+        raw_chars = min(len(description_text), 10000) # Previous prompt cap
+        prompt_stats = {
+            "raw_chars": len(description_text),
+            "prompt_chars": len(description_excerpt),
+            "est_tokens_saved": max(0, raw_chars - len(description_excerpt)) // CHARS_PER_TOKEN
+        }
+        print(f"Description excerpt: {prompt_stats['prompt_chars']} chars (raw {prompt_stats['raw_chars']}, ~{prompt_stats['est_tokens_saved']} tokens saved)")
+
+        base_result = {
+            "description": description_excerpt,
+            "description_file": raw_text_file.name,
+            "prompt_stats": prompt_stats
+        }
+
+        content_hash = listing_content_hash(description_text, title, price, user_intent)
+
+        # Pre-screen: local rules first, then a text-only Flash pass.
+        # Only listings that survive both pay for screenshots and the Pro auditor.
+        # The rule gate doubles as the availability check for cached verdicts.
+        screen = {"decision": "ESCALATE", "reason": None, "flags": []}
+        if prescreen_model is not None or cached:
+            screen = rule_prescreen(description_excerpt, price)
+            if screen["decision"] == "REJECT":
+                print(f"Pre-screen (rules) rejected: {screen['reason']}")
+                result = {"verdict": "REJECTED", "rejection_reason": screen["reason"], "verification_tier": "rules", **base_result}
+                if cache:
+                    cache.record(cache.miss_outcome(item_id, cached, content_hash))
+                    cache.put(item_id, content_hash, result)
+                return result
+
+        if cache:
+            if cached and cached["content_hash"] == content_hash and cache.restore_screenshots(cached, output_dir):
+                print(f"Cache hit: listing unchanged since {cached['cached_at']} ({cached['result'].get('verdict')})")
+                cache.record("hits")
+                return {**cached["result"], "verification_tier": "cache", "cached_tier": cached["result"].get("verification_tier"), "cached_at": cached["cached_at"], **base_result}
+            elif cached and cached["content_hash"] == content_hash:
+                # Unchanged, but the screenshots the dashboard and email need are gone
+                print("Cache entry found but its screenshots were deleted. Re-verifying...")
+                cache.record("misses")
+            elif cached:
+                print("Cache entry found but listing content changed. Re-verifying...")
+                cache.record("changed")
+            else:
+                cache.record(cache.miss_outcome(item_id, cached, content_hash))
+
+        if prescreen_model is not None:
+            try:
+                triage = await flash_prescreen(prescreen_model, item, description_excerpt, screen["flags"], user_intent, monitor)
+            except BudgetExceeded:
+                raise
+            except Exception as e:
+                print(f"Flash pre-screen failed, escalating: {e}")
+                triage = {"decision": "ESCALATE", "reason": None}
+
+            if triage["decision"] == "REJECT":
+                print(f"Pre-screen ({PRESCREEN_MODEL_NAME}) rejected: {triage['reason']}")
+                result = {"verdict": "REJECTED", "rejection_reason": triage["reason"], "verification_tier": "flash", **base_result}
+                if cache:
+                    cache.put(item_id, content_hash, result)
+                return result
+
+            print(f"Pre-screen passed (flags: {', '.join(screen['flags']) or 'none'}). Escalating to Auditor.")
+
         # 3. Smart Screenshots & Carousel
         print("Capturing images...")
         
@@ -111,6 +580,7 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
 
         # Image 1: Main Viewport
         main_shot_path = output_dir / f"deep_dive_{item_id}_main.png"
+        unshare_for_write(main_shot_path) # May be an interned blob from an earlier run
         await page.screenshot(path=str(main_shot_path)) # Default is viewport only
         captured_images.append(main_shot_path)
         print(f"Captured Main: {main_shot_path}")
@@ -123,6 +593,7 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
                 await asyncio.sleep(1.0) # Wait for animation
                 
                 extra_shot_path = output_dir / f"deep_dive_{item_id}_extra_{i+1}.png"
+                unshare_for_write(extra_shot_path)
                 await page.screenshot(path=str(extra_shot_path))
                 captured_images.append(extra_shot_path)
                 print(f"Captured Extra {i+1}: {extra_shot_path}")
@@ -141,8 +612,8 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
         Listed Price: '{price}'
         Our Hypothesis (Why we flagged it): "{original_hypothesis}"
         
-        SOURCE OF TRUTH (Full Page Text):
-        "{description_text[:10000]}"
+        SOURCE OF TRUTH (Listing Details, Seller Description, Location):
+        "{description_excerpt}"
         
         User Goal: "{user_intent if user_intent else 'General Deal Hunting'}"
         
@@ -169,14 +640,18 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
         }}
         """
         
-        print(f"Sending {len(captured_images)} images to The Auditor ({MODEL_NAME})...")
+        # Near the scan budget the Auditor runs on Flash instead of Pro
+        model_name = before_dispatch(monitor, "deep_dive", MODEL_NAME, len(prompt))
+        if model_name != MODEL_NAME:
+            model = get_model(model_name)
+        print(f"Sending {len(captured_images)} images to The Auditor ({model_name})...")
         # Send prompt + list of images
-        response = model.generate_content([prompt] + pil_images)
+        response = await model.generate_content_async([prompt] + pil_images)
         
         if monitor and response.usage_metadata:
              monitor.log_tokens(
                  "deep_dive", 
-                 MODEL_NAME, 
+                 model_name, 
                  response.usage_metadata.prompt_token_count, 
                  response.usage_metadata.candidates_token_count
              )
@@ -185,15 +660,375 @@ async def verify_deal(page, item, model, output_dir, user_intent=None, monitor=N
         result = await clean_json_response(response.text)
         
         if result:
-            result['description_raw'] = description_text
+            result['verification_tier'] = "pro" if model_name == MODEL_NAME else "degraded"
+            result.update(base_result)
+            if cache and model_name == MODEL_NAME: # Budget-degraded verdicts aren't worth replaying
+                cache.put(item_id, content_hash, result, captured_images)
             return result
         else:
             print("Failed to parse AI response.")
-            return {"verdict": "ERROR", "reason": "AI parse failure", "description_raw": description_text}
+            return {"verdict": "ERROR", "reason": "AI parse failure", "verification_tier": "pro" if model_name == MODEL_NAME else "degraded", **base_result}
 
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error checking item {item_id}: {e}")
-        return {"verdict": "ERROR", "reason": str(e), "description_raw": description_text if 'description_text' in locals() else "Error extracting text"}
+        return {"verdict": "ERROR", "reason": str(e), "description": description_excerpt if 'description_excerpt' in locals() else "Error extracting text"}
+
+async def open_verifier_page(p, auth_file=None, browser=None):
+    """
+    Opens the verifier page. Returns (browser, context, page); the returned browser is
+    only set when this call launched it (None for shared browsers and persistent contexts).
+    """
+    if browser is not None:
+        # Shared pipeline browser - just open our own context on it
+        context = await browser.new_context(
+            storage_state=auth_file,
+            viewport={"width": 1280, "height": 1400}
+        )
+        page = await context.new_page()
+        return None, context, page
+
+    if auth_file:
+        print(f"Launching Chrome with auth file: {auth_file}...")
+        browser = await p.chromium.launch(headless=True, args=["--no-sandbox", "--disable-setuid-sandbox"])
+        context = await browser.new_context(
+            storage_state=auth_file,
+            viewport={"width": 1280, "height": 1400}
+        )
+        page = await context.new_page()
+        return browser, context, page
+
+    # Persistent context fallback (local dev)
+    print(f"Launching Chrome with persistent context...")
+    context = await p.chromium.launch_persistent_context(
+        user_data_dir="./verifier_profile",
+        headless=False,
+        channel="chrome",
+        viewport={"width": 1280, "height": 1400},
+        args=["--disable-blink-features=AutomationControlled"]
+    )
+    page = context.pages[0] if context.pages else await context.new_page()
+    return None, context, page
+
+class VerifierPage:
+    """
+    Opens the verifier page on first use and closes only what it opened.
+    Runs that are fully answered by speculative verdicts never start a browser.
+    """
+    def __init__(self, auth_file=None, browser=None):
+        self.auth_file = auth_file
+        self.shared_browser = browser
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self.page = None
+
+    async def get(self):
+        if self.page is None:
+            if self.shared_browser is None:
+                self._playwright = await async_playwright().start()
+            self._browser, self._context, self.page = await open_verifier_page(self._playwright, self.auth_file, self.shared_browser)
+        return self.page
+
+    async def close(self):
+        for closable in (self._context, self._browser):
+            if closable:
+                try:
+                    await closable.close()
+                except:
+                    pass
+        if self._playwright:
+            await self._playwright.stop()
+        self.page = None
+
+def load_speculative_verdicts(output_dir):
+    """Returns {item_id: final_deal} from a speculative run in this output dir, if any."""
+    spec_file = Path(output_dir) / SPECULATIVE_VERDICTS_FILE
+    if not spec_file.exists():
+        return {}
+    try:
+        with open(spec_file, "r", encoding="utf-8") as f:
+            return json.load(f).get("verdicts", {})
+    except:
+        return {}
+
+def open_cache(data_dir, cache_ttl_hours):
+    if cache_ttl_hours and cache_ttl_hours > 0:
+        return VerdictCache(Path(data_dir) / VERDICT_CACHE_FILE, ttl_hours=cache_ttl_hours)
+    return None
+
+async def speculate(inventory_file, data_dir="data", auth_file=None, user_intent=None, monitor=None,
+                    browser=None, stop_event=None, rating_threshold=SPECULATIVE_RATING_THRESHOLD,
+                    prescreen=True, cache_ttl_hours=VERDICT_CACHE_TTL_HOURS):
+    """
+    Stage API: speculative deep dive. Runs alongside analyze_images/rank_deals and verifies
+    items whose deal_rating clears the threshold as soon as they are analyzed.
+    Results go to speculative_verdicts.json; the regular deep dive merges the ones
+    the ranker kept and discards the rest. Stops once potential_buys.json appears
+    or stop_event is set.
+    """
+    inventory_file = Path(inventory_file)
+    output_dir = inventory_file.parent
+    spec_file = output_dir / SPECULATIVE_VERDICTS_FILE
+    ranked_file = output_dir / "potential_buys.json"
+
+    model = get_model(MODEL_NAME)
+    prescreen_model = get_model(PRESCREEN_MODEL_NAME) if prescreen else None
+    cache = open_cache(data_dir, cache_ttl_hours)
+
+    # A potential_buys.json older than this run is left over from an interrupted scan being resumed
+    armed_at = time.time()
+
+    def ranked():
+        try:
+            return ranked_file.stat().st_mtime >= armed_at
+        except FileNotFoundError:
+            return False
+
+    def should_stop():
+        return ranked() or (stop_event is not None and stop_event.is_set())
+
+    verdicts = {}
+    print(f"Speculative deep dive armed (deal_rating >= {rating_threshold:g}). Watching {inventory_file.name}...")
+
+    verifier = VerifierPage(auth_file, browser)
+    try:
+        while not should_stop():
+            inventory = []
+            if inventory_file.exists():
+                try:
+                    with open(inventory_file, "r", encoding="utf-8") as f:
+                        inventory = json.load(f)
+                except (json.JSONDecodeError, OSError):
+                    pass # Mid-write by the Harvester, try again next tick
+
+            candidates = [
+                item for item in inventory
+                if str(item.get("id")) not in verdicts
+                and (parse_price(item.get("deal_rating")) or 0) >= rating_threshold
+                and item.get("url")
+            ]
+            if not candidates:
+                if stop_event is not None:
+                    try:
+                        await asyncio.wait_for(stop_event.wait(), timeout=2)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await asyncio.sleep(2)
+                continue
+
+            reason = skip_reason(monitor, "speculative deep dive")
+            if reason:
+                print(f"Speculative deep dive stopping: {reason}.")
+                break
+
+            page = await verifier.get()
+
+            item = candidates[0]
+            full_item = item.copy()
+            full_item.setdefault("reason", item.get("flipper_comment") or "High Harvester deal_rating")
+            print(f"Speculatively verifying {item.get('title')} (deal_rating {item.get('deal_rating')})")
+
+            verdict_data = await verify_deal(page, full_item, model, output_dir, user_intent, monitor, prescreen_model, cache)
+            final_deal = item.copy()
+            final_deal.update(verdict_data)
+            final_deal["speculative"] = True
+            verdicts[str(item.get("id"))] = final_deal
+
+            with open(spec_file, "w", encoding="utf-8") as f:
+                json.dump({"verdicts": verdicts}, f, indent=2, ensure_ascii=False)
+            if cache:
+                cache.save()
+
+            if verdict_data.get("verdict") == "VERIFIED_DEAL":
+                print(f"  [!] EARLY VERIFIED STEAL: {item.get('title')}")
+
+        print(f"Ranking finished. Speculative deep dive stopping after {len(verdicts)} items.")
+    except BudgetExceeded:
+        raise # Let the pipeline abort the scan instead of finishing with partial verdicts
+    except Exception as e:
+        print(f"Speculative browser error: {e}")
+    finally:
+        await verifier.close()
+
+    return verdicts
+
+async def verify_deals(potential_buys, listings, output_dir, data_dir="data", auth_file=None, user_intent=None,
+                       monitor=None, browser=None, prescreen=True, cache_ttl_hours=VERDICT_CACHE_TTL_HOURS,
+                       target_steals=DEEP_DIVE_TARGET_STEALS, max_scan_cost_usd=DEEP_DIVE_MAX_SCAN_COST_USD,
+                       max_scan_minutes=DEEP_DIVE_MAX_SCAN_MINUTES):
+    """
+    Stage API: verifies the ranker's potential_buys and writes verified_steals.json
+    to output_dir. Returns the report dict ({"verified", "rejected", "skipped", ...}).
+    """
+    output_dir = Path(output_dir)
+
+    # Map ID to URL
+    id_to_url = {item["id"]: item["url"] for item in listings}
+
+    # Highest expected value first, so budget cut-offs only drop the long tail
+    potential_buys = [deal.copy() for deal in potential_buys]
+    for deal in potential_buys:
+        deal["expected_value"] = expected_value(deal)
+    potential_buys.sort(key=lambda d: d["expected_value"], reverse=True)
+
+    print(f"Found {len(potential_buys)} deals to verify.")
+
+    model = get_model(MODEL_NAME)
+    prescreen_model = get_model(PRESCREEN_MODEL_NAME) if prescreen else None
+    cache = open_cache(data_dir, cache_ttl_hours)
+
+    # Output file
+    output_file = output_dir / "verified_steals.json"
+    
+    verified_steals = []
+    rejected_deals = []
+    skipped_deals = []
+    prompt_totals = {"raw_chars": 0, "prompt_chars": 0, "est_tokens_saved": 0}
+    tier_counts = {}
+    started_at = datetime.now()
+
+    speculative_verdicts = load_speculative_verdicts(output_dir)
+    if speculative_verdicts:
+        print(f"Loaded {len(speculative_verdicts)} speculative verdicts.")
+
+    def build_report():
+        return {
+            "verified": verified_steals,
+            "rejected": rejected_deals,
+            "skipped": skipped_deals,
+            "prompt_stats": prompt_totals,
+            "tier_counts": tier_counts,
+            "cache_stats": cache.stats if cache else None
+        }
+
+    def write_report():
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(build_report(), f, indent=2, ensure_ascii=False)
+
+    verifier = VerifierPage(auth_file, browser)
+    try:
+        for index, deal in enumerate(potential_buys):
+            stop_reason = budget_stop_reason(monitor, started_at, len(verified_steals), target_steals, max_scan_cost_usd, max_scan_minutes)
+            if stop_reason:
+                print(f"Stopping deep dive early: {stop_reason}. Skipping {len(potential_buys) - index} remaining candidates.")
+                for remaining in potential_buys[index:]:
+                    skipped_deals.append({
+                        "id": remaining.get("id"),
+                        "title": remaining.get("title"),
+                        "price": remaining.get("price"),
+                        "expected_value": remaining.get("expected_value"),
+                        "skip_reason": stop_reason
+                    })
+                break
+
+            deal_id = deal.get("id")
+            url = id_to_url.get(deal_id)
+            
+            if not url:
+                print(f"URL not found for deal ID {deal_id}, skipping.")
+                continue
+                
+            # Merge deal info with url
+            full_item = deal.copy()
+            full_item["url"] = url
+            
+            speculative = speculative_verdicts.pop(str(deal_id), None)
+            if speculative and speculative.get("verdict") != "ERROR":
+                # Already audited while ranking was running - reuse that verdict
+                print(f"\n--- Using speculative verdict for: {deal.get('title')} ---")
+                verdict_data = {k: v for k, v in speculative.items() if k not in deal or k in CACHED_FIELDS}
+                verdict_data["speculative"] = True
+            else:
+                page = await verifier.get()
+
+                # Verify
+                # Pass output_dir (same as input parent) for screenshots
+                verdict_data = await verify_deal(page, full_item, model, output_dir, user_intent, monitor, prescreen_model, cache)
+            
+            # Update deal with verdict
+            # CRITICAL: Prepare the final object by merging ORIGINAL data with VERIFIED data
+            # We want to keep the original screenshot if the verifier didn't take a better one (mostly it doesn't return one in the JSON)
+            
+            final_deal = deal.copy() # Start with original (has screenshot, potentially)
+            final_deal.update(verdict_data) # Overlay verification results
+            
+            # Ensure screenshot is preserved if missing in verdict
+            if "screenshot" not in final_deal and "screenshot" in deal:
+                final_deal["screenshot"] = deal["screenshot"]
+            
+            stats = verdict_data.get("prompt_stats")
+            if stats:
+                prompt_totals["raw_chars"] += stats["raw_chars"]
+                prompt_totals["prompt_chars"] += stats["prompt_chars"]
+                prompt_totals["est_tokens_saved"] += stats["est_tokens_saved"]
+
+            tier = verdict_data.get("verification_tier", "error")
+            tier_counts[tier] = tier_counts.get(tier, 0) + 1
+            
+            if verdict_data.get("verdict") == "VERIFIED_DEAL":
+                verified_steals.append(final_deal)
+                print(f"  [!] VERIFIED STEAL: {deal['title']}")
+            else:
+                rejected_deals.append(final_deal)
+                reason = verdict_data.get('rejection_reason') or verdict_data.get('reason') or "Unknown"
+                print(f"  [x] Rejected [{tier}]: {deal['title']} ({reason})")
+            
+            # Save incrementally
+            write_report()
+            if cache:
+                cache.save()
+                
+        if skipped_deals:
+            write_report()
+
+        if speculative_verdicts:
+            # Leftovers were verified speculatively but the ranker didn't keep them
+            print(f"Discarding {len(speculative_verdicts)} speculative verdicts for items the ranker did not select.")
+                
+    except BudgetExceeded:
+        raise # Let the pipeline abort the scan instead of finishing with partial verdicts
+    except Exception as e:
+        print(f"Browser error: {e}")
+    finally:
+        await verifier.close()
+        
+    if monitor:
+        fields = {"deep_dive_tiers": tier_counts, "deep_dive_skipped": len(skipped_deals)}
+        if cache:
+            fields["deep_dive_cache"] = cache.stats
+        monitor.update(**fields)
+        
+    print(f"\nVerification Complete. {len(verified_steals)} verified, {len(rejected_deals)} rejected, {len(skipped_deals)} skipped. Report saved to {output_file}")
+    if cache:
+        print(f"Verdict cache: {cache.stats['hits']} hits, {cache.stats['changed']} changed, {cache.stats['expired']} expired, {cache.stats['rule_reject']} rule rejects, {cache.stats['misses']} misses")
+    print(f"Prompt text: {prompt_totals['prompt_chars']} chars sent vs {prompt_totals['raw_chars']} scraped (~{prompt_totals['est_tokens_saved']} tokens saved)")
+
+    return build_report()
+
+async def run_speculative(args):
+    data_dir = Path(getattr(args, 'data_dir', 'data'))
+
+    monitor = None
+    if args.scan_id:
+        monitor = ScanMonitor(args.scan_id, data_dir=data_dir)
+        monitor.start_step("deep_dive_speculative")
+
+    await speculate(
+        args.inventory,
+        data_dir=data_dir,
+        auth_file=args.auth_file,
+        user_intent=args.user_intent,
+        monitor=monitor,
+        rating_threshold=args.rating_threshold,
+        prescreen=not args.no_prescreen,
+        cache_ttl_hours=args.cache_ttl_hours
+    )
+
+    if monitor:
+        monitor.stop_step("deep_dive_speculative")
 
 async def run(args):
     data_dir = Path(getattr(args, 'data_dir', 'data'))
@@ -219,8 +1054,6 @@ async def run(args):
     # Load Listings for URL lookup
     with open(listings_file, "r", encoding="utf-8") as f:
         all_listings = json.load(f)
-        # Map ID to URL
-        id_to_url = {item["id"]: item["url"] for item in all_listings}
         
     # Load Potential Buys
     with open(input_file, "r", encoding="utf-8") as f:
@@ -231,124 +1064,55 @@ async def run(args):
     if not potential_buys:
         print("No potential buys found in input file.")
         return
-        
-    print(f"Found {len(potential_buys)} deals to verify.")
     
     monitor = None
     if args.scan_id:
-        data_dir = Path(getattr(args, 'data_dir', 'data'))
         monitor = ScanMonitor(args.scan_id, data_dir=data_dir)
         monitor.start_step("deep_dive")
-    
-    # Initialize AI
-    try:
-        model = genai.GenerativeModel(MODEL_NAME)
-    except:
-        print(f"Model {MODEL_NAME} not found, falling back to gemini-1.5-pro")
-        model = genai.GenerativeModel("gemini-1.5-pro")
 
-    # Output file
-    output_file = input_file.parent / "verified_steals.json"
-    
-    verified_steals = []
-    rejected_deals = []
-
-    async with async_playwright() as p:
-        browser = None
-        context = None
-        
-        try:
-            if args.auth_file:
-                 print(f"Launching Chrome with auth file: {args.auth_file}...")
-                 browser = await p.chromium.launch(headless=True, args=["--no-sandbox", "--disable-setuid-sandbox"])
-                 context = await browser.new_context(
-                     storage_state=args.auth_file,
-                     viewport={"width": 1280, "height": 1400}
-                 )
-                 page = await context.new_page()
-            else:
-                # Persistent context fallback (local dev)
-                print(f"Launching Chrome with persistent context...")
-                context = await p.chromium.launch_persistent_context(
-                    user_data_dir="./verifier_profile",
-                    headless=False,
-                    channel="chrome",
-                    viewport={"width": 1280, "height": 1400},
-                    args=["--disable-blink-features=AutomationControlled"]
-                )
-                page = context.pages[0] if context.pages else await context.new_page()
-            
-            for deal in potential_buys:
-                deal_id = deal.get("id")
-                url = id_to_url.get(deal_id)
-                
-                if not url:
-                    print(f"URL not found for deal ID {deal_id}, skipping.")
-                    continue
-                    
-                # Merge deal info with url
-                full_item = deal.copy()
-                full_item["url"] = url
-                
-                # Verify
-                # Pass output_dir (same as input parent) for screenshots
-                verdict_data = await verify_deal(page, full_item, model, input_file.parent, args.user_intent, monitor)
-                
-                # Update deal with verdict
-                # CRITICAL: Prepare the final object by merging ORIGINAL data with VERIFIED data
-                # We want to keep the original screenshot if the verifier didn't take a better one (mostly it doesn't return one in the JSON)
-                
-                final_deal = deal.copy() # Start with original (has screenshot, potentially)
-                final_deal.update(verdict_data) # Overlay verification results
-                
-                # Ensure screenshot is preserved if missing in verdict
-                if "screenshot" not in final_deal and "screenshot" in deal:
-                    final_deal["screenshot"] = deal["screenshot"]
-                
-                output_data = {
-                    "verified": verified_steals,
-                    "rejected": rejected_deals
-                }
-                
-                if verdict_data.get("verdict") == "VERIFIED_DEAL":
-                    verified_steals.append(final_deal)
-                    print(f"  [!] VERIFIED STEAL: {deal['title']}")
-                else:
-                    rejected_deals.append(final_deal)
-                    reason = verdict_data.get('rejection_reason') or verdict_data.get('reason') or "Unknown"
-                    print(f"  [x] Rejected: {deal['title']} ({reason})")
-                
-                # Save incrementally
-                with open(output_file, "w", encoding="utf-8") as f:
-                    json.dump(output_data, f, indent=2, ensure_ascii=False)
-                    
-        except Exception as e:
-            print(f"Browser error: {e}")
-        finally:
-            if context:
-                try:
-                    await context.close()
-                except:
-                    pass
-            if browser:
-                try:
-                    await browser.close()
-                except:
-                    pass
+    await verify_deals(
+        potential_buys,
+        all_listings,
+        input_file.parent,
+        data_dir=data_dir,
+        auth_file=args.auth_file,
+        user_intent=args.user_intent,
+        monitor=monitor,
+        prescreen=not args.no_prescreen,
+        cache_ttl_hours=args.cache_ttl_hours,
+        target_steals=args.target_steals,
+        max_scan_cost_usd=args.max_scan_cost_usd,
+        max_scan_minutes=args.max_scan_minutes
+    )
         
     if monitor:
         monitor.stop_step("deep_dive")
-        
-    print(f"\nVerification Complete. {len(verified_steals)} verified, {len(rejected_deals)} rejected. Report saved to {output_file}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Deep Dive Verification for Marketplace Deals")
-    parser.add_argument("--input", required=True, help="Path to potential_buys.json")
-    parser.add_argument("--listings", required=True, help="Path to original listings.json (for URL lookup)")
+    parser.add_argument("--input", help="Path to potential_buys.json")
+    parser.add_argument("--listings", help="Path to original listings.json (for URL lookup)")
+    parser.add_argument("--speculative", action="store_true", help="Verify high-rated items from --inventory while ranking is still running")
+    parser.add_argument("--inventory", help="Path to market_inventory.json (speculative mode)")
+    parser.add_argument("--rating-threshold", type=float, default=SPECULATIVE_RATING_THRESHOLD, help="Minimum deal_rating to verify speculatively (default: 9)")
     parser.add_argument("--auth-file", help="Path to auth.json")
     parser.add_argument("--data-dir", default="data", help="Directory for data persistence")
     parser.add_argument("--user-intent", help="Specific use case to verify against (e.g. '4K Plex Server')")
     parser.add_argument("--scan-id", help="Scan ID for audit logging")
+    parser.add_argument("--cache-ttl-hours", type=float, default=VERDICT_CACHE_TTL_HOURS, help="Reuse unchanged verdicts for this many hours (0 disables the cache)")
+    parser.add_argument("--target-steals", type=int, default=DEEP_DIVE_TARGET_STEALS, help="Stop after this many verified steals (0 = verify all)")
+    parser.add_argument("--max-scan-cost-usd", type=float, default=DEEP_DIVE_MAX_SCAN_COST_USD, help="Stop once total scan spend reaches this (0 = unlimited)")
+    parser.add_argument("--max-scan-minutes", type=float, default=DEEP_DIVE_MAX_SCAN_MINUTES, help="Stop once the scan has run this long (0 = unlimited)")
+    parser.add_argument("--no-prescreen", action="store_true", help="Send every item straight to the Pro auditor (skip rule/Flash pre-screen)")
     
     args = parser.parse_args()
-    asyncio.run(run(args))
+    configure_or_exit()
+
+    if args.speculative:
+        if not args.inventory:
+            parser.error("--speculative requires --inventory")
+        asyncio.run(run_speculative(args))
+    else:
+        if not args.input or not args.listings:
+            parser.error("--input and --listings are required")
+        asyncio.run(run(args))
@@ -10,8 +10,8 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-# Paths
-SETTINGS_FILE = Path(__file__).parent / "data" / "settings.json"
+# Paths (shared with the settings endpoint)
+from config import SETTINGS_FILE
 
 def load_settings():
     if SETTINGS_FILE.exists():
@@ -0,0 +1,31 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+# Dedicated thread pool for the API's disk and SQLite work.
+# Endpoints are async and hand their blocking file reads, catalog queries and deletes to
+# this pool instead of running as sync handlers in Starlette's shared threadpool, which
+# embedded scan workers, the scheduler and streaming responses also lean on. A fixed,
+# separately sized pool keeps API latency steady while scans are busy in the same process.
+
+API_IO_THREADS = int(os.getenv("API_IO_THREADS", "8"))
+
+_executor = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=API_IO_THREADS, thread_name_prefix="api-io")
+    return _executor
+
+async def run_io(func, *args, **kwargs):
+    """Runs a blocking call on the API I/O pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+        _executor = None
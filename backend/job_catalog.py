@@ -0,0 +1,257 @@
+import json
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime
+
+# Indexed job catalog (data/catalog.db).
+# /jobs used to open and parse every data/jobs/*/audit.json on each dashboard load.
+# ScanMonitor now upserts a row here every time it writes its audit.json snapshot, and the
+# pipeline adds result counts as stages complete, so /jobs pages, filters and sorts in SQL.
+# audit.json stays the source of truth: rebuild the catalog from it with
+#
+#   python job_catalog.py --rebuild
+
+CATALOG_DB_FILE = "catalog.db"
+
+# Sortable /jobs columns (API name -> SQL column)
+SORT_COLUMNS = {
+    "start_time": "start_time",
+    "end_time": "end_time",
+    "cost": "total_cost_usd",
+    "duration": "total_duration_seconds",
+    "verified": "verified_count",
+    "query": "query",
+}
+
+COLUMNS = [
+    "scan_id", "query", "location", "radius", "source", "status", "start_time", "end_time",
+    "total_duration_seconds", "total_cost_usd", "total_tokens", "output_dir",
+    "listings_count", "inventory_count", "potential_buys_count", "verified_count", "updated_at",
+    "schedule_id", "screenshots_expired_at"
+]
+
+# Added after the first release; older catalogs get them via ALTER TABLE
+MIGRATED_COLUMNS = {"schedule_id": "TEXT", "screenshots_expired_at": "TEXT"}
+
+def job_status(audit_data):
+    """Status shown for a job: an explicit one (queued, failed, cancelled, aborted...) or complete/running."""
+    return audit_data.get("status") or ("complete" if audit_data.get("end_time") else "running")
+
+def count_json(path, key=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if key and isinstance(data, dict):
+        data = data.get(key, [])
+    return len(data) if isinstance(data, list) else None
+
+def result_counts(output_dir):
+    """Item counts from a scan's artifacts (None for stages that haven't produced one)."""
+    output_dir = Path(output_dir)
+    return {
+        "listings": count_json(output_dir / "listings.json"),
+        "inventory": count_json(output_dir / "market_inventory.json"),
+        "potential_buys": count_json(output_dir / "potential_buys.json", "potential_buys"),
+        "verified": count_json(output_dir / "verified_steals.json", "verified"),
+    }
+
+def catalog_row(audit_data):
+    counts = audit_data.get("result_counts") or {}
+    tokens = audit_data.get("total_tokens") or {}
+    return {
+        "scan_id": audit_data.get("scan_id"),
+        "query": audit_data.get("query"),
+        "location": audit_data.get("location"),
+        "radius": audit_data.get("radius"),
+        "source": audit_data.get("source") or "manual",
+        "status": job_status(audit_data),
+        "start_time": audit_data.get("start_time"),
+        "end_time": audit_data.get("end_time"),
+        "total_duration_seconds": audit_data.get("total_duration_seconds") or 0.0,
+        "total_cost_usd": audit_data.get("total_cost_usd") or 0.0,
+        "total_tokens": (tokens.get("input") or 0) + (tokens.get("output") or 0),
+        "output_dir": audit_data.get("output_dir"),
+        "listings_count": counts.get("listings"),
+        "inventory_count": counts.get("inventory"),
+        "potential_buys_count": counts.get("potential_buys"),
+        "verified_count": counts.get("verified"),
+        "updated_at": datetime.now().isoformat(),
+        "schedule_id": audit_data.get("schedule_id"),
+        "screenshots_expired_at": audit_data.get("screenshots_expired_at"),
+    }
+
+class JobCatalog:
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.created = not self.db_path.exists()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    scan_id TEXT PRIMARY KEY,
+                    query TEXT,
+                    location TEXT,
+                    radius INTEGER,
+                    source TEXT,
+                    status TEXT,
+                    start_time TEXT,
+                    end_time TEXT,
+                    total_duration_seconds REAL,
+                    total_cost_usd REAL,
+                    total_tokens INTEGER,
+                    output_dir TEXT,
+                    listings_count INTEGER,
+                    inventory_count INTEGER,
+                    potential_buys_count INTEGER,
+                    verified_count INTEGER,
+                    updated_at TEXT,
+                    schedule_id TEXT,
+                    screenshots_expired_at TEXT
+                )
+            """)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, kind in MIGRATED_COLUMNS.items():
+                if column not in existing:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_start ON jobs (start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_source ON jobs (source, start_time)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_query ON jobs (query COLLATE NOCASE)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_schedule ON jobs (schedule_id, start_time)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def upsert(self, audit_data):
+        """Inserts or replaces the job's row from its audit snapshot (one transaction)."""
+        row = catalog_row(audit_data)
+        if not row["scan_id"]:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [row[column] for column in COLUMNS]
+                )
+        finally:
+            conn.close()
+
+    def delete(self, scan_id):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM jobs WHERE scan_id = ?", (scan_id,))
+        finally:
+            conn.close()
+
+    def list(self, limit=50, offset=0, query=None, source=None, status=None, sort="start_time", order="desc"):
+        """Returns (rows, total) for one page of jobs matching the filters."""
+        where = []
+        args = []
+        if query:
+            where.append("query LIKE ? COLLATE NOCASE")
+            args.append(f"%{query}%")
+        if source:
+            where.append("source = ?")
+            args.append(source)
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+        column = SORT_COLUMNS.get(sort, "start_time")
+        direction = "ASC" if str(order).lower() == "asc" else "DESC"
+
+        conn = self._connect()
+        try:
+            total = conn.execute(f"SELECT COUNT(*) FROM jobs {where_sql}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM jobs {where_sql} ORDER BY {column} {direction}, scan_id LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows], total
+
+    def finished(self):
+        """Every job that is no longer queued or running, newest first (for retention)."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status NOT IN ('queued', 'running') ORDER BY start_time DESC, scan_id"
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def rebuild(self, data_dir):
+        """Re-indexes every data/jobs/*/audit.json. Returns how many jobs were indexed."""
+        jobs_dir = Path(data_dir) / "jobs"
+        rows = []
+        if jobs_dir.exists():
+            for job_folder in jobs_dir.iterdir():
+                audit_file = job_folder / "audit.json"
+                if not audit_file.exists():
+                    continue
+                try:
+                    with open(audit_file, "r") as f:
+                        data = json.load(f)
+                except:
+                    continue
+                data.setdefault("scan_id", job_folder.name)
+                if not data.get("result_counts") and data.get("output_dir"):
+                    data["result_counts"] = result_counts(data["output_dir"])
+                rows.append(catalog_row(data))
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM jobs")
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)})",
+                    [[row[column] for column in COLUMNS] for row in rows]
+                )
+        finally:
+            conn.close()
+        return len(rows)
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+def get_catalog(data_dir):
+    """Shared catalog for data_dir. A newly created catalog is filled from existing jobs."""
+    path = Path(data_dir) / CATALOG_DB_FILE
+    with _catalogs_lock:
+        if path not in _catalogs:
+            catalog = JobCatalog(path)
+            if catalog.created:
+                count = catalog.rebuild(data_dir)
+                if count:
+                    print(f"[*] Job catalog created, indexed {count} existing jobs.")
+            _catalogs[path] = catalog
+        return _catalogs[path]
+
+def main():
+    from config import DATA_DIR
+    parser = argparse.ArgumentParser(description="Rebuild the job catalog from data/jobs/*/audit.json")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every job")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"Data directory (default: {DATA_DIR})")
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return
+    count = JobCatalog(Path(args.data_dir) / CATALOG_DB_FILE).rebuild(args.data_dir)
+    print(f"Indexed {count} jobs into {Path(args.data_dir) / CATALOG_DB_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Job outcome exceptions shared by the queue, the pipeline and the stage modules.
+# Kept dependency-free so stage code (analyze_images, rank_deals) can raise them
+# without importing the queue backends.
+
+class JobCancelled(Exception):
+    """Raised by a job handler when the job was cancelled (POST /scan/{id}/cancel)."""
+    pass
+
+class JobPreempted(Exception):
+    """Raised by a job handler at a stage boundary to give its worker to a higher-priority job."""
+    pass
+
+class JobLeaseLost(Exception):
+    """Raised by a job handler that stopped because its lease ran out and the job went to another worker."""
+    pass
+
+class JobDeferred(Exception):
+    """Raised by a job handler that can't start yet; the job goes back on the queue for delay seconds."""
+    def __init__(self, reason, delay):
+        super().__init__(reason)
+        self.delay = delay
@@ -0,0 +1,723 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+import asyncio
+from pathlib import Path
+from datetime import datetime, timedelta
+from contextlib import asynccontextmanager
+
+from job_errors import JobCancelled, JobPreempted, JobLeaseLost, JobDeferred
+
+try:
+    import redis
+except ImportError:
+    redis = None # Only needed for QUEUE_BACKEND=redis
+
+# Durable scan queue with a bounded worker pool.
+# POST /scan, resumes and scheduled runs enqueue here instead of starting work directly;
+# worker threads (inside the API process and/or separate worker.py processes on other
+# boxes) claim jobs in priority order under a lease they keep alive with heartbeats.
+# Jobs whose lease runs out (worker crashed or hung) are re-leased as resumes.
+# Heavy resources are bounded per process by slot semaphores the pipeline stages
+# acquire (browser, llm), so host load stays predictable under bursts.
+#
+# Backends: "sqlite" (default; data/queue.db, shared by processes on one host or a
+# shared volume via SQLite's file locking) or "redis" (any Redis-protocol server, REDIS_URL).
+
+QUEUE_BACKEND = os.getenv("QUEUE_BACKEND", "sqlite")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "3"))
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "20")) # Queued jobs before new requests get 429
+RESOURCE_SLOTS = {
+    "browser": int(os.getenv("BROWSER_SLOTS", "2")), # Concurrent Chromium instances
+    "llm": int(os.getenv("LLM_SLOTS", "3")),         # Concurrent Gemini-bound stages
+}
+
+# Lower runs first. Manual runs beat scheduled ones.
+PRIORITY_MANUAL = 0
+PRIORITY_SCHEDULED = 10
+
+QUEUE_DB_FILE = "queue.db"
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120")) # Heartbeats renew every third of this
+
+class QueueFull(Exception):
+    pass
+
+# --- Resource slots ---
+
+class ResourceSlots:
+    """Counting semaphores per resource class, with in-use counts for metrics."""
+    def __init__(self, capacities):
+        self.capacities = dict(capacities)
+        self._semaphores = {name: threading.BoundedSemaphore(n) for name, n in capacities.items()}
+        self._in_use = {name: 0 for name in capacities}
+        self._lock = threading.Lock()
+
+    def acquire(self, name, timeout=None):
+        if not self._semaphores[name].acquire(timeout=timeout):
+            return False
+        with self._lock:
+            self._in_use[name] += 1
+        return True
+
+    def release(self, name):
+        with self._lock:
+            self._in_use[name] -= 1
+        self._semaphores[name].release()
+
+    async def acquire_async(self, name):
+        """
+        Blocking acquire off the event loop so other tasks (speculative deep dive) keep running.
+        Cancellable: a cancelled waiter gives up within a second and never leaks the slot.
+        """
+        abandoned = threading.Event()
+        handoff = threading.Lock()
+        acquired = []
+
+        def take():
+            while not self.acquire(name, timeout=1):
+                if abandoned.is_set():
+                    return
+            with handoff:
+                if abandoned.is_set():
+                    self.release(name)
+                else:
+                    acquired.append(True)
+
+        try:
+            await asyncio.to_thread(take)
+        except asyncio.CancelledError:
+            # Whichever side gets the handoff lock second gives the slot back
+            with handoff:
+                abandoned.set()
+                if acquired:
+                    self.release(name)
+            raise
+
+    @asynccontextmanager
+    async def hold(self, name):
+        await self.acquire_async(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def stats(self):
+        with self._lock:
+            return {name: {"capacity": self.capacities[name], "in_use": self._in_use[name]} for name in self.capacities}
+
+resource_slots = ResourceSlots(RESOURCE_SLOTS)
+
+# --- Queue backends ---
+# Both backends implement: enqueue, claim(worker_id), heartbeat(scan_id, worker_id),
+# finish(scan_id, worker_id, error, status), requeue(scan_id, worker_id),
+# defer(scan_id, worker_id, delay), forget(scan_id), status(scan_id),
+# recent(since), promote(scan_id, priority), request_cancel(scan_id), cancel_requested(scan_id),
+# higher_priority_waiting(priority, waited_seconds), requeue_expired(), wait_for_work(timeout), stats().
+
+def lease_deadline(now=None):
+    return ((now or datetime.now()) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+class SQLiteJobQueue:
+    """
+    SQLite-backed queue. Claims run in BEGIN IMMEDIATE transactions, so worker processes
+    sharing the database file never claim the same job.
+    """
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self._wakeup = threading.Event()
+        conn = self._connect()
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    scan_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    enqueued_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    error TEXT
+                )
+            """)
+            # Lease columns (added after the first queue.db version)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "worker_id" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN worker_id TEXT")
+            if "lease_expires_at" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at TEXT")
+            if "cancel_requested" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN cancel_requested INTEGER NOT NULL DEFAULT 0")
+            if "not_before" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN not_before TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs (status, priority, enqueued_at)")
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Autocommit mode; multi-statement writes use explicit BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _write(self, fn):
+        """Runs fn(conn) inside a write-locked transaction and returns its result."""
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn)
+                conn.execute("COMMIT")
+                return result
+            except:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+
+    def _read(self, fn):
+        conn = self._connect()
+        try:
+            return fn(conn)
+        finally:
+            conn.close()
+
+    def enqueue(self, scan_id, kind, payload, priority=PRIORITY_MANUAL, force=False):
+        """
+        Adds a job. Raises QueueFull if MAX_QUEUE_DEPTH jobs are already waiting
+        (unless force) and ValueError if the scan is already queued or running.
+        Returns the job's position in the queue (1 = next).
+        """
+        def add(conn):
+            depth = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if depth >= MAX_QUEUE_DEPTH and not force:
+                raise QueueFull(f"Queue is full ({depth} jobs waiting)")
+
+            existing = conn.execute("SELECT status FROM jobs WHERE scan_id = ?", (scan_id,)).fetchone()
+            if existing and existing["status"] in ("queued", "running"):
+                raise ValueError(f"Scan {scan_id} is already {existing['status']}")
+
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (scan_id, kind, priority, payload, status, enqueued_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (scan_id, kind, priority, json.dumps(payload), datetime.now().isoformat())
+            )
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND (priority < ? OR (priority = ? AND enqueued_at <= (SELECT enqueued_at FROM jobs WHERE scan_id = ?)))",
+                (priority, priority, scan_id)
+            ).fetchone()[0]
+
+        position = self._write(add)
+        self._wakeup.set()
+        return position
+
+    def claim(self, worker_id):
+        """Leases the next queued job to worker_id and returns it as a dict, or None."""
+        def take(conn):
+            now = datetime.now()
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' AND (not_before IS NULL OR not_before <= ?) ORDER BY priority, enqueued_at LIMIT 1",
+                (now.isoformat(),)
+            ).fetchone()
+            if not row:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, worker_id = ?, lease_expires_at = ? WHERE scan_id = ?",
+                (now.isoformat(), worker_id, lease_deadline(now), row["scan_id"])
+            )
+            return row
+
+        row = self._write(take)
+        if not row:
+            return None
+        job = dict(row)
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def heartbeat(self, scan_id, worker_id):
+        """Extends the lease. Returns False if worker_id no longer holds the job."""
+        def renew(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE scan_id = ? AND worker_id = ? AND status = 'running'",
+                (lease_deadline(), scan_id, worker_id)
+            )
+            return cursor.rowcount > 0
+        return self._write(renew)
+
+    def finish(self, scan_id, worker_id, error=None, status=None):
+        status = status or ("failed" if error else "done")
+        def done(conn):
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, lease_expires_at = NULL WHERE scan_id = ? AND worker_id = ?",
+                (status, datetime.now().isoformat(), error, scan_id, worker_id)
+            )
+        self._write(done)
+
+    def requeue(self, scan_id, worker_id):
+        """Puts a preempted job back as a resume, keeping its priority and place in line."""
+        self._write(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'queued', kind = 'resume', started_at = NULL, worker_id = NULL, lease_expires_at = NULL "
+            "WHERE scan_id = ? AND worker_id = ? AND status = 'running'",
+            (scan_id, worker_id)
+        ))
+        self._wakeup.set()
+
+    def defer(self, scan_id, worker_id, delay):
+        """Puts a job that can't start yet back in line; it isn't claimable for delay seconds."""
+        self._write(lambda conn: conn.execute(
+            "UPDATE jobs SET status = 'queued', started_at = NULL, worker_id = NULL, lease_expires_at = NULL, not_before = ? "
+            "WHERE scan_id = ? AND worker_id = ? AND status = 'running'",
+            ((datetime.now() + timedelta(seconds=delay)).isoformat(), scan_id, worker_id)
+        ))
+
+    def request_cancel(self, scan_id):
+        """
+        Queued jobs are cancelled on the spot; running ones are flagged for their worker.
+        Returns "cancelled", "cancelling", the job's (finished) status, or None if unknown.
+        """
+        def cancel(conn):
+            row = conn.execute("SELECT status FROM jobs WHERE scan_id = ?", (scan_id,)).fetchone()
+            if not row:
+                return None
+            if row["status"] == "queued":
+                conn.execute(
+                    "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE scan_id = ?",
+                    (datetime.now().isoformat(), scan_id)
+                )
+                return "cancelled"
+            if row["status"] == "running":
+                conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE scan_id = ?", (scan_id,))
+                return "cancelling"
+            return row["status"]
+        return self._write(cancel)
+
+    def cancel_requested(self, scan_id):
+        row = self._read(lambda conn: conn.execute("SELECT cancel_requested FROM jobs WHERE scan_id = ?", (scan_id,)).fetchone())
+        return bool(row and row["cancel_requested"])
+
+    def higher_priority_waiting(self, priority, waited_seconds):
+        """True if a job with a better priority has been queued for at least waited_seconds."""
+        cutoff = (datetime.now() - timedelta(seconds=waited_seconds)).isoformat()
+        row = self._read(lambda conn: conn.execute(
+            "SELECT 1 FROM jobs WHERE status = 'queued' AND priority < ? AND enqueued_at <= ? "
+            "AND (not_before IS NULL OR not_before <= ?) LIMIT 1",
+            (priority, cutoff, datetime.now().isoformat())
+        ).fetchone())
+        return row is not None
+
+    def status(self, scan_id):
+        row = self._read(lambda conn: conn.execute("SELECT status FROM jobs WHERE scan_id = ?", (scan_id,)).fetchone())
+        return row["status"] if row else None
+
+    def recent(self, since):
+        """Jobs enqueued at or after since (datetime), newest first, with payloads decoded."""
+        rows = self._read(lambda conn: conn.execute(
+            "SELECT scan_id, kind, status, priority, payload, enqueued_at FROM jobs WHERE enqueued_at >= ? ORDER BY enqueued_at DESC",
+            (since.isoformat(),)
+        ).fetchall())
+        return [dict(row, payload=json.loads(row["payload"])) for row in rows]
+
+    def promote(self, scan_id, priority):
+        """Moves a still-queued job up to priority (never down)."""
+        self._write(lambda conn: conn.execute(
+            "UPDATE jobs SET priority = ? WHERE scan_id = ? AND status = 'queued' AND priority > ?",
+            (priority, scan_id, priority)
+        ))
+
+    def forget(self, scan_id):
+        """Drops a finished job's record (its scan was deleted or archived)."""
+        self._write(lambda conn: conn.execute(
+            "DELETE FROM jobs WHERE scan_id = ? AND status NOT IN ('queued', 'running')", (scan_id,)
+        ))
+
+    def requeue_expired(self):
+        """
+        Running jobs whose lease ran out (worker died or hung) go back on the queue as
+        resumes; their checkpoints let them skip completed stages. Returns how many.
+        """
+        def requeue(conn):
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', kind = 'resume', started_at = NULL, worker_id = NULL, lease_expires_at = NULL "
+                "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (datetime.now().isoformat(),)
+            )
+            return cursor.rowcount
+        return self._write(requeue)
+
+    def wait_for_work(self, timeout):
+        # Wakes early for jobs enqueued by this process; other processes are seen on the next poll
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+    def stats(self):
+        def collect(conn):
+            counts = {row["status"]: row["n"] for row in conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status")}
+            by_priority = {str(row["priority"]): row["n"] for row in conn.execute(
+                "SELECT priority, COUNT(*) AS n FROM jobs WHERE status = 'queued' GROUP BY priority"
+            )}
+            by_worker = {row["worker_id"]: row["n"] for row in conn.execute(
+                "SELECT worker_id, COUNT(*) AS n FROM jobs WHERE status = 'running' GROUP BY worker_id"
+            )}
+            oldest = conn.execute("SELECT MIN(enqueued_at) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            return counts, by_priority, by_worker, oldest
+
+        counts, by_priority, by_worker, oldest = self._read(collect)
+        return queue_stats(counts, by_priority, by_worker, oldest)
+
+class RedisJobQueue:
+    """
+    Redis-protocol backend for workers on several boxes. Jobs are hashes, the pending
+    queue is a sorted set scored by (priority, enqueue time) and leases a sorted set
+    scored by expiry. Claims are a Lua script, so they are atomic on the server.
+    """
+    PREFIX = "mh:"
+
+    CLAIM_SCRIPT = """
+    local popped = redis.call('ZPOPMIN', KEYS[1])
+    if #popped == 0 then return nil end
+    local scan_id = popped[1]
+    local job_key = KEYS[3] .. scan_id
+    redis.call('HSET', job_key, 'status', 'running', 'started_at', ARGV[1], 'worker_id', ARGV[2])
+    redis.call('ZADD', KEYS[2], ARGV[3], scan_id)
+    return scan_id
+    """
+
+    # Renews the lease only if this worker still owns the running job and its lease entry
+    # hasn't been taken by requeue_expired - checked and extended in one step
+    HEARTBEAT_SCRIPT = """
+    local job_key = KEYS[2] .. ARGV[1]
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then return 0 end
+    if redis.call('HGET', job_key, 'worker_id') ~= ARGV[2] or redis.call('HGET', job_key, 'status') ~= 'running' then return 0 end
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+    return 1
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise RuntimeError("QUEUE_BACKEND=redis needs the 'redis' package (pip install redis).")
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.pending_key = self.PREFIX + "pending"
+        self.leases_key = self.PREFIX + "leases"
+        self.delayed_key = self.PREFIX + "delayed" # Deferred jobs scored by when they may run again
+        self.job_prefix = self.PREFIX + "job:"
+        self.jobs_key = self.PREFIX + "jobs"
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+        self._heartbeat = self.client.register_script(self.HEARTBEAT_SCRIPT)
+
+    def _score(self, priority, enqueued_at):
+        # Priority first, then FIFO
+        return priority * 1e13 + enqueued_at
+
+    def enqueue(self, scan_id, kind, payload, priority=PRIORITY_MANUAL, force=False):
+        job_key = self.job_prefix + scan_id
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(self.pending_key, job_key)
+                    depth = pipe.zcard(self.pending_key)
+                    if depth >= MAX_QUEUE_DEPTH and not force:
+                        raise QueueFull(f"Queue is full ({depth} jobs waiting)")
+                    status = pipe.hget(job_key, "status")
+                    if status in ("queued", "running"):
+                        raise ValueError(f"Scan {scan_id} is already {status}")
+
+                    now = time.time()
+                    score = self._score(priority, now)
+                    pipe.multi()
+                    pipe.delete(job_key)
+                    pipe.hset(job_key, mapping={
+                        "scan_id": scan_id,
+                        "kind": kind,
+                        "priority": priority,
+                        "payload": json.dumps(payload),
+                        "status": "queued",
+                        "enqueued_at": datetime.fromtimestamp(now).isoformat(),
+                        "enqueued_ts": now
+                    })
+                    pipe.zadd(self.pending_key, {scan_id: score})
+                    pipe.sadd(self.jobs_key, scan_id)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    continue
+        return self.client.zcount(self.pending_key, "-inf", score)
+
+    def claim(self, worker_id):
+        now = datetime.now()
+        scan_id = self._claim(
+            keys=[self.pending_key, self.leases_key, self.job_prefix],
+            args=[now.isoformat(), worker_id, time.time() + JOB_LEASE_SECONDS]
+        )
+        if not scan_id:
+            return None
+        job = self.client.hgetall(self.job_prefix + scan_id)
+        job["priority"] = int(job["priority"])
+        job["payload"] = json.loads(job["payload"])
+        return job
+
+    def heartbeat(self, scan_id, worker_id):
+        return bool(self._heartbeat(
+            keys=[self.leases_key, self.job_prefix],
+            args=[scan_id, worker_id, time.time() + JOB_LEASE_SECONDS]
+        ))
+
+    def finish(self, scan_id, worker_id, error=None, status=None):
+        job_key = self.job_prefix + scan_id
+        if self.client.hget(job_key, "worker_id") != worker_id:
+            return # Lease was lost and the job handed to someone else
+        with self.client.pipeline() as pipe:
+            pipe.hset(job_key, mapping={
+                "status": status or ("failed" if error else "done"),
+                "finished_at": datetime.now().isoformat(),
+                "error": error or ""
+            })
+            pipe.zrem(self.leases_key, scan_id)
+            pipe.execute()
+
+    def requeue(self, scan_id, worker_id):
+        job_key = self.job_prefix + scan_id
+        status, owner, priority, enqueued_ts = self.client.hmget(job_key, "status", "worker_id", "priority", "enqueued_ts")
+        if status != "running" or owner != worker_id:
+            return
+        with self.client.pipeline() as pipe:
+            pipe.hset(job_key, mapping={"status": "queued", "kind": "resume", "worker_id": ""})
+            pipe.zrem(self.leases_key, scan_id)
+            pipe.zadd(self.pending_key, {scan_id: self._score(int(priority), float(enqueued_ts or time.time()))})
+            pipe.execute()
+
+    def defer(self, scan_id, worker_id, delay):
+        job_key = self.job_prefix + scan_id
+        status, owner = self.client.hmget(job_key, "status", "worker_id")
+        if status != "running" or owner != worker_id:
+            return
+        with self.client.pipeline() as pipe:
+            pipe.hset(job_key, mapping={"status": "queued", "worker_id": ""})
+            pipe.zrem(self.leases_key, scan_id)
+            pipe.zadd(self.delayed_key, {scan_id: time.time() + delay})
+            pipe.execute()
+
+    def request_cancel(self, scan_id):
+        job_key = self.job_prefix + scan_id
+        status = self.client.hget(job_key, "status")
+        # ZREM decides between this cancel and a worker claiming (or releasing) the job
+        if status == "queued" and (self.client.zrem(self.pending_key, scan_id) or self.client.zrem(self.delayed_key, scan_id)):
+            self.client.hset(job_key, mapping={"status": "cancelled", "finished_at": datetime.now().isoformat()})
+            return "cancelled"
+        status = self.client.hget(job_key, "status")
+        if status == "running":
+            self.client.hset(job_key, "cancel_requested", 1)
+            return "cancelling"
+        return status
+
+    def cancel_requested(self, scan_id):
+        return self.client.hget(self.job_prefix + scan_id, "cancel_requested") == "1"
+
+    def higher_priority_waiting(self, priority, waited_seconds):
+        # Head of the pending set is the best priority, oldest first
+        head = self.client.zrange(self.pending_key, 0, 0, withscores=True)
+        if not head:
+            return False
+        head_priority = int(head[0][1] // 1e13)
+        enqueued_ts = head[0][1] - head_priority * 1e13
+        return head_priority < priority and enqueued_ts <= time.time() - waited_seconds
+
+    def status(self, scan_id):
+        return self.client.hget(self.job_prefix + scan_id, "status")
+
+    def recent(self, since):
+        jobs = []
+        for scan_id in self.client.smembers(self.jobs_key):
+            job = self.client.hgetall(self.job_prefix + scan_id)
+            if not job or job.get("enqueued_at", "") < since.isoformat():
+                continue
+            job["priority"] = int(job["priority"])
+            job["payload"] = json.loads(job["payload"])
+            jobs.append(job)
+        jobs.sort(key=lambda job: job["enqueued_at"], reverse=True)
+        return jobs
+
+    def promote(self, scan_id, priority):
+        job_key = self.job_prefix + scan_id
+        job = self.client.hmget(job_key, "status", "priority", "enqueued_ts")
+        status, current, enqueued_ts = job
+        if status != "queued" or int(current) <= priority:
+            return
+        with self.client.pipeline() as pipe:
+            pipe.hset(job_key, "priority", priority)
+            pipe.zadd(self.pending_key, {scan_id: self._score(priority, float(enqueued_ts or time.time()))}, xx=True)
+            pipe.execute()
+
+    def forget(self, scan_id):
+        job_key = self.job_prefix + scan_id
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(job_key)
+                    if pipe.hget(job_key, "status") in ("queued", "running"):
+                        return
+                    pipe.multi()
+                    pipe.delete(job_key)
+                    pipe.srem(self.jobs_key, scan_id)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def requeue_expired(self):
+        requeued = 0
+        for scan_id in self.client.zrangebyscore(self.leases_key, "-inf", time.time()):
+            # ZREM decides which worker gets to requeue it
+            if not self.client.zrem(self.leases_key, scan_id):
+                continue
+            job_key = self.job_prefix + scan_id
+            job = self.client.hgetall(job_key)
+            if job.get("status") != "running":
+                continue
+            with self.client.pipeline() as pipe:
+                pipe.hset(job_key, mapping={"status": "queued", "kind": "resume", "worker_id": ""})
+                # Original enqueue time keeps its place in line, like the SQLite backend
+                pipe.zadd(self.pending_key, {scan_id: self._score(int(job["priority"]), float(job.get("enqueued_ts") or time.time()))})
+                pipe.execute()
+            requeued += 1
+        # Deferred jobs whose delay is over go back in line at their original place
+        for scan_id in self.client.zrangebyscore(self.delayed_key, "-inf", time.time()):
+            if not self.client.zrem(self.delayed_key, scan_id):
+                continue
+            priority, enqueued_ts = self.client.hmget(self.job_prefix + scan_id, "priority", "enqueued_ts")
+            self.client.zadd(self.pending_key, {scan_id: self._score(int(priority), float(enqueued_ts or time.time()))})
+        return requeued
+
+    def wait_for_work(self, timeout):
+        time.sleep(timeout)
+
+    def stats(self):
+        counts = {}
+        by_priority = {}
+        by_worker = {}
+        oldest = None
+        for scan_id in self.client.smembers(self.jobs_key):
+            job = self.client.hmget(self.job_prefix + scan_id, "status", "priority", "worker_id", "enqueued_at")
+            status, priority, worker_id, enqueued_at = job
+            if not status:
+                continue
+            counts[status] = counts.get(status, 0) + 1
+            if status == "queued":
+                by_priority[str(priority)] = by_priority.get(str(priority), 0) + 1
+                oldest = min(oldest, enqueued_at) if oldest else enqueued_at
+            elif status == "running":
+                by_worker[worker_id] = by_worker.get(worker_id, 0) + 1
+        return queue_stats(counts, by_priority, by_worker, oldest)
+
+def queue_stats(counts, by_priority, by_worker, oldest):
+    oldest_wait = None
+    if oldest:
+        oldest_wait = round((datetime.now() - datetime.fromisoformat(oldest)).total_seconds(), 1)
+    return {
+        "backend": QUEUE_BACKEND,
+        "queued": counts.get("queued", 0),
+        "running": counts.get("running", 0),
+        "done": counts.get("done", 0),
+        "failed": counts.get("failed", 0),
+        "cancelled": counts.get("cancelled", 0),
+        "queued_by_priority": by_priority,
+        "running_by_worker": by_worker,
+        "oldest_wait_seconds": oldest_wait,
+        "max_queue_depth": MAX_QUEUE_DEPTH,
+        "saturated": counts.get("queued", 0) >= MAX_QUEUE_DEPTH,
+        "local_workers": len([w for w in _workers if w.is_alive()]),
+        "slots": resource_slots.stats()
+    }
+
+def open_queue(data_dir):
+    """Returns the configured queue backend (QUEUE_BACKEND) for the shared data dir."""
+    if QUEUE_BACKEND == "redis":
+        return RedisJobQueue(REDIS_URL)
+    if QUEUE_BACKEND != "sqlite":
+        raise RuntimeError(f"Unknown QUEUE_BACKEND '{QUEUE_BACKEND}' (use sqlite or redis)")
+    return SQLiteJobQueue(Path(data_dir) / QUEUE_DB_FILE)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+def get_queue(data_dir):
+    """Shared queue handle for data_dir (one per process, like get_catalog)."""
+    key = str(Path(data_dir).resolve())
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = open_queue(data_dir)
+        return _queues[key]
+
+# --- Workers ---
+
+_workers = []
+_stop = threading.Event()
+
+def node_name():
+    return os.getenv("WORKER_NAME") or f"{socket.gethostname()}-{os.getpid()}"
+
+def heartbeat_loop(job_queue, scan_id, worker_id, done, on_lease_lost=None):
+    while not done.wait(JOB_LEASE_SECONDS / 3):
+        try:
+            if not job_queue.heartbeat(scan_id, worker_id):
+                print(f"[!] {worker_id} lost the lease on {scan_id}; stopping the local run.")
+                if on_lease_lost:
+                    on_lease_lost(scan_id)
+                return
+        except Exception as e:
+            print(f"[!] {worker_id} heartbeat failed for {scan_id}: {e}")
+
+def worker_loop(job_queue, handler, worker_id, on_lease_lost=None):
+    while not _stop.is_set():
+        try:
+            job_queue.requeue_expired()
+            job = job_queue.claim(worker_id)
+        except Exception as e:
+            print(f"[!] {worker_id} could not reach the queue: {e}")
+            job = None
+        if not job:
+            job_queue.wait_for_work(timeout=2)
+            continue
+
+        print(f"[*] {worker_id} picked up {job['kind']} job {job['scan_id']} (priority {job['priority']})")
+        done = threading.Event()
+        threading.Thread(target=heartbeat_loop, args=(job_queue, job["scan_id"], worker_id, done, on_lease_lost), daemon=True).start()
+        try:
+            handler(job)
+            job_queue.finish(job["scan_id"], worker_id)
+        except JobCancelled:
+            print(f"[*] {worker_id} job {job['scan_id']} cancelled")
+            job_queue.finish(job["scan_id"], worker_id, status="cancelled")
+        except JobPreempted as e:
+            print(f"[*] {worker_id} job {job['scan_id']} preempted: {e}")
+            job_queue.requeue(job["scan_id"], worker_id)
+        except JobDeferred as e:
+            print(f"[*] {worker_id} job {job['scan_id']} deferred {e.delay:g}s: {e}")
+            job_queue.defer(job["scan_id"], worker_id, e.delay)
+        except JobLeaseLost:
+            print(f"[!] {worker_id} job {job['scan_id']} stopped after losing its lease")
+        except Exception as e:
+            print(f"[!] {worker_id} job {job['scan_id']} failed: {e}")
+            job_queue.finish(job["scan_id"], worker_id, error=str(e))
+        finally:
+            done.set()
+
+def start_workers(job_queue, handler, count=SCAN_WORKERS, on_lease_lost=None):
+    """
+    Starts count daemon worker threads calling handler(job) for each claimed job.
+    on_lease_lost(scan_id) is called when a heartbeat finds the job was handed to another
+    worker; it should stop the running handler, which then raises JobLeaseLost.
+    """
+    _stop.clear()
+    node = node_name()
+    for i in range(count):
+        worker_id = f"{node}/{i + 1}"
+        thread = threading.Thread(target=worker_loop, args=(job_queue, handler, worker_id, on_lease_lost), daemon=True)
+        thread.start()
+        _workers.append(thread)
+    print(f"[*] Started {count} scan workers on {node} ({QUEUE_BACKEND} queue, slots: {RESOURCE_SLOTS}).")
+
+def stop_workers():
+    _stop.set()
@@ -0,0 +1,184 @@
+import os
+import json
+import atexit
+import threading
+import contextvars
+from datetime import datetime
+
+# Buffered process log writer.
+# ScanMonitor.log_process used to open, append and close process.log for every stdout
+# line of every stage. Lines now go into per-file in-memory buffers that a background
+# thread writes out in one append per file when LOG_FLUSH_BYTES are pending or every
+# LOG_FLUSH_SECONDS, whichever comes first. finish_scan() and process exit flush at once.
+# Each line is written twice: the usual "[HH:MM:SS] message" text to process.log and a
+# structured record ({"ts", "level", "stage", "msg"}) to process.jsonl for filtering.
+
+PROCESS_LOG_JSONL = "process.jsonl"
+LOG_FLUSH_BYTES = int(os.getenv("LOG_FLUSH_BYTES", str(64 * 1024)))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "0.5"))
+
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+
+# GET /scan/{id}/log: first load returns at most the last LOG_TAIL_BYTES;
+# a ?since= read returns at most LOG_READ_MAX_BYTES (the client follows the cursor)
+LOG_TAIL_BYTES = int(os.getenv("LOG_TAIL_BYTES", str(256 * 1024)))
+LOG_READ_MAX_BYTES = int(os.getenv("LOG_READ_MAX_BYTES", str(1024 * 1024)))
+
+# Stage the current task/thread is running (set by pipeline.run_step; to_thread copies it)
+current_stage = contextvars.ContextVar("log_stage", default=None)
+
+def infer_level(message):
+    """Level for plain print() output, from the wording the stages already use."""
+    lower = message.lower()
+    if "[!]" in message or "error" in lower or "critical" in lower or "failed" in lower or "aborted" in lower:
+        return "ERROR"
+    if "warning" in lower or "skipping" in lower or "retry" in lower:
+        return "WARNING"
+    return "INFO"
+
+class LogSink:
+    def __init__(self):
+        self._buffers = {} # path -> [text, ...]
+        self._pending = 0
+        self._cond = threading.Condition()
+        # Held while writing, so a synchronous flush never overtakes the background one
+        self._io_lock = threading.Lock()
+        self._thread = None
+        self.flushes = 0
+
+    def write(self, path, text):
+        with self._cond:
+            self._buffers.setdefault(path, []).append(text)
+            self._pending += len(text)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+            if self._pending >= LOG_FLUSH_BYTES:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(timeout=LOG_FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self, paths=None):
+        """Writes out buffered lines now (all files, or just paths)."""
+        with self._io_lock:
+            with self._cond:
+                if paths is None:
+                    buffers, self._buffers = self._buffers, {}
+                else:
+                    buffers = {path: self._buffers.pop(path) for path in paths if path in self._buffers}
+                self._pending -= sum(len(text) for chunks in buffers.values() for text in chunks)
+            for path, chunks in buffers.items():
+                try:
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(chunks))
+                    self.flushes += 1
+                except OSError as e:
+                    print(f"[!] Could not write {path}: {e}")
+
+process_log = LogSink()
+atexit.register(process_log.flush)
+
+def format_record(record):
+    return f"[{record['ts'][11:19]}] {record['msg']}"
+
+def filter_records(records, stage=None, level=None):
+    """Records for stage (if given) at or above level (if given)."""
+    min_level = LEVELS.get((level or "").upper(), 0)
+    return [
+        record for record in records
+        if (not stage or record.get("stage") == stage) and LEVELS.get(record.get("level"), 20) >= min_level
+    ]
+
+def parse_records(lines):
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
+
+def read_records(jsonl_file, stage=None, level=None):
+    """Structured log records for one scan, optionally filtered by stage and minimum level."""
+    try:
+        with open(jsonl_file, "r", encoding="utf-8") as f:
+            return filter_records(parse_records(f), stage, level)
+    except FileNotFoundError:
+        return []
+
+def read_log_chunk(path, since=None, tail=LOG_TAIL_BYTES, max_bytes=LOG_READ_MAX_BYTES):
+    """
+    Incremental read of an append-only log. Only the requested byte range is read (seek),
+    never the whole file, and only whole lines are returned.
+      since=None  first load: the last `tail` bytes, from the first line boundary
+      since=N     up to max_bytes of lines appended after byte N
+    Returns {"text", "start", "cursor", "size", "truncated", "reset"}; pass cursor back as
+    since. reset means since was past the end of the file (rewritten), so this is a fresh tail.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return {"text": "", "start": 0, "cursor": 0, "size": 0, "truncated": False, "reset": since is not None and since > 0}
+
+    reset = since is not None and since > size
+    if since is None or reset:
+        start = max(0, size - max(0, tail))
+        limit = size - start
+    else:
+        start = max(0, since)
+        limit = min(size - start, max_bytes)
+
+    with open(path, "rb") as f:
+        if start > 0 and (since is None or reset):
+            # Tail: begin after the first line break at or after start
+            f.seek(start - 1)
+            chunk = f.read(limit + 1)
+            skip = chunk.find(b"\n") + 1
+            chunk = chunk[skip:] if skip else b""
+            start += skip - 1 if skip else limit
+        else:
+            f.seek(start)
+            chunk = f.read(limit)
+
+    end = chunk.rfind(b"\n") + 1
+    if not end and len(chunk) >= max_bytes:
+        end = len(chunk) # One line longer than max_bytes; don't stall on it
+    text = chunk[:end].decode("utf-8", errors="replace")
+    return {
+        "text": text,
+        "start": start,
+        "cursor": start + end,
+        "size": size,
+        "truncated": start > 0 and (since is None or reset),
+        "reset": reset
+    }
+
+def read_new_records(jsonl_file, offset=0):
+    """
+    Records appended to process.jsonl since byte offset. Returns (records, new offset);
+    a line still being written is left for the next call.
+    """
+    try:
+        with open(jsonl_file, "rb") as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], offset
+    end = chunk.rfind(b"\n") + 1
+    return parse_records(chunk[:end].splitlines()), offset + end
+
+def log_record(text_file, jsonl_file, message, level=None, stage=None):
+    """Buffers one line for process.log and process.jsonl."""
+    now = datetime.now()
+    record = {
+        "ts": now.isoformat(),
+        "level": level or infer_level(message),
+        "stage": stage or current_stage.get(),
+        "msg": message
+    }
+    process_log.write(text_file, f"[{now.strftime('%H:%M:%S')}] {message}\n")
+    process_log.write(jsonl_file, json.dumps(record, ensure_ascii=False) + "\n")
@@ -1,69 +1,60 @@
-from fastapi import FastAPI, BackgroundTasks, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 import json
 from pydantic import BaseModel
-import subprocess
 import os
 import sys
 import uuid
 from pathlib import Path
 from audit import ScanMonitor
-
-# Determine data directory
-# Default to /app/data (Docker)
-# Fallback 1: ./data (Local backend relative)
-# Fallback 2: ../data (Local project root relative)
-if os.path.exists("/.dockerenv"):
-    DATA_DIR = "/app/data"
-else:
-    # Try backend-relative first
-    backend_data = Path(__file__).parent / "data"
-    # Try project-root relative
-    project_data = Path(__file__).parent.parent / "data"
-    
-    # Priority: Project Root Data > Backend Data
-    if project_data.exists():
-        DATA_DIR = str(project_data)
-    elif backend_data.exists():
-        DATA_DIR = str(backend_data)
-    else:
-        # Default to project root and create it
-        DATA_DIR = str(project_data)
-
-# Determine auth file path
-if os.path.exists("/.dockerenv"):
-    AUTH_FILE = "/app/auth.json"
-else:
-    # Try backend-relative first (if moved to backend)
-    backend_auth = Path(__file__).parent / "auth.json"
-    # Try project-root relative (usual location)
-    project_auth = Path(__file__).parent.parent / "auth.json"
-    
-    if project_auth.exists():
-        AUTH_FILE = str(project_auth)
-    elif backend_auth.exists():
-        AUTH_FILE = str(backend_auth)
-    else:
-        # Default fallback
-        AUTH_FILE = str(project_auth)
+from log_sink import read_log_chunk, filter_records, parse_records, format_record, PROCESS_LOG_JSONL, LOG_TAIL_BYTES
+from job_catalog import get_catalog
+from search_index import get_search_index, SEARCH_COUNT_LIMIT
+from status_cache import status_cache, etag_matches, etag_for
+from scan_events import scan_event_stream
+from io_pool import run_io, shutdown as shutdown_io
+from thumbnails import thumbnail
+from retention import delete_scan, maintenance, compactor, compact, policy as retention_policy, COMPACT_INTERVAL_MINUTES
+from pipeline import load_checkpoint, enqueue_scan, submit_scan, cancel_scan, get_scan_queue, run_job, lease_lost, start_log_router, stop_log_router
+from job_queue import QueueFull, PRIORITY_MANUAL, SCAN_WORKERS, start_workers, stop_workers
+
+from config import DATA_DIR, AUTH_FILE
 
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
 
+# Scan worker threads inside the API process (0 = leave scanning to worker.py nodes)
+EMBEDDED_WORKERS = int(os.getenv("EMBEDDED_WORKERS", str(SCAN_WORKERS)))
+
 from contextlib import asynccontextmanager
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Local import to avoid circular dependency or initialization order issues
+    # Scan workers first: scheduled scans only enqueue, the workers run them.
+    # EMBEDDED_WORKERS=0 makes this an API-only node when worker.py processes do the scanning.
+    # Per-scan stdout routing into process.log, installed once for the server's lifetime
+    start_log_router()
+    if EMBEDDED_WORKERS > 0:
+        start_workers(get_scan_queue(), run_job, count=EMBEDDED_WORKERS, on_lease_lost=lease_lost)
     try:
         from scheduler import start_scheduler, scheduler
         start_scheduler()
     except Exception as e:
         print(f"[!] Scheduler startup failed: {e}")
+    # Background retention/compaction (retention.py); COMPACT_INTERVAL_MINUTES=0 disables it
+    compactor.start()
     
     yield
     
     # Shutdown: Clean up
+    compactor.stop()
+    maintenance.shutdown()
+    stop_workers()
+    shutdown_io()
+    stop_log_router()
     try:
         if scheduler.running:
             scheduler.shutdown()
@@ -86,9 +77,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Response compression for JSON over 1 KiB: Brotli if brotli-asgi is installed (gzip for
+# clients without br), otherwise gzip. SSE streams are skipped (compression would buffer
+# events) and so are /data and /thumb images (already compressed).
+try:
+    from brotli_asgi import BrotliMiddleware as CompressionBase
+    COMPRESSION_OPTIONS = {"minimum_size": 1024, "gzip_fallback": True}
+except ImportError:
+    CompressionBase = GZipMiddleware
+    COMPRESSION_OPTIONS = {"minimum_size": 1024}
+
+class CompressionMiddleware(CompressionBase):
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (scope["path"].endswith("/events") or scope["path"].startswith(("/data/", "/thumb/"))):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+app.add_middleware(CompressionMiddleware, **COMPRESSION_OPTIONS)
+
 # Serve data directory (images)
 app.mount("/data", StaticFiles(directory=DATA_DIR), name="data")
 
+@app.get("/thumb/{scan}/{file}")
+async def get_thumbnail(scan: str, file: str, request: Request, w: int = 320):
+    """
+    Resized screenshot (WebP if the browser accepts it, else JPEG) for /data/{scan}/{file}.
+    w snaps up to a standard width. Cached on disk; immutable for the browser.
+    """
+    webp = "image/webp" in request.headers.get("accept", "")
+    try:
+        path, etag, media_type = await thumbnail(scan, file, w, webp=webp)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Not a screenshot")
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
 print("----------------------------------------------------------------")
 print(f"[*] MARKETPLACE HUNTER BACKEND STARTED")
 print(f"[*] DATA_DIR: {DATA_DIR}")
@@ -102,322 +131,434 @@ class ScanRequest(BaseModel):
     min_listings: int = 30
     user_intent: str = None
     source: str = "manual"
+    speculative: bool = False # Start deep dive on high-rated items before ranking finishes
+    speculative_rating: float = 9
+
+def scan_params(request: ScanRequest):
+    return {
+        "query": request.query,
+        "location": request.location,
+        "radius": request.radius,
+        "min_listings": request.min_listings,
+        "user_intent": request.user_intent,
+        "speculative": request.speculative,
+        "speculative_rating": request.speculative_rating
+    }
 
-def run_scraper_pipeline(request: ScanRequest, scan_id: str):
+def queue_scan(scan_id, params, monitor_fields, resume=False):
+    """Enqueues at manual priority; a saturated queue becomes 429 so clients back off."""
+    try:
+        return enqueue_scan(scan_id, params, monitor_fields, priority=PRIORITY_MANUAL, resume=resume)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/scan")
+async def start_scan(request: ScanRequest):
     """
-    Runs the full scraping and analysis pipeline in the background.
+    Queues a scan. Identical requests (same query/location/radius) within the coalescing
+    window attach to the existing scan, or derive from it when only the intent differs.
     """
-    # monitor will create the directory structure at data/jobs/{scan_id}
-    monitor = ScanMonitor(
-        scan_id, 
-        data_dir=DATA_DIR,
-        query=request.query,
-        location=request.location,
-        radius=request.radius,
-        min_listings=request.min_listings,
-        user_intent=request.user_intent,
-        source=request.source
-    )
-    monitor.start_step("pipeline_wall_clock")
-    
+    monitor_fields = {
+        "query": request.query,
+        "location": request.location,
+        "radius": request.radius,
+        "min_listings": request.min_listings,
+        "user_intent": request.user_intent,
+        "source": request.source
+    }
     try:
-        monitor.log_process(f"Starting scan {scan_id} for '{request.query}'...")
-        monitor.log_process(f"Using Data Dir: {DATA_DIR}")
-        monitor.log_process(f"Using Auth File: {AUTH_FILE}")
-        
-        # Helper to run command and stream logs
-        def run_step(cmd, step_name):
-            monitor.log_process(f"Launching {step_name}...")
-            # Use unbuffered output for python commands
-            if cmd[0] == sys.executable and "-u" not in cmd:
-                 cmd.insert(1, "-u")
-                 
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT, 
-                text=True,
-                bufsize=1 # Line buffered
-            )
-            
-            # Stream output
-            for line in process.stdout:
-                line = line.strip()
-                if line:
-                    monitor.log_process(line)
-                    
-            process.wait()
-            if process.returncode != 0:
-                raise subprocess.CalledProcessError(process.returncode, cmd)
-
-        # 1. Scraper
-        scraper_cmd = [
-            sys.executable, "-u", "-W", "ignore", "scraper.py",
-            "--query", request.query,
-            "--location", request.location,
-            "--radius", str(request.radius),
-            "--min-listings", str(request.min_listings),
-            "--scan-id", scan_id,
-            "--source", request.source,
-            "--auth-file", AUTH_FILE,
-            "--data-dir", DATA_DIR,
-            "--headless"
-        ]
-        run_step(scraper_cmd, "Scraper")
-        
-        # Find output dir
-        data_dir = Path(DATA_DIR)
-        screenshot_dirs = sorted(
-            [d for d in data_dir.iterdir() if d.is_dir() and d.name.startswith("screenshots_")],
-            key=os.path.getmtime,
-            reverse=True
-        )
-        
-        if not screenshot_dirs:
-            monitor.log_process("ERROR: No screenshot directory found.")
-            return
+        submitted = await run_io(submit_scan, scan_params(request), monitor_fields, priority=PRIORITY_MANUAL)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
 
-        latest_dir = screenshot_dirs[0]
-        monitor.log_process(f"Scraper finished. Output: {latest_dir.name}")
-        
-        # Save output directory to audit log
-        monitor.load_from_disk()
-        monitor.data["output_dir"] = str(latest_dir)
-        monitor.save()
-        
-        # 2. Analyze Images
-        analyze_cmd = [
-            sys.executable, "-W", "ignore", "analyze_images.py",
-            "--input-dir", str(latest_dir),
-            "--scan-id", scan_id
-        ]
-        run_step(analyze_cmd, "Image Analysis")
-        
-        # 3. Rank Deals
-        rank_cmd = [
-            sys.executable, "-W", "ignore", "rank_deals.py",
-            "--input", str(latest_dir / "market_inventory.json"),
-            "--scan-id", scan_id
-        ]
-        if request.user_intent:
-            rank_cmd.extend(["--user-intent", request.user_intent])
-        run_step(rank_cmd, "Deal Ranking")
-        
-        # 4. Deep Dive
-        target_file = latest_dir / "potential_buys.json"
+    status = "Attached to existing scan" if submitted["attached_to"] else "Scan queued"
+    return {
+        "status": status,
+        "scan_id": submitted["scan_id"],
+        "query": request.query,
+        "location": request.location,
+        "queue_position": submitted["queue_position"],
+        "attached": bool(submitted["attached_to"]),
+        "derived_from": submitted["derived_from"]
+    }
+
+@app.post("/scan/{scan_id}/resume")
+async def resume_scan(scan_id: str):
+    """
+    Resumes a failed or interrupted scan from its last completed stage.
+    """
+    checkpoint = await run_io(load_checkpoint, DATA_DIR, scan_id)
+    if not checkpoint:
+        raise HTTPException(status_code=404, detail="No checkpoint found for this scan")
+
+    completed = [name for name, stage in checkpoint.data["stages"].items() if stage.get("status") == "complete"]
+    position = await run_io(queue_scan, scan_id, checkpoint.data["params"], {}, resume=True)
+    return {"status": "Scan resume queued", "scan_id": scan_id, "completed_stages": completed, "queue_position": position}
+
+@app.post("/scan/{scan_id}/cancel")
+async def cancel_scan_endpoint(scan_id: str):
+    """
+    Cancels a queued or running scan. A running scan stops at its next await,
+    closes its browser, frees its worker and is recorded as "cancelled".
+    """
+    result = await run_io(cancel_scan, scan_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Scan not found in the queue")
+    if result not in ("cancelled", "cancelling"):
+        raise HTTPException(status_code=409, detail=f"Scan is already {result}")
+    return {"status": result, "scan_id": scan_id}
+
+@app.get("/queue")
+async def queue_metrics():
+    """
+    Queue depth, running jobs and resource slot usage.
+    """
+    return await run_io(lambda: get_scan_queue().stats())
+
+def job_output_dir(audit_data):
+    """Returns the scan's linked output dir (mapped from Docker paths if needed), or None."""
+    out_str = audit_data.get("output_dir")
+    if not out_str:
+        return None
+    # Handle path mapping between Docker and Host
+    if out_str.startswith("/app/data") and DATA_DIR != "/app/data":
+        out_str = out_str.replace("/app/data", DATA_DIR)
+    return Path(out_str)
+
+def build_scan_status(audit_file):
+    """
+    Parses audit.json and the scan's artifacts into the /scan/{scan_id} response.
+    Returns (response, output_dir) for the status cache.
+    """
+    output_dir = None
+    with open(audit_file, "r") as f:
+        data = json.load(f)
+    
+    # [REMOVED REDUNDANT BLOCK]
+    
+    # Queued (including preempted and requeued) scans say so in audit.json
+    status = data.get("status") or ("complete" if data["end_time"] else "running")
+    response = {
+        "status": status,
+        "stats": data,
+        "results": None,
+        "stage": "initializing"
+    }
+    
+    # Load the results if they exist (linked via output_dir in data)
+    # Load the results if they exist (linked via output_dir in data)
+    if "output_dir" in data:
+        output_dir = job_output_dir(data)
         
-        # Fallback just in case
-        if not target_file.exists():
-             target_file = latest_dir / "ranked_deals.json"
-
-        if target_file.exists():
-            deep_dive_cmd = [
-                 sys.executable, "-W", "ignore", "deep_dive.py",
-                 "--input", str(target_file),
-                 "--listings", str(latest_dir / "listings.json"),
-                 "--auth-file", AUTH_FILE,
-                 "--data-dir", DATA_DIR,
-                 "--scan-id", scan_id
-            ]
-            if request.user_intent:
-                deep_dive_cmd.extend(["--user-intent", request.user_intent])
-            
-            run_step(deep_dive_cmd, "Deep Dive Verification")
-            
-        monitor.log_process("Pipeline Completed Successfully.")
-
-    except subprocess.CalledProcessError as e:
-        monitor.log_process(f"CRITICAL ERROR: Step failed: {e.cmd}")
-    except Exception as e:
-        monitor.log_process(f"UNEXPECTED ERROR: {e}")
-    finally:
-        monitor.load_from_disk()
-        monitor.stop_step("pipeline_wall_clock")
-        monitor.finish_scan()
+        # 1. Market Inventory (Always Load if Available)
+        if (output_dir / "market_inventory.json").exists():
+            try:
+                with open(output_dir / "market_inventory.json", "r") as f:
+                    inventory_data = json.load(f)
+                    response["inventory"] = inventory_data 
+                    response["stage"] = "analyzed"
+            except: pass
 
-@app.post("/scan")
-async def start_scan(request: ScanRequest, background_tasks: BackgroundTasks):
-    scan_id = str(uuid.uuid4())
-    background_tasks.add_task(run_scraper_pipeline, request, scan_id)
-    return {"status": "Scan started", "scan_id": scan_id, "query": request.query, "location": request.location}
+        # Speculative verdicts (deep dive started before ranking finished)
+        if (output_dir / "speculative_verdicts.json").exists() and not (output_dir / "verified_steals.json").exists():
+            try:
+                with open(output_dir / "speculative_verdicts.json", "r") as f:
+                    verdicts = json.load(f).get("verdicts", {})
+                    response["early_steals"] = [v for v in verdicts.values() if v.get("verdict") == "VERIFIED_DEAL"]
+            except: pass
 
-@app.get("/scan/{scan_id}")
-def get_scan_status(scan_id: str):
+        # 2. Verified Steals (Final Results)
+        if (output_dir / "verified_steals.json").exists():
+            try:
+                with open(output_dir / "verified_steals.json", "r") as f:
+                    data_loaded = json.load(f)
+                    # Deep Dive returns {"verified": [], "rejected": []}
+                    if isinstance(data_loaded, dict) and "verified" in data_loaded:
+                        response["results"] = data_loaded["verified"]
+                    else:
+                        response["results"] = data_loaded
+                    
+                    response["stage"] = "complete"
+                    return response, output_dir
+            except: pass
+
+        # 3. Potential Buys (Ranked)
+        if (output_dir / "potential_buys.json").exists():
+             try:
+                with open(output_dir / "potential_buys.json", "r") as f:
+                    response["results"] = json.load(f)
+                    response["stage"] = "ranked"
+                    return response, output_dir
+             except: pass
+
+             
+        # 1. Raw Listings (Scraped)
+        # Only fall back to this if we don't have inventory yet
+        elif (output_dir / "listings.json").exists():
+             try:
+                with open(output_dir / "listings.json", "r") as f:
+                    response["results"] = json.load(f)
+                    response["stage"] = "scraped"
+                    return response, output_dir
+             except: pass
+    
+    return response, output_dir
+
+# Item fields the dashboard cards use (?fields=card); full text is in GET /scan/{id}/items/{item_id}
+CARD_FIELDS = [
+    "id", "title", "price", "url", "image_url", "screenshot", "location", "deal_rating",
+    "estimated_new_price", "visual_brand_model", "visual_condition", "visual_tier",
+    "flipper_comment", "reason", "ai_analysis", "verification"
+]
+ITEM_LISTS = ("inventory", "results", "early_steals")
+
+def parse_fields(fields):
+    """?fields= value -> list of item fields (always including id), or None for everything."""
+    if not fields:
+        return None
+    if fields == "card":
+        return CARD_FIELDS
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    return ["id"] + [name for name in names if name != "id"]
+
+def project_status(response, fields=None, offset=0, limit=None):
     """
-    Frontend polls this to get live stats and final results.
+    Pages (offset/limit) and projects (fields) each item list of a /scan/{id} response,
+    adding {list}_total counts. Returns a new dict; the cached response is not modified.
     """
+    if not fields and not offset and limit is None:
+        return response
+    projected = dict(response)
+    end = offset + limit if limit is not None else None
+    for key in ITEM_LISTS:
+        items = response.get(key)
+        if not isinstance(items, list):
+            continue
+        page = items[offset:end]
+        if fields:
+            page = [{f: item[f] for f in fields if f in item} if isinstance(item, dict) else item for item in page]
+        projected[key] = page
+        projected[f"{key}_total"] = len(items)
+    return projected
+
+@app.get("/scan/{scan_id}")
+async def get_scan_status(scan_id: str, request: Request, fields: str = None, offset: int = 0, limit: int = None):
     """
     Frontend polls this to get live stats and final results.
+    Cached until audit.json or a result artifact changes; send the ETag back in
+    If-None-Match to get a 304 instead of the body.
+    fields (comma-separated, or "card") and offset/limit trim the inventory/results lists.
     """
+    item_fields = parse_fields(fields)
+    offset = max(0, offset)
+    limit = max(0, limit) if limit is not None else None
     # Look in the new jobs directory
     job_dir = Path(DATA_DIR) / "jobs" / scan_id
     audit_file = job_dir / "audit.json"
-    
-    if audit_file.exists():
-        with open(audit_file, "r") as f:
-            data = json.load(f)
-        
-        # [REMOVED REDUNDANT BLOCK]
-        
-        status = "complete" if data["end_time"] else "running"
-        response = {
-            "status": status,
-            "stats": data,
-            "results": None,
-            "stage": "initializing"
-        }
-        
-        # Load the results if they exist (linked via output_dir in data)
-        # Load the results if they exist (linked via output_dir in data)
-        if "output_dir" in data:
-            # Handle path mapping between Docker and Host
-            out_str = data["output_dir"]
-            
-            if out_str.startswith("/app/data") and DATA_DIR != "/app/data":
-                out_str = out_str.replace("/app/data", DATA_DIR)
-            output_dir = Path(out_str)
-            
-            # 1. Market Inventory (Always Load if Available)
-            if (output_dir / "market_inventory.json").exists():
-                try:
-                    with open(output_dir / "market_inventory.json", "r") as f:
-                        inventory_data = json.load(f)
-                        response["inventory"] = inventory_data 
-                        response["stage"] = "analyzed"
-                except: pass
-
-            # 2. Verified Steals (Final Results)
-            if (output_dir / "verified_steals.json").exists():
-                try:
-                    with open(output_dir / "verified_steals.json", "r") as f:
-                        data_loaded = json.load(f)
-                        # Deep Dive returns {"verified": [], "rejected": []}
-                        if isinstance(data_loaded, dict) and "verified" in data_loaded:
-                            response["results"] = data_loaded["verified"]
-                        else:
-                            response["results"] = data_loaded
-                        
-                        response["stage"] = "complete"
-                        return response
-                except: pass
-
-            # 3. Potential Buys (Ranked)
-            if (output_dir / "potential_buys.json").exists():
-                 try:
-                    with open(output_dir / "potential_buys.json", "r") as f:
-                        response["results"] = json.load(f)
-                        response["stage"] = "ranked"
-                        return response
-                 except: pass
-
-                 
-            # 1. Raw Listings (Scraped)
-            # Only fall back to this if we don't have inventory yet
-            elif (output_dir / "listings.json").exists():
-                 try:
-                    with open(output_dir / "listings.json", "r") as f:
-                        response["results"] = json.load(f)
-                        response["stage"] = "scraped"
-                        return response
-                 except: pass
-        
-        return response
 
-    return {"status": "not_found", "stats": None, "results": None}
+    def load():
+        if not audit_file.exists():
+            return None, None
+        return status_cache.get(scan_id, audit_file, lambda: build_scan_status(audit_file))
+
+    response, etag = await run_io(load)
+    if response is None:
+        return {"status": "not_found", "stats": None, "results": None}
+    if not etag:
+        return project_status(response, item_fields, offset, limit)
+    if item_fields or offset or limit is not None:
+        etag = etag_for((etag, item_fields, offset, limit))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(project_status(response, item_fields, offset, limit), headers=headers)
+
+def find_item(audit_file, item_id):
+    """
+    Everything known about one item: the raw listing (description_raw, aria_label...)
+    overlaid with its analysis, ranking and verification. None if not found.
+    """
+    with open(audit_file, "r") as f:
+        output_dir = job_output_dir(json.load(f))
+    if not output_dir:
+        return None
+    item = {}
+    for name in ["listings.json", "market_inventory.json", "potential_buys.json", "verified_steals.json"]:
+        try:
+            with open(output_dir / name, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict):
+            data = data.get("verified") or data.get("potential_buys") or []
+        for entry in data:
+            if isinstance(entry, dict) and str(entry.get("id")) == item_id:
+                item.update(entry)
+                break
+    return item or None
+
+@app.get("/scan/{scan_id}/items/{item_id}")
+async def get_scan_item(scan_id: str, item_id: str):
+    """
+    Full detail for one item (the status endpoint can omit descriptions via ?fields=).
+    """
+    audit_file = Path(DATA_DIR) / "jobs" / scan_id / "audit.json"
+    if not await run_io(audit_file.exists):
+        raise HTTPException(status_code=404, detail="Scan not found")
+    item = await run_io(find_item, audit_file, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return {"scan_id": scan_id, "item": item}
 
 @app.get("/scan/{scan_id}/log")
-def get_scan_log(scan_id: str):
+async def get_scan_log(scan_id: str, stage: str = None, level: str = None, since: int = None, tail: int = LOG_TAIL_BYTES):
     """
-    Returns the process log for the scan.
+    Returns the process log for the scan, incrementally.
+    Without since: the last `tail` bytes (truncated=true if there is more before them).
+    With since=<cursor from the previous response>: only lines appended after it.
+    With stage and/or level (minimum: DEBUG, INFO, WARNING, ERROR), reads the structured
+    log (process.jsonl) instead, returns the matching records too, and cursors refer to it.
     """
-    log_file = Path(DATA_DIR) / "jobs" / scan_id / "process.log"
-    if log_file.exists():
-        with open(log_file, "r") as f:
-            return {"log": f.read()}
-    return {"log": ""}
-
-@app.delete("/scan/{scan_id}")
-def delete_job(scan_id: str):
+    job_dir = Path(DATA_DIR) / "jobs" / scan_id
+    structured = bool(stage or level)
+    chunk = await run_io(read_log_chunk, job_dir / (PROCESS_LOG_JSONL if structured else "process.log"), since=since, tail=tail)
+    response = {
+        "log": chunk["text"],
+        "cursor": chunk["cursor"],
+        "start": chunk["start"],
+        "size": chunk["size"],
+        "truncated": chunk["truncated"],
+        "reset": chunk["reset"]
+    }
+    if structured:
+        records = filter_records(parse_records(chunk["text"].splitlines()), stage=stage, level=level)
+        response["log"] = "\n".join(format_record(r) for r in records)
+        response["records"] = records
+    return response
+
+@app.get("/scan/{scan_id}/events")
+async def scan_events(scan_id: str, request: Request, last_event_id: str = None, fields: str = None):
+    """
+    Server-sent events for a scan's progress, results and log (see scan_events.py).
+    Resumes from the Last-Event-ID header (or ?last_event_id=) after a reconnect.
+    fields projects the items as in GET /scan/{scan_id}.
+    """
+    item_fields = parse_fields(fields)
+    job_dir = Path(DATA_DIR) / "jobs" / scan_id
+    audit_file = job_dir / "audit.json"
+    if not await run_io(audit_file.exists):
+        raise HTTPException(status_code=404, detail="Scan not found")
+
+    stream = scan_event_stream(
+        job_dir / PROCESS_LOG_JSONL,
+        lambda: status_cache.get(scan_id, audit_file, lambda: build_scan_status(audit_file)),
+        last_event_id=request.headers.get("last-event-id") or last_event_id,
+        is_disconnected=request.is_disconnected,
+        project=(lambda response: project_status(response, item_fields)) if item_fields else None
+    )
+    return StreamingResponse(stream, media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no" # Don't let a proxy buffer the stream
+    })
+
+@app.delete("/scan/{scan_id}", status_code=202)
+async def delete_job(scan_id: str):
     """
     Deletes a job and its associated data.
+    The scan disappears at once; its files are purged in the background
+    (poll GET /maintenance/tasks/{task_id}). A queued scan is cancelled first;
+    a running one must be cancelled (POST /scan/{scan_id}/cancel) and stopped before it can be deleted.
     """
-    jobs_dir = Path(DATA_DIR) / "jobs"
-    job_dir = jobs_dir / scan_id
-    
-    if not job_dir.exists():
-        raise HTTPException(status_code=404, detail="Job not found")
-        
+    # A live worker would recreate the job dir and catalog row under the deleted scan
+    queue_status = await run_io(get_scan_queue().status, scan_id)
+    if queue_status == "running":
+        raise HTTPException(status_code=409, detail="Scan is running; cancel it and delete it once it has stopped")
+    if queue_status == "queued":
+        result = await run_io(cancel_scan, scan_id)
+        if result == "cancelling":
+            raise HTTPException(status_code=409, detail="Scan started meanwhile and is being cancelled; delete it once it has stopped")
     try:
-        # 1. Read audit to find output_dir (screenshots)
-        audit_file = job_dir / "audit.json"
-        output_dir = None
-        if audit_file.exists():
-            try:
-                with open(audit_file, "r") as f:
-                    data = json.load(f)
-                    if "output_dir" in data:
-                        # Handle path mapping between Docker and Host
-                        out_str = data["output_dir"]
-                        if out_str.startswith("/app/data") and DATA_DIR != "/app/data":
-                            out_str = out_str.replace("/app/data", DATA_DIR)
-                        output_dir = Path(out_str)
-            except: pass
-            
-        # 2. Delete screenshot dir if exists
-        if output_dir and output_dir.exists():
-            import shutil
-            shutil.rmtree(output_dir)
-            
-        # 3. Delete job dir
-        import shutil
-        shutil.rmtree(job_dir)
-        
-        return {"status": "deleted", "scan_id": scan_id}
+        task = await run_io(delete_scan, DATA_DIR, scan_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Job not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    status_cache.invalidate(scan_id)
+    return {"status": "deleting", "scan_id": scan_id, "task_id": task["task_id"], "cancelled": queue_status == "queued"}
 
 @app.get("/jobs")
-def list_jobs():
+async def list_jobs(limit: int = 100, offset: int = 0, query: str = None, source: str = None,
+              status: str = None, sort: str = "start_time", order: str = "desc"):
     """
-    Returns a list of past jobs.
+    Returns a page of past jobs from the job catalog.
+    Filter by query (substring), source or status; sort by start_time, end_time,
+    cost, duration, verified or query.
     """
-    jobs_dir = Path(DATA_DIR) / "jobs"
-    if not jobs_dir.exists():
-        return {"jobs": []}
-    
-    jobs = []
+    limit = max(1, min(limit, 1000))
+    offset = max(0, offset)
     try:
-        for job_folder in jobs_dir.iterdir():
-            if job_folder.is_dir():
-                audit_file = job_folder / "audit.json"
-                if audit_file.exists():
-                    try:
-                        with open(audit_file, "r") as f:
-                            data = json.load(f)
-                            jobs.append({
-                                "scan_id": data.get("scan_id"),
-                                "start_time": data.get("start_time"),
-                                "end_time": data.get("end_time"),
-                                "status": "complete" if data.get("end_time") else "running",
-                                "query": data.get("query") or "Unknown",
-                                "location": data.get("location") or "Unknown",
-                                "source": data.get("source") or "manual"
-                            })
-                    except:
-                        pass
-        
-        # Sort by start_time decending
-        jobs.sort(key=lambda x: x["start_time"] or "", reverse=True)
-        print(f"[*] /jobs returning {len(jobs)} items")
-        return {"jobs": jobs}
+        rows, total = await run_io(lambda: get_catalog(DATA_DIR).list(
+            limit=limit, offset=offset, query=query, source=source,
+            status=status, sort=sort, order=order
+        ))
+        jobs = [{
+            "scan_id": row["scan_id"],
+            "start_time": row["start_time"],
+            "end_time": row["end_time"],
+            "status": row["status"],
+            "query": row["query"] or "Unknown",
+            "location": row["location"] or "Unknown",
+            "source": row["source"] or "manual",
+            "total_cost_usd": row["total_cost_usd"],
+            "total_duration_seconds": row["total_duration_seconds"],
+            "counts": {
+                "listings": row["listings_count"],
+                "inventory": row["inventory_count"],
+                "potential_buys": row["potential_buys_count"],
+                "verified": row["verified_count"]
+            }
+        } for row in rows]
+        print(f"[*] /jobs returning {len(jobs)} of {total} items")
+        return {"jobs": jobs, "total": total, "limit": limit, "offset": offset}
     except Exception as e:
         import traceback
         print(f"[!] /jobs ERROR: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/search")
+async def search_listings(q: str = None, min_price: float = None, max_price: float = None,
+                          min_rating: float = None, max_rating: float = None, since: str = None,
+                          until: str = None, days: float = None, verified: bool = None,
+                          scan_id: str = None, sort: str = "relevance", order: str = None,
+                          limit: int = 50, offset: int = 0):
+    """
+    Searches listings across every scan: q is full text (title, description, brand/model,
+    location; words match as prefixes), plus price/rating ranges and scan date filters
+    (since/until ISO dates, or days back). Sort by relevance, price, rating or date.
+    """
+    if days:
+        from datetime import datetime, timedelta
+        since = (datetime.now() - timedelta(days=days)).isoformat()
+    limit = max(1, min(limit, 500))
+    offset = max(0, offset)
+    rows, total = await run_io(lambda: get_search_index(DATA_DIR).search(
+        q, min_price=min_price, max_price=max_price, min_rating=min_rating, max_rating=max_rating,
+        since=since, until=until, verified=verified, scan_id=scan_id, sort=sort, order=order,
+        limit=limit, offset=offset
+    ))
+    return {
+        "results": rows,
+        "total": total,
+        "total_capped": total >= SEARCH_COUNT_LIMIT,
+        "limit": limit,
+        "offset": offset
+    }
+
 @app.get("/health")
-def health_check():
+async def health_check():
     return {"status": "ok"}
 
 @app.get("/scheduler/debug")
@@ -437,37 +578,71 @@ def scheduler_debug():
         "scheduler_running": scheduler.running
     }
 
-@app.post("/debug/send-test-email")
-def debug_send_email(email: str = None):
+@app.get("/maintenance")
+async def maintenance_status():
+    """Retention policy, compaction interval and recent maintenance tasks (deletes, compactions)."""
+    return {
+        "policy": retention_policy(),
+        "compact_interval_minutes": COMPACT_INTERVAL_MINUTES,
+        "last_compaction": next(iter(maintenance.recent(1, kind="compact")), None),
+        "tasks": maintenance.recent(50),
+    }
+
+@app.get("/maintenance/tasks/{task_id}")
+async def maintenance_task(task_id: str):
+    """State of a delete or compaction: pending, running, done (with bytes freed) or failed."""
+    task = maintenance.get(task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+@app.post("/maintenance/compact", status_code=202)
+async def run_compaction(dry_run: bool = False):
+    """Queues a compaction pass now (dry_run lists what it would archive and expire)."""
+    return maintenance.submit("compact", lambda: compact(DATA_DIR, dry_run=dry_run))
+
+@app.get("/debug/status-cache")
+async def status_cache_debug():
+    """Hit/miss counts for the /scan/{scan_id} response cache (see poll_load_test.py)."""
+    return status_cache.stats()
+
+def send_test_email(email=None, scan_id=None):
+    """Blocking part of /debug/send-test-email: finds a scan with results and sends its deals over SMTP."""
     from email_service import format_deal_email, send_email, load_settings
     import json
-    import os
-    
-    # Logic to find latest scan with results
-    data_dir = DATA_DIR
-    screenshot_dirs = sorted(
-        [d for d in data_dir.iterdir() if d.is_dir() and d.name.startswith("screenshots_")],
-        key=os.path.getmtime,
-        reverse=True
-    )
     
-    if not screenshot_dirs:
-        return {"error": "No scan data found to test with."}
-        
-    latest_dir = screenshot_dirs[0]
+    # Use the given scan, or the most recently started scan whose linked output has results.
+    # Output dirs are only ever found through audit.json - never by "latest directory".
+    jobs_dir = Path(DATA_DIR) / "jobs"
+    if scan_id:
+        audit_files = [jobs_dir / scan_id / "audit.json"]
+    else:
+        audit_files = list(jobs_dir.glob("*/audit.json")) if jobs_dir.exists() else []
+
+    candidates = []
+    for audit_file in audit_files:
+        try:
+            with open(audit_file, "r") as f:
+                audit_data = json.load(f)
+        except:
+            continue
+        output_dir = job_output_dir(audit_data)
+        if output_dir and (output_dir / "verified_steals.json").exists():
+            candidates.append((audit_data.get("start_time") or "", output_dir))
+
+    if not candidates:
+        return {"error": "No scan with results found to test with.", "scan_id": scan_id}
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    latest_dir = candidates[0][1]
     results_file = latest_dir / "verified_steals.json"
-    if not results_file.exists():
-         results_file = latest_dir / "ranked_deals.json"
-         
-    if not results_file.exists():
-        return {"error": "No results found in latest scan.", "path": str(latest_dir)}
         
     with open(results_file, "r") as f:
         data = json.load(f)
         deals = data.get("verified", []) if isinstance(data, dict) else data
         
     if not deals:
-        return {"error": "Latest scan has no deals."}
+        return {"error": "Scan has no deals.", "path": str(latest_dir)}
         
     settings = load_settings()
     dest_email = email or settings.get("default_email")
@@ -486,6 +661,11 @@ def debug_send_email(email: str = None):
         "source_dir": str(latest_dir)
     }
 
+@app.post("/debug/send-test-email")
+async def debug_send_email(email: str = None, scan_id: str = None):
+    # Audit scan, file reads and the SMTP send all run on the I/O pool
+    return await run_io(send_test_email, email, scan_id)
+
 # ----------------- SCHEDULER & SETTINGS -----------------
 from pydantic import BaseModel
 from scheduler import (
@@ -503,10 +683,15 @@ class ScheduleModel(BaseModel):
     radius: int = 10
     min_listings: int = 10
     user_intent: str = ""
+    speculative: bool = False
     frequency: str = "daily" # daily, weekly
     time: str = "09:00" # HH:MM 24h format
     email_to: str = ""
     active: bool = True
+    # Per-schedule scan budget (None = global SCAN_MAX_* limits)
+    max_tokens: int = None
+    max_cost_usd: float = None
+    max_minutes: float = None
 
 class SettingsModel(BaseModel):
     smtp_server: str
@@ -516,11 +701,15 @@ class SettingsModel(BaseModel):
     default_email: str
 
 @app.get("/schedules")
-def get_schedules():
-    return {"schedules": load_schedules()}
+async def get_schedules():
+    return {"schedules": await run_io(load_schedules)}
 
 @app.post("/schedules")
-def save_schedule(schedule: ScheduleModel):
+async def save_schedule(schedule: ScheduleModel):
+    await run_io(store_schedule, schedule)
+    return {"status": "saved", "schedule": schedule}
+
+def store_schedule(schedule):
     schedules = load_schedules()
     
     if not schedule.id:
@@ -544,46 +733,53 @@ def save_schedule(schedule: ScheduleModel):
     save_schedules(schedules)
     from scheduler import refresh_jobs
     refresh_jobs()
-    return {"status": "saved", "schedule": schedule}
 
 @app.delete("/schedules/{schedule_id}")
-def delete_schedule(schedule_id: str):
-    schedules = load_schedules()
-    schedules = [s for s in schedules if s['id'] != schedule_id]
-    save_schedules(schedules)
-    from scheduler import refresh_jobs
-    refresh_jobs()
+async def delete_schedule(schedule_id: str):
+    def remove():
+        schedules = load_schedules()
+        schedules = [s for s in schedules if s['id'] != schedule_id]
+        save_schedules(schedules)
+        from scheduler import refresh_jobs
+        refresh_jobs()
+
+    await run_io(remove)
     return {"status": "deleted"}
 
 @app.post("/schedules/{schedule_id}/run")
-def trigger_schedule(schedule_id: str, background_tasks: BackgroundTasks):
-    schedules = load_schedules()
+async def trigger_schedule(schedule_id: str):
+    schedules = await run_io(load_schedules)
     target = next((s for s in schedules if s['id'] == schedule_id), None)
     if not target:
         raise HTTPException(status_code=404, detail="Schedule not found")
         
     scan_id = str(uuid.uuid4())
-    background_tasks.add_task(run_scheduled_scan, target, source="manual_scheduled", scan_id=scan_id)
+    try:
+        scan_id = await run_io(run_scheduled_scan, target, source="manual_scheduled", scan_id=scan_id)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
     return {"status": "Triggered manual run", "scan_id": scan_id}
 
 @app.get("/settings")
-def get_settings():
-    settings = load_settings()
+async def get_settings():
+    settings = await run_io(load_settings)
     # Redact password for frontend
     if "smtp_password" in settings:
          settings["smtp_password"] = "********"
     return settings
 
 @app.post("/settings")
-def save_settings(settings: SettingsModel):
+async def save_settings(settings: SettingsModel):
     new_data = settings.dict()
-    
-    # Handle password update logic (if ********, keep old one)
-    current = load_settings()
-    if new_data["smtp_password"] == "********":
-        new_data["smtp_password"] = current.get("smtp_password", "")
-        
-    with open(SETTINGS_FILE, "w") as f:
-        json.dump(new_data, f, indent=2)
-        
+
+    def store():
+        # Handle password update logic (if ********, keep old one)
+        current = load_settings()
+        if new_data["smtp_password"] == "********":
+            new_data["smtp_password"] = current.get("smtp_password", "")
+
+        with open(SETTINGS_FILE, "w") as f:
+            json.dump(new_data, f, indent=2)
+
+    await run_io(store)
     return {"status": "Settings saved"}
\ No newline at end of file
@@ -0,0 +1,864 @@
+import asyncio
+import sys
+import os
+import json
+import hashlib
+import uuid
+import threading
+import contextvars
+from pathlib import Path
+from datetime import datetime, timedelta
+from contextlib import AsyncExitStack, contextmanager
+from playwright.async_api import async_playwright
+
+from clients import configure_genai
+from scraper import scrape, scan_output_dir
+from analyze_images import analyze_listings
+from rank_deals import rank
+from deep_dive import verify_deals, speculate
+from email_service import send_email, format_deal_email, load_settings
+from audit import ScanMonitor
+from log_sink import current_stage
+from job_catalog import result_counts
+from search_index import get_search_index
+from blob_store import intern_dir, link_or_copy, MANIFEST_FILE
+from budget import ScanBudget, BudgetExceeded, check as check_budget
+from config import DATA_DIR, AUTH_FILE
+from job_queue import get_queue, resource_slots, PRIORITY_MANUAL
+from job_errors import JobCancelled, JobPreempted, JobLeaseLost, JobDeferred
+
+# In-process scan pipeline.
+# Runs the stage graph (scraper -> analyze -> rank -> deep dive -> notify) as function
+# calls inside one event loop with a single Chromium shared by every browser stage.
+# Stage completion and artifact hashes are checkpointed in the job directory so an
+# interrupted scan resumes from the last completed stage. The stage CLIs remain thin wrappers.
+
+# How long to let a speculative deep dive finish its in-flight item once ranking is done
+SPECULATIVE_GRACE_SECONDS = 120
+
+# Scan coalescing: a request matching a queued, running or recent scan (same query,
+# location and radius, enough listings) inside this window reuses it instead of scraping again.
+# 0 disables coalescing.
+COALESCE_WINDOW_MINUTES = float(os.getenv("COALESCE_WINDOW_MINUTES", "30"))
+COALESCE_POLL_SECONDS = 5
+# A derived scan doesn't hold a worker while its base runs: it is deferred this long at a time,
+# and after COALESCE_MAX_WAIT_MINUTES it gives up on the base and runs as a full scan
+COALESCE_DEFER_SECONDS = 15
+COALESCE_MAX_WAIT_MINUTES = float(os.getenv("COALESCE_MAX_WAIT_MINUTES", "60"))
+# Stages a derived scan always takes from its base, and the ones it only takes when the user_intent matches
+REUSE_ALWAYS = ["scraper", "analyze_images"]
+REUSE_SAME_INTENT = ["rank_deals", "deep_dive"]
+# Output files that depend on user_intent (not shared with a derived scan that re-ranks)
+INTENT_ARTIFACT_PREFIXES = ("potential_buys", "verified_steals", "speculative_verdicts", "deep_dive_")
+
+# How often a running scan checks the queue for a cancel request from another process
+CANCEL_POLL_SECONDS = 2
+# At a stage boundary, a scan gives its worker up (and is requeued as a resume) when a
+# better-priority job has waited this long. 0 disables preemption.
+PREEMPT_AFTER_SECONDS = int(os.getenv("PREEMPT_AFTER_SECONDS", "30"))
+
+# --- Log routing ---
+# Stages report progress with print(). While a stage runs for a scan, its stdout is
+# routed line by line into that scan's process.log/process.jsonl (buffered, see log_sink).
+# The route is held in a ContextVar, so concurrent scans, stage threads (to_thread
+# copies the context) and the speculative task each write to the right log. Routes are
+# reset when their scan (or speculative step) ends. The sys.stdout wrapper is installed
+# by start_log_router() and restored by the matching stop_log_router(): hosts (API
+# lifespan, worker.py) hold it for their lifetime, run_scan holds it for one scan.
+
+_current_route = contextvars.ContextVar("pipeline_log_route", default=None)
+_router_lock = threading.Lock()
+
+class LogRoute:
+    def __init__(self, monitor, prefix=None):
+        self.monitor = monitor
+        self.prefix = prefix
+        self._buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            self._buffer += text
+            *lines, self._buffer = self._buffer.split("\n")
+        for line in lines:
+            self.emit(line)
+
+    def flush(self):
+        with self._lock:
+            line, self._buffer = self._buffer, ""
+        self.emit(line)
+
+    def emit(self, line):
+        line = line.strip()
+        if not line:
+            return
+        if self.prefix:
+            line = f"[{self.prefix}] {line}"
+        self.monitor.log_process(line)
+        # Also print to console for backup
+        sys.__stdout__.write(f"[{self.monitor.scan_id}] {line}\n")
+
+class _StdoutRouter:
+    def __init__(self, original):
+        self.original = original
+
+    def write(self, text):
+        route = _current_route.get()
+        if route is None:
+            return self.original.write(text)
+        route.write(text)
+        return len(text)
+
+    def flush(self):
+        route = _current_route.get()
+        if route is not None:
+            route.flush()
+        self.original.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+_router = None
+_router_users = 0
+
+def start_log_router():
+    """Installs the per-scan stdout router; the first of nested start/stop pairs installs it."""
+    global _router, _router_users
+    with _router_lock:
+        _router_users += 1
+        if _router is None:
+            _router = _StdoutRouter(sys.stdout)
+            sys.stdout = _router
+
+def stop_log_router():
+    """Restores the original sys.stdout once the last start_log_router() user stops."""
+    global _router, _router_users
+    with _router_lock:
+        _router_users = max(0, _router_users - 1)
+        if _router_users or _router is None:
+            return
+        if sys.stdout is _router:
+            sys.stdout = _router.original
+        _router = None
+
+@contextmanager
+def route_logs(monitor, prefix=None):
+    """Routes print() output in the current context to monitor's process.log until the block exits."""
+    route = LogRoute(monitor, prefix)
+    token = _current_route.set(route)
+    try:
+        yield route
+    finally:
+        route.flush()
+        _current_route.reset(token)
+
+# --- Checkpoint ---
+
+CHECKPOINT_FILE = "checkpoint.json"
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_hashes(output_dir, artifacts):
+    """Returns {artifact: sha256} or None if any artifact is missing."""
+    if not output_dir:
+        return None if artifacts else {}
+    hashes = {}
+    for name in artifacts:
+        path = Path(output_dir) / name
+        if not path.exists():
+            return None
+        hashes[name] = file_sha256(path)
+    return hashes
+
+class Checkpoint:
+    """
+    Stage completion record for one scan (data/jobs/{scan_id}/checkpoint.json).
+    Each completed stage stores the hashes of the artifacts it produced and of the
+    upstream artifacts it consumed; a stage is only skipped on resume if both still match.
+    """
+    def __init__(self, job_dir):
+        self.path = Path(job_dir) / CHECKPOINT_FILE
+        self.data = {"params": {}, "output_dir": None, "stages": {}}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    self.data = json.load(f)
+            except:
+                pass # Unreadable checkpoint - run everything again
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def is_complete(self, name, output_dir, artifacts, inputs):
+        entry = self.data["stages"].get(name)
+        if not entry or entry.get("status") != "complete":
+            return False
+        if entry.get("inputs", {}) != inputs:
+            return False
+        return artifact_hashes(output_dir, artifacts) == entry.get("artifacts", {})
+
+    def mark(self, name, status, **fields):
+        entry = {"status": status, "updated_at": datetime.now().isoformat()}
+        entry.update(fields)
+        self.data["stages"][name] = entry
+        self.save()
+
+def load_checkpoint(data_dir, scan_id):
+    """Returns the scan's Checkpoint, or None if it never wrote one."""
+    job_dir = Path(data_dir) / "jobs" / scan_id
+    if not (job_dir / CHECKPOINT_FILE).exists():
+        return None
+    return Checkpoint(job_dir)
+
+# --- Run state ---
+
+class PipelineRun:
+    """State handed from stage to stage. Skipped stages fill it from their artifacts."""
+    def __init__(self, monitor, params, data_dir, auth_file=None, output_dir=None):
+        self.monitor = monitor
+        self.params = params
+        self.data_dir = Path(data_dir)
+        self.auth_file = auth_file
+        self.output_dir = Path(output_dir) if output_dir else None
+        self.listings = None
+        self.inventory = None
+        self.ranking = None
+        self.speculative_task = None
+        self.stop_event = asyncio.Event()
+        self.priority = None # Queue priority, for preemption (None = not a queued job)
+        self.task = None
+        self.loop = None
+        self.cancel_requested = False
+        self.lease_lost = False # Another worker owns the job now; stop without touching its state
+        # Stages running in threads (to_thread) don't see task cancellation; they poll this
+        self.cancel_event = threading.Event()
+        self._cancel_lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+
+    def request_cancel(self, lease_lost=False):
+        """Cancels the run's task. Safe to call from any thread; only the first call counts."""
+        with self._cancel_lock:
+            self.lease_lost = self.lease_lost or lease_lost
+            if self.cancel_requested or not self.task:
+                return False
+            self.cancel_requested = True
+        self.cancel_event.set()
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        return True
+
+    async def browser(self):
+        """
+        Shared Chromium for every browser stage, launched on first use.
+        Holds one "browser" resource slot while open.
+        """
+        if self._browser is None:
+            await resource_slots.acquire_async("browser")
+            try:
+                print("Launching shared Chrome for this scan...")
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=["--no-sandbox", "--disable-setuid-sandbox"])
+            except:
+                await self.close_browser(force_release=True)
+                raise
+        return self._browser
+
+    async def close_browser(self, force_release=False):
+        """Closes the shared Chromium (if open) and frees its browser slot."""
+        held = self._browser is not None or force_release
+        if self._browser:
+            try:
+                await self._browser.close()
+            except:
+                pass
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+        if held:
+            resource_slots.release("browser")
+
+    def read_artifact(self, name):
+        with open(self.output_dir / name, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    async def finish_speculative(self):
+        # Speculative verifier stops after its in-flight item; give it a grace period
+        self.stop_event.set()
+        if self.speculative_task:
+            try:
+                await asyncio.wait_for(self.speculative_task, timeout=SPECULATIVE_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                self.monitor.log_process("Speculative Deep Dive still busy after ranking, stopped it.")
+            except BudgetExceeded:
+                self.speculative_task = None
+                raise # Abort the scan, same as a budget stop in any other stage
+            except Exception as e:
+                self.monitor.log_process(f"Speculative Deep Dive failed: {e}")
+            self.speculative_task = None
+
+    async def close(self):
+        if self.speculative_task:
+            self.speculative_task.cancel()
+            try:
+                await self.speculative_task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self.speculative_task = None
+        await self.close_browser()
+
+# --- Stages ---
+
+async def stage_scrape(run):
+    params = run.params
+    output_dir, listings = await scrape(
+        params["query"],
+        location=params["location"],
+        radius=params["radius"],
+        min_listings=params["min_listings"],
+        data_dir=run.data_dir,
+        browser=await run.browser(),
+        auth_file=run.auth_file,
+        output_dir=run.output_dir
+    )
+    if not output_dir or not listings:
+        raise RuntimeError("No data found after scrape.")
+
+    run.listings = listings
+    run.monitor.log_process(f"Scraper finished. Output: {run.output_dir.name}")
+
+def load_scrape(run):
+    run.listings = run.read_artifact("listings.json")
+
+async def run_speculative_step(run):
+    with route_logs(run.monitor, prefix="Speculative Deep Dive"):
+        return await run_step(run.monitor, "deep_dive_speculative", speculate(
+            run.output_dir / "market_inventory.json",
+            data_dir=run.data_dir,
+            auth_file=run.auth_file,
+            user_intent=run.params.get("user_intent"),
+            monitor=run.monitor,
+            browser=await run.browser(),
+            stop_event=run.stop_event,
+            rating_threshold=run.params.get("speculative_rating", 9)
+        ))
+
+async def stage_analyze(run):
+    # Speculative deep dive runs alongside analysis + ranking
+    if run.params.get("speculative"):
+        run.monitor.log_process("Launching Speculative Deep Dive in background...")
+        run.speculative_task = asyncio.create_task(run_speculative_step(run))
+
+    # Sync Gemini client, keep it off the event loop; cancel_event stops the thread between listings
+    run.inventory = await asyncio.to_thread(analyze_listings, run.listings, run.output_dir, run.monitor, run.cancel_event)
+    if not run.inventory:
+        raise RuntimeError("Image analysis produced no inventory.")
+
+def analyze_resources(run):
+    # The speculative deep dive needs the browser; take it before llm, never while holding llm
+    return ["browser", "llm"] if run.params.get("speculative") else ["llm"]
+
+def load_analyze(run):
+    run.inventory = run.read_artifact("market_inventory.json")
+
+async def stage_rank(run):
+    try:
+        run.ranking = await asyncio.to_thread(
+            rank, run.inventory, run.output_dir / "potential_buys.json", run.params.get("user_intent"), run.monitor, run.cancel_event
+        )
+    finally:
+        await run.finish_speculative()
+    if not run.ranking:
+        raise RuntimeError("Deal ranking failed.")
+
+def load_rank(run):
+    run.ranking = run.read_artifact("potential_buys.json")
+
+async def stage_deep_dive(run):
+    potential_buys = run.ranking.get("potential_buys", [])
+    if not potential_buys:
+        run.monitor.log_process("No potential buys found, skipping Deep Dive.")
+        return
+    await verify_deals(
+        potential_buys,
+        run.listings,
+        run.output_dir,
+        data_dir=run.data_dir,
+        auth_file=run.auth_file,
+        user_intent=run.params.get("user_intent"),
+        monitor=run.monitor,
+        browser=await run.browser()
+    )
+
+async def stage_notify(run):
+    results_file = run.output_dir / "verified_steals.json"
+    deals = []
+    if results_file.exists():
+        data = run.read_artifact("verified_steals.json")
+        deals = data.get("verified", []) if isinstance(data, dict) else data
+
+    settings = load_settings()
+    dest_email = run.params.get("email_to") or settings.get("default_email")
+
+    if dest_email and deals:
+        run.monitor.log_process(f"Sending email to {dest_email}...")
+        query = run.params["query"]
+        email_body, attachments = format_deal_email(deals, query, run.output_dir)
+        if send_email(dest_email, f"Marketplace Hunter: {query} Results", email_body, attachments):
+            run.monitor.log_process("Email sent successfully.")
+        else:
+            run.monitor.log_process("ERROR: Failed to send email. Check container logs for details.")
+
+# --- Coalesced (derived) scans ---
+
+def normalize_text(value):
+    return " ".join(str(value or "").lower().split())
+
+def same_intent(params, base_params):
+    return normalize_text(params.get("user_intent")) == normalize_text(base_params.get("user_intent"))
+
+async def adopt_base_scan(run, checkpoint):
+    """
+    Derived scan: waits for the base scan to finish the stages this scan can reuse, links
+    their output into this scan's output dir and marks them complete in this scan's
+    checkpoint. The stage graph then resumes from there (re-rank for a different
+    user_intent, or just notify when everything is shared).
+    """
+    base_id = run.params["derived_from"]
+    base_job_dir = run.data_dir / "jobs" / base_id
+    reuse = run.params.get("reuse_stages") or REUSE_ALWAYS
+    shared_intent = all(name in reuse for name in REUSE_SAME_INTENT)
+    run.monitor.log_process(f"Coalesced with scan {base_id}: waiting for its {', '.join(reuse)} stages...")
+
+    def missing_stages():
+        stages = Checkpoint(base_job_dir).data["stages"]
+        return [name for name in reuse if stages.get(name, {}).get("status") != "complete"]
+
+    while missing_stages():
+        if get_scan_queue().status(base_id) not in ("queued", "running"):
+            # Base finished (or vanished) - check once more in case it completed in between
+            missing = missing_stages()
+            if missing:
+                raise RuntimeError(f"Base scan {base_id} ended without completing {', '.join(missing)}")
+            break
+        await asyncio.sleep(COALESCE_POLL_SECONDS)
+
+    base = Checkpoint(base_job_dir)
+    base_dir = Path(base.data["output_dir"])
+    run.output_dir.mkdir(parents=True, exist_ok=True)
+    for path in base_dir.iterdir():
+        if path.is_file() and path.name != MANIFEST_FILE and (shared_intent or not path.name.startswith(INTENT_ARTIFACT_PREFIXES)):
+            link_or_copy(path, run.output_dir / path.name)
+    # The links reference the base scan's blobs; record them in this scan's manifest too
+    await asyncio.to_thread(intern_dir, run.output_dir)
+
+    for name in reuse:
+        checkpoint.data["stages"][name] = dict(base.data["stages"][name], reused_from=base_id)
+    checkpoint.data["derived_from"] = base_id
+    checkpoint.save()
+    run.monitor.log_process(f"Reusing {', '.join(reuse)} from scan {base_id}.")
+
+# Declarative stage graph. "after" lists upstream stages, "artifacts" the files a stage
+# writes into the scan's output dir (hashed into the checkpoint), "load" restores the
+# run state from those artifacts when the stage is skipped on resume, "resources" the
+# slot classes held while the stage runs (acquired in order: browser before llm; a
+# callable gets the run and returns the list).
+STAGES = {
+    "scraper": {"after": [], "artifacts": ["listings.json"], "resources": ["browser"], "run": stage_scrape, "load": load_scrape},
+    "analyze_images": {"after": ["scraper"], "artifacts": ["market_inventory.json"], "resources": analyze_resources, "run": stage_analyze, "load": load_analyze},
+    "rank_deals": {"after": ["analyze_images"], "artifacts": ["potential_buys.json"], "resources": ["llm"], "run": stage_rank, "load": load_rank},
+    "deep_dive": {"after": ["rank_deals", "scraper"], "artifacts": ["verified_steals.json"], "resources": ["browser", "llm"], "run": stage_deep_dive},
+    "notify": {"after": ["deep_dive"], "artifacts": [], "resources": [], "run": stage_notify, "when": lambda run: run.params.get("notify")},
+}
+
+def stage_order(stages=STAGES):
+    """Topological order of the stage graph (declaration order breaks ties)."""
+    order = []
+    pending = dict(stages)
+    while pending:
+        ready = [name for name, stage in pending.items() if all(dep in order for dep in stage["after"])]
+        if not ready:
+            raise ValueError(f"Stage graph has a cycle or unknown dependency: {sorted(pending)}")
+        for name in ready:
+            order.append(name)
+            del pending[name]
+    return order
+
+async def run_step(monitor, step_name, coro):
+    # Tags every log line of this step (including its threads) with the stage name
+    stage = current_stage.set(step_name)
+    monitor.log_process(f"Launching {step_name}...")
+    monitor.start_step(step_name)
+    try:
+        return await coro
+    finally:
+        monitor.stop_step(step_name)
+        current_stage.reset(stage)
+
+async def execute_stages(run, checkpoint, resume=False):
+    """Runs the stage graph, skipping stages whose checkpoint is still valid when resuming."""
+    rerun = set()
+    for name in stage_order():
+        stage = STAGES[name]
+        if stage.get("when") and not stage["when"](run):
+            continue
+
+        # Hashes of the upstream artifacts this stage consumes
+        inputs = {}
+        for dep in stage["after"]:
+            dep_hashes = artifact_hashes(run.output_dir, STAGES[dep]["artifacts"]) or {}
+            inputs.update(dep_hashes)
+
+        upstream_rerun = any(dep in rerun for dep in stage["after"])
+        if resume and not upstream_rerun and checkpoint.is_complete(name, run.output_dir, stage["artifacts"], inputs):
+            run.monitor.log_process(f"Resume: {name} already complete, skipping.")
+            if stage.get("load"):
+                stage["load"](run)
+            continue
+
+        if run.lease_lost:
+            raise JobLeaseLost(f"Lease on scan {run.monitor.scan_id} lost")
+        if rerun:
+            check_preemption(run)
+        check_budget(run.monitor, name) # Wall-clock limits bite between stages too
+        rerun.add(name)
+        checkpoint.mark(name, "running")
+        try:
+            async with AsyncExitStack() as held:
+                resources = stage.get("resources", [])
+                for resource in resources(run) if callable(resources) else resources:
+                    if resource == "browser":
+                        await run.browser() # Launch holds the slot until close_browser()
+                    else:
+                        await held.enter_async_context(resource_slots.hold(resource))
+                await run_step(run.monitor, name, stage["run"](run))
+        except BaseException as e:
+            if not run.lease_lost: # The checkpoint belongs to the job's new worker
+                checkpoint.mark(name, "failed", error=str(e) or type(e).__name__)
+            raise
+        finally:
+            # Don't keep an idle Chromium (and its slot) between stages unless the speculative deep dive is using it
+            if not run.speculative_task:
+                await run.close_browser()
+
+        checkpoint.mark(
+            name, "complete",
+            artifacts=artifact_hashes(run.output_dir, stage["artifacts"]) or {},
+            inputs=inputs
+        )
+        # Item counts for the job catalog (/jobs), items for cross-scan search (/search)
+        if stage["artifacts"]:
+            run.monitor.update(result_counts=result_counts(run.output_dir))
+            await asyncio.to_thread(index_for_search, run)
+        # Screenshots into the blob store, unless a speculative deep dive is still writing them
+        if not run.speculative_task or run.speculative_task.done():
+            await asyncio.to_thread(intern_screenshots, run)
+
+def index_for_search(run):
+    """Re-indexes the scan's items after a stage; search is best-effort, never fails the scan."""
+    with run.monitor._lock:
+        scan = dict(run.monitor.data, scan_id=run.monitor.scan_id, output_dir=str(run.output_dir))
+    try:
+        get_search_index(run.data_dir).index_scan(scan)
+    except Exception as e:
+        print(f"[!] Search indexing failed for {run.monitor.scan_id}: {e}")
+
+def intern_screenshots(run):
+    """Deduplicates the scan's new screenshots into the blob store; best-effort like indexing."""
+    try:
+        count, saved = intern_dir(run.output_dir)
+        if saved:
+            print(f"[*] {run.monitor.scan_id}: {count} screenshots stored, {saved / 1024 / 1024:.1f} MB deduplicated")
+    except Exception as e:
+        print(f"[!] Blob store intern failed for {run.monitor.scan_id}: {e}")
+
+# --- Cancellation and preemption ---
+# Running scans register here so a cancel handled by this process takes effect at once;
+# scans running on other nodes see the queue's cancel flag on their next poll.
+
+_active_runs = {}
+_active_runs_lock = threading.Lock()
+
+def check_preemption(run):
+    """Stage boundary: raises JobPreempted if a better-priority job has been kept waiting."""
+    if run.priority is None or PREEMPT_AFTER_SECONDS <= 0 or run.speculative_task:
+        return # Speculative verdicts aren't checkpointed; don't throw them away
+    if get_scan_queue().higher_priority_waiting(run.priority, PREEMPT_AFTER_SECONDS):
+        raise JobPreempted("a higher-priority scan is waiting")
+
+async def watch_for_cancel(run):
+    while True:
+        await asyncio.sleep(CANCEL_POLL_SECONDS)
+        if run.cancel_requested:
+            # Stage code with bare excepts can swallow a cancel; keep at it until the run unwinds
+            run.task.cancel()
+            continue
+        try:
+            requested = await asyncio.to_thread(get_scan_queue().cancel_requested, run.monitor.scan_id)
+        except:
+            requested = False
+        if requested:
+            run.request_cancel()
+
+def lease_lost(scan_id):
+    """
+    Queue worker callback: the job's lease ran out and it was handed to another worker.
+    Stops the local run before it writes any further output, checkpoint or audit state.
+    """
+    with _active_runs_lock:
+        run = _active_runs.get(scan_id)
+    if run:
+        run.request_cancel(lease_lost=True)
+
+def cancel_local(scan_id):
+    """Cancels the scan if it is running in this process. Returns True if it was."""
+    with _active_runs_lock:
+        run = _active_runs.get(scan_id)
+    return bool(run and run.request_cancel())
+
+def cancel_scan(scan_id):
+    """
+    Cancels a queued or running scan. Queued scans are finished as cancelled right away;
+    running ones stop at their next await, close their browser and free their worker.
+    Returns the queue's answer ("cancelled", "cancelling", a finished status, or None if unknown).
+    """
+    result = get_scan_queue().request_cancel(scan_id)
+    if result == "cancelled":
+        monitor = ScanMonitor(scan_id, data_dir=DATA_DIR)
+        monitor.log_process("Scan cancelled before it started.")
+        monitor.finish_scan(status="cancelled")
+    elif result == "cancelling":
+        cancel_local(scan_id)
+    return result
+
+async def run_pipeline(monitor, params, data_dir, auth_file=None, resume=False, priority=None):
+    """
+    Runs a full scan for monitor's scan_id. params holds query, location, radius,
+    min_listings and optionally user_intent, speculative, speculative_rating, notify, email_to.
+    With resume=True, stages already completed per the checkpoint are skipped.
+    Returns the scan's output directory. Stage failures raise; callers log them and finish the scan.
+    """
+    with route_logs(monitor):
+        return await _run_pipeline(monitor, params, data_dir, auth_file, resume, priority)
+
+async def _run_pipeline(monitor, params, data_dir, auth_file, resume, priority):
+    checkpoint = Checkpoint(monitor.job_dir)
+    if not resume:
+        checkpoint.data = {"params": params, "output_dir": None, "stages": {}}
+    checkpoint.data["params"] = params
+    checkpoint.save()
+
+    output_dir = checkpoint.data.get("output_dir")
+    if not output_dir or not Path(output_dir).exists():
+        # Each scan gets its own output dir, linked from audit.json before the scraper starts,
+        # so concurrent scans never have to find their output by "latest directory"
+        output_dir = str(scan_output_dir(data_dir, params["query"], monitor.scan_id))
+        checkpoint.data["output_dir"] = output_dir
+        checkpoint.save()
+        monitor.update(output_dir=output_dir)
+
+    # Fail fast on a missing API key before a browser is started
+    configure_genai()
+
+    monitor.budget = ScanBudget.from_params(monitor, params)
+    if monitor.budget.enabled():
+        limits = ", ".join(f"{name} {limit:g}" for name, limit in monitor.budget.limits.items() if limit)
+        monitor.log_process(f"Budget: {limits}")
+
+    run = PipelineRun(monitor, params, data_dir, auth_file, output_dir)
+    run.priority = priority
+    run.task = asyncio.current_task()
+    run.loop = asyncio.get_running_loop()
+    with _active_runs_lock:
+        _active_runs[monitor.scan_id] = run
+    watcher = asyncio.create_task(watch_for_cancel(run))
+    try:
+        if params.get("derived_from") and not checkpoint.data.get("derived_from"):
+            await adopt_base_scan(run, checkpoint)
+            resume = True # Skip the adopted stages
+        await execute_stages(run, checkpoint, resume)
+        return run.output_dir
+    except asyncio.CancelledError:
+        if run.lease_lost:
+            raise JobLeaseLost(f"Lease on scan {monitor.scan_id} lost")
+        if run.cancel_requested:
+            raise JobCancelled(f"Scan {monitor.scan_id} cancelled")
+        raise
+    finally:
+        watcher.cancel()
+        with _active_runs_lock:
+            _active_runs.pop(monitor.scan_id, None)
+        await run.close()
+
+def run_scan(monitor, params, data_dir, auth_file=None, resume=False, priority=None):
+    """
+    Blocking entry point shared by the API server and the scheduler.
+    Logs failures to the scan's process.log and always finishes the audit record
+    (except on preemption or a lost lease, where the requeued resume carries on with it).
+    Returns the output directory, or None if the scan failed.
+    Re-raises JobCancelled, JobPreempted and JobLeaseLost for the queue worker.
+    """
+    monitor.start_step("pipeline_wall_clock")
+    monitor.update(status="running", end_time=None)
+    output_dir = None
+    final_status = None
+    try:
+        action = "Resuming" if resume else "Starting"
+        monitor.log_process(f"{action} scan {monitor.scan_id} for '{params['query']}'...")
+        monitor.log_process(f"Using Data Dir: {data_dir}")
+        monitor.log_process(f"Using Auth File: {auth_file}")
+
+        start_log_router()
+        try:
+            output_dir = asyncio.run(run_pipeline(monitor, params, data_dir, auth_file, resume, priority))
+        finally:
+            stop_log_router()
+        monitor.log_process("Pipeline Completed Successfully.")
+
+    except JobCancelled:
+        monitor.log_process("Scan cancelled. Browser closed and worker released.")
+        final_status = "cancelled"
+        raise
+    except JobPreempted as e:
+        monitor.log_process(f"Preempted at a stage boundary ({e}); requeued to resume from its checkpoint.")
+        final_status = "preempted"
+        monitor.update(status="queued")
+        raise
+    except JobLeaseLost:
+        print(f"[!] Scan {monitor.scan_id} stopped: lease lost, another worker resumes it.")
+        final_status = "lease_lost"
+        raise
+    except BudgetExceeded as e:
+        # Reason is already in audit.json ("budget"); no resume hint - it would hit the same limit
+        print(f"[!] Scan {monitor.scan_id} aborted: {e}")
+        monitor.log_process(f"ABORTED: {e}")
+        final_status = "aborted"
+    except Exception as e:
+        print(f"[!] Scan {monitor.scan_id} failed: {e}")
+        monitor.log_process(f"CRITICAL ERROR: {e}")
+        final_status = "failed"
+        monitor.log_process("Completed stages are checkpointed; resume with POST /scan/{scan_id}/resume.")
+    finally:
+        if final_status != "lease_lost": # The audit record belongs to the new worker
+            monitor.load_from_disk()
+            monitor.stop_step("pipeline_wall_clock")
+            if final_status != "preempted":
+                monitor.finish_scan(status=final_status)
+
+    return output_dir
+
+# --- Queue integration ---
+# Scans are not started directly: the API and scheduler enqueue them and the
+# job_queue workers (in the API process and/or worker.py nodes) call run_job()
+# with bounded concurrency. All results land in the shared DATA_DIR.
+
+def get_scan_queue():
+    return get_queue(DATA_DIR)
+
+def enqueue_scan(scan_id, params, monitor_fields, priority=PRIORITY_MANUAL, resume=False):
+    """
+    Queues a scan (or a resume of one). Raises job_queue.QueueFull when saturated.
+    Creates the scan's audit record up front so the UI can show it while it waits.
+    Returns the queue position.
+    """
+    kind = "resume" if resume else "scan"
+    position = get_scan_queue().enqueue(scan_id, kind, {"params": params, "monitor": monitor_fields}, priority=priority)
+
+    monitor = ScanMonitor(scan_id, data_dir=DATA_DIR, **monitor_fields)
+    monitor.update(status="queued", end_time=None)
+    monitor.log_process(f"Queued {kind} (position {position}, priority {priority}).")
+    return position
+
+_submit_lock = threading.Lock()
+
+def base_available(scan_id):
+    """True while a coalescing base's job dir (and output dir, once it has one) is still live data."""
+    job_dir = Path(DATA_DIR) / "jobs" / scan_id
+    if not job_dir.exists():
+        return False # Deleted or archived
+    output_dir = Checkpoint(job_dir).data.get("output_dir")
+    return not output_dir or Path(output_dir).exists()
+
+def find_coalescable(params):
+    """Returns the newest queued/running/recent job this scan request can reuse, or None."""
+    if COALESCE_WINDOW_MINUTES <= 0:
+        return None
+    since = datetime.now() - timedelta(minutes=COALESCE_WINDOW_MINUTES)
+    key = (normalize_text(params["query"]), normalize_text(params["location"]), int(params["radius"]))
+    for job in get_scan_queue().recent(since):
+        if job["status"] not in ("queued", "running", "done"):
+            continue
+        base = job["payload"].get("params", {})
+        if base.get("derived_from"):
+            continue # Only coalesce onto scans that actually scrape
+        if (normalize_text(base.get("query")), normalize_text(base.get("location")), int(base.get("radius") or 0)) != key:
+            continue
+        if int(base.get("min_listings") or 0) < int(params["min_listings"]):
+            continue
+        if not base_available(job["scan_id"]):
+            continue
+        return job
+    return None
+
+def submit_scan(params, monitor_fields, priority=PRIORITY_MANUAL, scan_id=None):
+    """
+    Queues a scan unless an identical one is already queued, running or fresh:
+      - same user_intent and no email to send: attach - returns the existing scan_id, no new work
+      - otherwise: a derived scan that reuses the base scrape/analysis (and ranking + deep dive
+        when the intent matches) and only re-ranks / notifies
+    The base is promoted to this request's priority. Raises job_queue.QueueFull when saturated.
+    Returns {"scan_id", "queue_position", "attached_to", "derived_from"}.
+    """
+    with _submit_lock:
+        base = find_coalescable(params)
+        if base:
+            get_scan_queue().promote(base["scan_id"], priority)
+            if same_intent(params, base["payload"]["params"]) and not params.get("notify"):
+                print(f"[*] Coalesced request for '{params['query']}' onto scan {base['scan_id']}")
+                return {"scan_id": base["scan_id"], "queue_position": None, "attached_to": base["scan_id"], "derived_from": None}
+            reuse = REUSE_ALWAYS + (REUSE_SAME_INTENT if same_intent(params, base["payload"]["params"]) else [])
+            params = dict(params, derived_from=base["scan_id"], reuse_stages=reuse)
+
+        scan_id = scan_id or str(uuid.uuid4())
+        position = enqueue_scan(scan_id, params, monitor_fields, priority=priority)
+        return {"scan_id": scan_id, "queue_position": position, "attached_to": None, "derived_from": params.get("derived_from")}
+
+def wait_for_base(job, params):
+    """
+    A derived scan only starts once its base has finished, so it never holds a worker the
+    base may need. Raises JobDeferred while the base is queued or running. Past
+    COALESCE_MAX_WAIT_MINUTES, or if the base is gone, returns the params for an
+    independent full scan instead.
+    """
+    base_id = params.get("derived_from")
+    checkpoint = load_checkpoint(DATA_DIR, job["scan_id"])
+    if not base_id or (checkpoint and checkpoint.data.get("derived_from")):
+        return params # Not derived, or the base was already adopted
+    if not base_available(base_id):
+        reason = f"Base scan {base_id} was deleted or archived"
+    elif get_scan_queue().status(base_id) not in ("queued", "running"):
+        return params
+    elif datetime.now() - datetime.fromisoformat(job["enqueued_at"]) < timedelta(minutes=COALESCE_MAX_WAIT_MINUTES):
+        raise JobDeferred(f"waiting for base scan {base_id}", COALESCE_DEFER_SECONDS)
+    else:
+        reason = f"Base scan {base_id} still unfinished after {COALESCE_MAX_WAIT_MINUTES:g} min"
+
+    ScanMonitor(job["scan_id"], data_dir=DATA_DIR).log_process(f"{reason}; running a full scan instead.")
+    return {k: v for k, v in params.items() if k not in ("derived_from", "reuse_stages")}
+
+def run_job(job):
+    """job_queue worker handler: runs one queued scan or resume to completion."""
+    payload = job["payload"]
+    params = wait_for_base(job, payload["params"])
+    monitor = ScanMonitor(job["scan_id"], data_dir=DATA_DIR, **payload.get("monitor", {}))
+    resume = job["kind"] == "resume"
+    if run_scan(monitor, params, DATA_DIR, auth_file=AUTH_FILE, resume=resume, priority=job["priority"]) is None:
+        raise RuntimeError("Scan failed, see process.log")
@@ -0,0 +1,122 @@
+import argparse
+import os
+import sys
+import threading
+import time
+
+import requests
+
+# Polling load test for GET /scan/{scan_id}.
+# Simulates N open dashboards polling one scan every --interval seconds against a running
+# backend, the way the frontend does, and reports 200 vs 304 responses, bytes received,
+# latency and the server's response cache hit rate. With --pid (Linux) it also reports
+# the server process's CPU time over the run.
+#
+#   python poll_load_test.py --scan-id <id> --dashboards 20 --duration 30 --pid $(pgrep -f uvicorn)
+#
+# --no-etag polls without If-None-Match, to compare against full responses.
+# --mix also has each dashboard tail the log (?since=) and list /jobs every poll, like
+# the full UI; run it while scans are busy to check API p99 latency stays flat.
+
+def cpu_seconds(pid):
+    """utime + stime of a process, from /proc (None if unavailable)."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def timed_get(session, url, label, results, lock, headers=None):
+    started = time.perf_counter()
+    try:
+        response = session.get(url, headers=headers or {}, timeout=10)
+    except requests.RequestException as e:
+        with lock:
+            results["errors"] += 1
+        print(f"[!] {e}")
+        return None
+    elapsed = time.perf_counter() - started
+    with lock:
+        results[response.status_code] = results.get(response.status_code, 0) + 1
+        results["bytes"] += len(response.content)
+        results["latency"].setdefault(label, []).append(elapsed)
+    return response
+
+def dashboard(base_url, scan_id, interval, deadline, use_etag, mix, results, lock):
+    session = requests.Session()
+    etag = None
+    cursor = None
+    while time.time() < deadline:
+        started = time.perf_counter()
+        headers = {"If-None-Match": etag} if use_etag and etag else {}
+        response = timed_get(session, f"{base_url}/scan/{scan_id}", "scan", results, lock, headers)
+        if response is not None:
+            etag = response.headers.get("ETag") or etag
+        if mix:
+            since = f"?since={cursor}" if cursor is not None else ""
+            response = timed_get(session, f"{base_url}/scan/{scan_id}/log{since}", "log", results, lock)
+            if response is not None and response.ok:
+                cursor = response.json().get("cursor", cursor)
+            timed_get(session, f"{base_url}/jobs?limit=50", "jobs", results, lock)
+        time.sleep(max(0, interval - (time.perf_counter() - started)))
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Poll GET /scan/{scan_id} like N open dashboards")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--scan-id", required=True)
+    parser.add_argument("--dashboards", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls (frontend: 2)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--pid", type=int, help="Backend process id, to measure its CPU time")
+    parser.add_argument("--no-etag", action="store_true", help="Don't send If-None-Match")
+    parser.add_argument("--mix", action="store_true", help="Also tail the log and list /jobs each poll")
+    args = parser.parse_args()
+
+    def cache_stats():
+        try:
+            return requests.get(f"{args.base_url}/debug/status-cache", timeout=5).json()
+        except (requests.RequestException, ValueError):
+            return None
+
+    results = {"errors": 0, "bytes": 0, "latency": {}}
+    lock = threading.Lock()
+    cache_before = cache_stats()
+    cpu_before = cpu_seconds(args.pid) if args.pid else None
+    deadline = time.time() + args.duration
+
+    threads = [
+        threading.Thread(target=dashboard, args=(args.base_url, args.scan_id, args.interval, deadline, not args.no_etag, args.mix, results, lock))
+        for _ in range(args.dashboards)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    cpu_after = cpu_seconds(args.pid) if args.pid else None
+    cache_after = cache_stats()
+    polls = sum(len(values) for values in results["latency"].values())
+    if not polls:
+        print("No successful polls.")
+        sys.exit(1)
+
+    print(f"\n{polls} polls from {args.dashboards} dashboards over {args.duration:.0f}s")
+    print(f"  200: {results.get(200, 0)}  304: {results.get(304, 0)}  errors: {results['errors']}")
+    print(f"  received: {results['bytes'] / 1024:.1f} KiB ({results['bytes'] / polls:.0f} B/poll)")
+    for label, values in results["latency"].items():
+        values.sort()
+        print(f"  {label:>5} latency p50: {percentile(values, 0.5) * 1000:.1f} ms  "
+              f"p95: {percentile(values, 0.95) * 1000:.1f} ms  p99: {percentile(values, 0.99) * 1000:.1f} ms")
+    if cache_before and cache_after:
+        hits = cache_after["hits"] - cache_before["hits"]
+        misses = cache_after["misses"] - cache_before["misses"]
+        print(f"  server cache: {hits} hits, {misses} rebuilds")
+    if cpu_before is not None and cpu_after is not None:
+        print(f"  server CPU: {(cpu_after - cpu_before) * 1000:.0f} ms ({(cpu_after - cpu_before) / polls * 1000:.2f} ms/poll)")
+
+if __name__ == "__main__":
+    main()
@@ -4,33 +4,32 @@ import json
 import argparse
 import time
 from pathlib import Path
-from dotenv import load_dotenv
-import google.generativeai as genai
 from audit import ScanMonitor
-
-# Load environment variables
-load_dotenv()
-api_key = os.getenv("GOOGLE_API_KEY")
-
-if not api_key:
-    print("Error: GOOGLE_API_KEY not found in .env file.")
-    print("Please create a .env file with GOOGLE_API_KEY=your_key_here")
-    exit(1)
-
-genai.configure(api_key=api_key)
+from clients import get_model, configure_or_exit
+from budget import before_dispatch, shrink_batch, BudgetExceeded
+from job_errors import JobCancelled
 
 # Initialize The Ranker Model
 MODEL_NAME = "gemini-3-pro-preview" 
 
+def deal_rating(item):
+    try:
+        return float(item.get("deal_rating") or 0)
+    except (TypeError, ValueError):
+        return 0
+
 def rank_inventory(inventory_data, user_intent=None, monitor=None):
     """
     Sends the inventory to Gemini for analysis and ranking.
     """
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        
         # Prepare data for prompt (simplify to save tokens if needed, but JSON is good)
         inventory_str = json.dumps(inventory_data, indent=2)
+        # Near the scan budget: only send the best-rated items
+        trimmed = shrink_batch(monitor, "rank_deals", inventory_data, len(inventory_str), rank_key=deal_rating)
+        if len(trimmed) < len(inventory_data):
+            inventory_data = trimmed
+            inventory_str = json.dumps(inventory_data, indent=2)
         
         input_context = ""
         if user_intent:
@@ -77,13 +76,15 @@ def rank_inventory(inventory_data, user_intent=None, monitor=None):
         }}
         """
         
-        print(f"Sending {len(inventory_data)} items to {MODEL_NAME} for ranking...")
+        model_name = before_dispatch(monitor, "rank_deals", MODEL_NAME, len(prompt))
+        model = get_model(model_name)
+        print(f"Sending {len(inventory_data)} items to {model_name} for ranking...")
         response = model.generate_content(prompt)
         
         if monitor and response.usage_metadata:
              monitor.log_tokens(
                  "rank_deals", 
-                 MODEL_NAME, 
+                 model_name, 
                  response.usage_metadata.prompt_token_count, 
                  response.usage_metadata.candidates_token_count
              )
@@ -103,10 +104,61 @@ def rank_inventory(inventory_data, user_intent=None, monitor=None):
             print("Raw response preview:", text[:500])
             return None
             
+    except BudgetExceeded:
+        raise
     except Exception as e:
         print(f"Error during ranking: {e}")
         return None
 
+def rank(inventory, output_file, user_intent=None, monitor=None, cancel_event=None):
+    """
+    Stage API: ranks the analyzed inventory, merges the original item metadata back into
+    potential_buys and writes the report to output_file. Returns the ranking dict or None.
+    Setting cancel_event (a threading.Event) raises JobCancelled before the Ranker call
+    is sent and before its report is written.
+    """
+    output_file = Path(output_file)
+    print(f"Analyzing {len(inventory)} items...")
+
+    def check_cancel():
+        if cancel_event is not None and cancel_event.is_set():
+            raise JobCancelled("Ranking cancelled")
+
+    check_cancel()
+    ranking_results = rank_inventory(inventory, user_intent, monitor)
+    check_cancel()
+    
+    # Merge original metadata back into potential buys
+    if ranking_results and "potential_buys" in ranking_results:
+        # Create a map of the original inventory for fast lookup
+        inventory_map = {item.get("id"): item for item in inventory}
+        
+        merged_buys = []
+        for buy in ranking_results["potential_buys"]:
+            original = inventory_map.get(buy.get("id"))
+            if original:
+                # Merge original fields, but let Ranker's specific fields (reason, confidence) take precedence if needed
+                # Actually, we want Ranker's reason, but Original's screenshot/metadata
+                merged_item = original.copy()
+                merged_item.update(buy) # Overwrites original title/price if Ranker changed them, adds reason/confidence
+                merged_buys.append(merged_item)
+            else:
+                merged_buys.append(buy)
+        
+        ranking_results["potential_buys"] = merged_buys
+
+    if ranking_results:
+        print(f"Analysis complete. Found {len(ranking_results.get('potential_buys', []))} potential buys.")
+        
+        with open(output_file, "w", encoding="utf-8") as f:
+            json.dump(ranking_results, f, indent=2, ensure_ascii=False)
+            
+        print(f"Report saved to {output_file}")
+    else:
+        print("Analysis failed or returned no results.")
+
+    return ranking_results
+
 def main():
     parser = argparse.ArgumentParser(description="Rank Marketplace Deals with Gemini 3 Pro")
     parser.add_argument("--input", required=True, help="Path to market_inventory.json")
@@ -115,6 +167,7 @@ def main():
     parser.add_argument("--scan-id", help="Scan ID for audit logging")
     
     args = parser.parse_args()
+    configure_or_exit()
     
     input_file = Path(args.input)
     # Check if input file exists, if not check in data/
@@ -137,8 +190,6 @@ def main():
     if not inventory:
         print("Inventory is empty.")
         return
-        
-    print(f"Analyzing {len(inventory)} items...")
     
     monitor = None
     if args.scan_id:
@@ -147,40 +198,10 @@ def main():
         monitor = ScanMonitor(args.scan_id, data_dir=data_dir)
         monitor.start_step("rank_deals")
     
-    ranking_results = rank_inventory(inventory, args.user_intent, monitor)
-    
-    # Merge original metadata back into potential buys
-    if ranking_results and "potential_buys" in ranking_results:
-        # Create a map of the original inventory for fast lookup
-        inventory_map = {item.get("id"): item for item in inventory}
-        
-        merged_buys = []
-        for buy in ranking_results["potential_buys"]:
-            original = inventory_map.get(buy.get("id"))
-            if original:
-                # Merge original fields, but let Ranker's specific fields (reason, confidence) take precedence if needed
-                # Actually, we want Ranker's reason, but Original's screenshot/metadata
-                merged_item = original.copy()
-                merged_item.update(buy) # Overwrites original title/price if Ranker changed them, adds reason/confidence
-                merged_buys.append(merged_item)
-            else:
-                merged_buys.append(buy)
-        
-        ranking_results["potential_buys"] = merged_buys
-
+    rank(inventory, output_file, args.user_intent, monitor)
     
     if monitor:
         monitor.stop_step("rank_deals")
-    
-    if ranking_results:
-        print(f"Analysis complete. Found {len(ranking_results.get('potential_buys', []))} potential buys.")
-        
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(ranking_results, f, indent=2, ensure_ascii=False)
-            
-        print(f"Report saved to {output_file}")
-    else:
-        print("Analysis failed or returned no results.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,462 @@
+import os
+import json
+import uuid
+import shutil
+import tarfile
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from config import DATA_DIR
+from audit import ScanMonitor
+from job_catalog import get_catalog
+from job_queue import get_queue
+from search_index import get_search_index
+from blob_store import delete_output_dir, load_manifest, save_manifest, release, IMAGE_SUFFIXES
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows: no cross-process guard, run a single compactor
+
+# Retention and background compaction for DATA_DIR.
+# Policies (0 = off):
+#   RETENTION_SCREENSHOT_DAYS   delete a finished scan's screenshots after this many days
+#                               (its JSON, logs and audit stay, and it stays in /jobs and /search)
+#   RETENTION_ARCHIVE_DAYS      archive finished scans older than this
+#   RETENTION_KEEP_PER_SCHEDULE archive a schedule's scans beyond its newest N
+# Archiving bundles the job dir and the scan's JSON artifacts (not screenshots) into
+# data/archive/{YYYY-MM}/{scan_id}.tar.gz and removes the scan from the live dirs, the
+# job catalog and the search index; `python retention.py --restore <scan_id>` brings it back.
+# Scans younger than RETENTION_MIN_AGE_HOURS are never touched (coalesced scans may still
+# be linking to them).
+#
+# Deletes (DELETE /scan/{id}) rename the scan's dirs into data/trash/ and return at once;
+# the purge runs on the maintenance thread, one task at a time, with compaction
+# (every COMPACT_INTERVAL_MINUTES in the API process, guarded by a file lock so only one
+# node compacts). Task states are served by GET /maintenance/tasks/{task_id}.
+#
+#   python retention.py --compact [--dry-run]
+#   python retention.py --restore <scan_id>
+
+RETENTION_SCREENSHOT_DAYS = float(os.getenv("RETENTION_SCREENSHOT_DAYS", "0"))
+RETENTION_ARCHIVE_DAYS = float(os.getenv("RETENTION_ARCHIVE_DAYS", "0"))
+RETENTION_KEEP_PER_SCHEDULE = int(os.getenv("RETENTION_KEEP_PER_SCHEDULE", "0"))
+RETENTION_MIN_AGE_HOURS = float(os.getenv("RETENTION_MIN_AGE_HOURS", "24"))
+COMPACT_INTERVAL_MINUTES = float(os.getenv("COMPACT_INTERVAL_MINUTES", "60"))
+# First compaction this long after startup (also purges trash left by a crash)
+COMPACT_STARTUP_DELAY_SECONDS = 60
+
+TRASH_DIR = "trash"
+ARCHIVE_DIR = "archive"
+RETENTION_LOCK_FILE = ".retention.lock"
+MAX_TASKS = 200
+
+def policy():
+    return {
+        "screenshot_days": RETENTION_SCREENSHOT_DAYS,
+        "archive_days": RETENTION_ARCHIVE_DAYS,
+        "keep_per_schedule": RETENTION_KEEP_PER_SCHEDULE,
+        "min_age_hours": RETENTION_MIN_AGE_HOURS,
+    }
+
+def output_dir_path(data_dir, out_str):
+    """A scan's output dir, mapped from Docker paths if needed (None if it has none)."""
+    if not out_str:
+        return None
+    if out_str.startswith("/app/data") and str(data_dir) != "/app/data":
+        out_str = out_str.replace("/app/data", str(data_dir), 1)
+    return Path(out_str)
+
+def scan_output_dir_for(data_dir, job_dir):
+    try:
+        with open(Path(job_dir) / "audit.json", "r") as f:
+            return output_dir_path(data_dir, json.load(f).get("output_dir"))
+    except (OSError, ValueError):
+        return None
+
+def unlisted_bytes(path):
+    """Bytes deleting path frees: files not hard-linked elsewhere (interned blobs count on release)."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            if st.st_nlink <= 1:
+                total += st.st_size
+    return total
+
+def unlist(data_dir, scan_id):
+    """Drops a scan from the job catalog, search index and queue (so it's no longer a coalescing base)."""
+    get_catalog(data_dir).delete(scan_id)
+    get_search_index(data_dir).delete_scan(scan_id)
+    get_queue(data_dir).forget(scan_id)
+
+# --- Trash (asynchronous deletes) ---
+
+def move_to_trash(data_dir, scan_id, job_dir, output_dir=None):
+    """
+    Renames a scan's job dir and output dir into data/trash/{scan_id}.{token}/ - constant
+    time, so the scan is gone from the API at once. Returns the trash entry to purge.
+    Raises FileNotFoundError if the job dir doesn't exist.
+    """
+    entry = Path(data_dir) / TRASH_DIR / f"{scan_id}.{uuid.uuid4().hex[:8]}"
+    entry.mkdir(parents=True)
+    try:
+        os.rename(job_dir, entry / "job")
+    except OSError:
+        entry.rmdir()
+        raise
+    if output_dir and output_dir.exists():
+        try:
+            os.rename(output_dir, entry / "output")
+        except OSError:
+            # Output dir on another filesystem: purged in place
+            (entry / "output_path").write_text(str(output_dir))
+    return entry
+
+def purge(entry):
+    """Deletes a trash entry and releases its screenshots' blobs. Returns {"bytes_freed"}."""
+    entry = Path(entry)
+    output_dir = entry / "output"
+    if (entry / "output_path").exists():
+        output_dir = Path((entry / "output_path").read_text())
+    freed = 0
+    if output_dir.exists():
+        freed += unlisted_bytes(output_dir)
+        freed += delete_output_dir(output_dir)
+    if entry.exists():
+        freed += unlisted_bytes(entry)
+        shutil.rmtree(entry, ignore_errors=True)
+    return {"bytes_freed": freed}
+
+def purge_trash(data_dir):
+    """Purges every trash entry (deletes interrupted by a restart). Returns (entries, bytes freed)."""
+    trash_dir = Path(data_dir) / TRASH_DIR
+    count = freed = 0
+    if trash_dir.exists():
+        for entry in trash_dir.iterdir():
+            freed += purge(entry)["bytes_freed"]
+            count += 1
+    return count, freed
+
+# --- Maintenance tasks ---
+
+class MaintenanceTasks:
+    """
+    Runs deletes and compactions one at a time on a background thread and keeps the
+    states of the last MAX_TASKS tasks for the status endpoint.
+    """
+    def __init__(self, max_tasks=MAX_TASKS):
+        self.max_tasks = max_tasks
+        self._tasks = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="maintenance")
+            return self._executor
+
+    def submit(self, kind, func, *args, scan_id=None):
+        task = {
+            "task_id": uuid.uuid4().hex,
+            "kind": kind,
+            "scan_id": scan_id,
+            "status": "pending",
+            "created_at": datetime.now().isoformat(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            self._tasks[task["task_id"]] = task
+            while len(self._tasks) > self.max_tasks:
+                self._tasks.popitem(last=False)
+            snapshot = dict(task)
+        self.executor().submit(self._run, task, func, args)
+        return snapshot
+
+    def _set(self, task, **fields):
+        with self._lock:
+            task.update(fields)
+
+    def _run(self, task, func, args):
+        self._set(task, status="running", started_at=datetime.now().isoformat())
+        try:
+            result = func(*args)
+            self._set(task, status="done", result=result, finished_at=datetime.now().isoformat())
+        except Exception as e:
+            print(f"[!] Maintenance task {task['kind']} {task['scan_id'] or ''} failed: {e}")
+            self._set(task, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task else None
+
+    def recent(self, limit=20, kind=None):
+        with self._lock:
+            tasks = [dict(task) for task in reversed(self._tasks.values()) if not kind or task["kind"] == kind]
+        return tasks[:limit]
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+maintenance = MaintenanceTasks()
+
+def delete_scan(data_dir, scan_id):
+    """
+    Removes a scan from the API at once (dirs renamed into trash, catalog and search rows
+    dropped) and queues the purge. Returns the maintenance task.
+    Raises FileNotFoundError if the scan doesn't exist.
+    """
+    job_dir = Path(data_dir) / "jobs" / scan_id
+    entry = move_to_trash(data_dir, scan_id, job_dir, scan_output_dir_for(data_dir, job_dir))
+    unlist(data_dir, scan_id)
+    return maintenance.submit("delete", purge, entry, scan_id=scan_id)
+
+# --- Screenshot expiry and archiving ---
+
+def expire_screenshots(data_dir, row):
+    """Deletes a finished scan's screenshots, keeping its JSON, and records it in audit.json. Returns bytes freed."""
+    job_dir = Path(data_dir) / "jobs" / row["scan_id"]
+    if not job_dir.exists():
+        return 0 # Deleted meanwhile
+    output_dir = output_dir_path(data_dir, row["output_dir"])
+    freed = 0
+    if output_dir and output_dir.exists():
+        manifest = load_manifest(output_dir)
+        for path in output_dir.iterdir():
+            if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file():
+                st = path.stat()
+                if st.st_nlink <= 1:
+                    freed += st.st_size
+                path.unlink()
+        freed += release(manifest)
+        save_manifest(output_dir, {"files": {}})
+    ScanMonitor(row["scan_id"], data_dir=data_dir).update(screenshots_expired_at=datetime.now().isoformat())
+    return freed
+
+def archive_path(data_dir, row):
+    month = (row.get("start_time") or "")[:7] or "undated"
+    return Path(data_dir) / ARCHIVE_DIR / month / f"{row['scan_id']}.tar.gz"
+
+def find_archive(data_dir, scan_id):
+    bundles = sorted((Path(data_dir) / ARCHIVE_DIR).glob(f"*/{scan_id}.tar.gz"))
+    return bundles[-1] if bundles else None
+
+def archive_scan(data_dir, row):
+    """
+    Bundles a scan's job dir and JSON artifacts into archive/{YYYY-MM}/{scan_id}.tar.gz,
+    then removes it from the live data. Returns (bundle or None, bytes freed).
+    """
+    scan_id = row["scan_id"]
+    job_dir = Path(data_dir) / "jobs" / scan_id
+    if not job_dir.exists():
+        unlist(data_dir, scan_id) # Catalog row for a scan deleted by hand
+        return None, 0
+    output_dir = output_dir_path(data_dir, row["output_dir"])
+
+    def skip_screenshots(info):
+        return None if Path(info.name).suffix.lower() in IMAGE_SUFFIXES else info
+
+    bundle = archive_path(data_dir, row)
+    bundle.parent.mkdir(parents=True, exist_ok=True)
+    tmp = bundle.with_name(f".{bundle.name}.{os.getpid()}.tmp")
+    with tarfile.open(tmp, "w:gz") as tar:
+        tar.add(job_dir, arcname=f"jobs/{scan_id}")
+        if output_dir and output_dir.exists():
+            tar.add(output_dir, arcname=output_dir.name, filter=skip_screenshots)
+    os.replace(tmp, bundle)
+
+    entry = move_to_trash(data_dir, scan_id, job_dir, output_dir)
+    unlist(data_dir, scan_id)
+    return bundle, max(0, purge(entry)["bytes_freed"] - bundle.stat().st_size)
+
+def restore_scan(data_dir, scan_id):
+    """Extracts an archived scan back into the live data and re-indexes it. Returns the bundle path."""
+    data_dir = Path(data_dir)
+    bundle = find_archive(data_dir, scan_id)
+    if bundle is None:
+        raise FileNotFoundError(f"No archive for scan {scan_id}")
+    with tarfile.open(bundle, "r:gz") as tar:
+        members = []
+        for member in tar.getmembers():
+            parts = Path(member.name).parts
+            # Only this scan's job dir and one screenshots dir, no absolute paths or ..
+            if member.name.startswith("/") or ".." in parts or not (member.isfile() or member.isdir()):
+                continue
+            if parts[:2] == ("jobs", scan_id) or parts[0].startswith("screenshots_"):
+                members.append(member)
+        tar.extractall(data_dir, members=members)
+
+    monitor = ScanMonitor(scan_id, data_dir=data_dir)
+    # Archives hold no screenshots; this also upserts the catalog row
+    monitor.update(screenshots_expired_at=monitor.data.get("screenshots_expired_at") or datetime.now().isoformat())
+    output_dir = output_dir_path(data_dir, monitor.data.get("output_dir"))
+    scan = dict(monitor.data, scan_id=scan_id, output_dir=str(output_dir) if output_dir else None)
+    get_search_index(data_dir).index_scan(scan)
+    bundle.unlink()
+    return bundle
+
+# --- Compaction ---
+
+def parse_time(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def plan(rows, now=None, screenshot_days=0, archive_days=0, keep_per_schedule=0, min_age_hours=RETENTION_MIN_AGE_HOURS):
+    """
+    Splits finished catalog rows (newest first) into (to_archive, to_expire) under the policy.
+    """
+    now = now or datetime.now()
+    too_young = now - timedelta(hours=min_age_hours)
+    per_schedule = {}
+    to_archive = []
+    to_expire = []
+    for row in rows:
+        started = parse_time(row.get("start_time"))
+        schedule_id = row.get("schedule_id")
+        if schedule_id:
+            per_schedule[schedule_id] = per_schedule.get(schedule_id, 0) + 1
+        if started is None or started > too_young:
+            continue
+        if archive_days and started < now - timedelta(days=archive_days):
+            to_archive.append(row)
+        elif keep_per_schedule and schedule_id and per_schedule[schedule_id] > keep_per_schedule:
+            to_archive.append(row)
+        elif screenshot_days and started < now - timedelta(days=screenshot_days) and not row.get("screenshots_expired_at"):
+            to_expire.append(row)
+    return to_archive, to_expire
+
+class RetentionLock:
+    """Non-blocking exclusive lock on data/.retention.lock, so one node compacts at a time."""
+    def __init__(self, data_dir):
+        self.path = Path(data_dir) / RETENTION_LOCK_FILE
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.path, "a")
+        if fcntl:
+            try:
+                fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self.file.close()
+                self.file = None
+        return self.file is not None
+
+    def __exit__(self, *exc):
+        if self.file:
+            self.file.close() # Releases the flock
+
+def compact(data_dir=DATA_DIR, dry_run=False, **overrides):
+    """
+    One compaction pass: purges trash, archives and expires scans per the retention policy.
+    Returns a summary dict.
+    """
+    settings = dict(policy(), **overrides)
+    with RetentionLock(data_dir) as acquired:
+        if not acquired:
+            return {"skipped": "Another compaction is running"}
+        to_archive, to_expire = plan(get_catalog(data_dir).finished(), **settings)
+        summary = {
+            "policy": settings,
+            "dry_run": dry_run,
+            "archive": len(to_archive),
+            "expire_screenshots": len(to_expire),
+            "archived": 0,
+            "screenshots_expired": 0,
+            "trash_purged": 0,
+            "bytes_freed": 0,
+            "errors": 0,
+        }
+        if dry_run:
+            summary["archive_ids"] = [row["scan_id"] for row in to_archive]
+            summary["expire_ids"] = [row["scan_id"] for row in to_expire]
+            return summary
+
+        summary["trash_purged"], summary["bytes_freed"] = purge_trash(data_dir)
+        for row in to_archive:
+            try:
+                bundle, freed = archive_scan(data_dir, row)
+                summary["archived"] += 1 if bundle else 0
+                summary["bytes_freed"] += freed
+            except Exception as e:
+                print(f"[!] Archiving {row['scan_id']} failed: {e}")
+                summary["errors"] += 1
+        for row in to_expire:
+            try:
+                summary["bytes_freed"] += expire_screenshots(data_dir, row)
+                summary["screenshots_expired"] += 1
+            except Exception as e:
+                print(f"[!] Expiring screenshots of {row['scan_id']} failed: {e}")
+                summary["errors"] += 1
+    if summary["archived"] or summary["screenshots_expired"] or summary["trash_purged"]:
+        print(f"[*] Compaction: archived {summary['archived']}, expired screenshots of {summary['screenshots_expired']}, "
+              f"purged {summary['trash_purged']} deletes, freed {summary['bytes_freed'] / 1024 / 1024:.1f} MB")
+    return summary
+
+class Compactor:
+    """Queues a compaction on the maintenance thread every COMPACT_INTERVAL_MINUTES."""
+    def __init__(self, data_dir=DATA_DIR, interval_minutes=COMPACT_INTERVAL_MINUTES):
+        self.data_dir = data_dir
+        self.interval = interval_minutes * 60
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, name="compactor", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        delay = COMPACT_STARTUP_DELAY_SECONDS
+        while not self._stop.wait(delay):
+            maintenance.submit("compact", compact, self.data_dir)
+            delay = self.interval
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+compactor = Compactor()
+
+def main():
+    parser = argparse.ArgumentParser(description="Retention: archive old scans, expire screenshots, purge deletes")
+    parser.add_argument("--compact", action="store_true", help="Run one compaction pass")
+    parser.add_argument("--dry-run", action="store_true", help="With --compact: only list what would change")
+    parser.add_argument("--screenshot-days", type=float, default=RETENTION_SCREENSHOT_DAYS)
+    parser.add_argument("--archive-days", type=float, default=RETENTION_ARCHIVE_DAYS)
+    parser.add_argument("--keep-per-schedule", type=int, default=RETENTION_KEEP_PER_SCHEDULE)
+    parser.add_argument("--restore", metavar="SCAN_ID", help="Restore an archived scan")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"Data directory (default: {DATA_DIR})")
+    args = parser.parse_args()
+
+    if args.restore:
+        bundle = restore_scan(args.data_dir, args.restore)
+        print(f"Restored {args.restore} from {bundle}")
+    elif args.compact:
+        summary = compact(
+            args.data_dir, dry_run=args.dry_run, screenshot_days=args.screenshot_days,
+            archive_days=args.archive_days, keep_per_schedule=args.keep_per_schedule
+        )
+        print(json.dumps(summary, indent=2))
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
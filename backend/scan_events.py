@@ -0,0 +1,117 @@
+import os
+import json
+import time
+import asyncio
+from io_pool import run_io
+from log_sink import read_new_records
+
+# Server-sent event stream for one scan (GET /scan/{scan_id}/events).
+# Replaces the dashboard's 2-second polls of /scan/{id} and /scan/{id}/log with one
+# long-lived response. The stream watches the same files the pollers read (through
+# the status cache, so an idle check is a few stat() calls) and pushes only what changed:
+#
+#   snapshot  full /scan/{id} response (fresh connections only)
+#   progress  {status, stats}: status changes, stage timings, tokens and cost
+#   stage     {stage}: the stage now writing to the log
+#   items     {start, items}: inventory items analyzed since the last event
+#   results   {stage, results, early_steals}
+#   log       {records, reset}: new process.jsonl records
+#   end       the scan is finished; the stream closes
+#
+# Event ids are "{process.jsonl offset}.{inventory items sent}", so a reconnecting
+# EventSource (Last-Event-ID) picks up the log and items where it left off.
+
+SSE_POLL_SECONDS = float(os.getenv("SSE_POLL_SECONDS", "0.5"))
+SSE_KEEPALIVE_SECONDS = 15
+
+TERMINAL_STATUSES = ("complete", "failed", "cancelled", "aborted")
+
+def format_event(event, data, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+def parse_event_id(event_id):
+    """(log offset, items sent) from a Last-Event-ID, or None if it isn't one of ours."""
+    try:
+        log_offset, items_sent = event_id.split(".")
+        return int(log_offset), int(items_sent)
+    except (AttributeError, ValueError):
+        return None
+
+async def scan_event_stream(jsonl_file, load_status, last_event_id=None, is_disconnected=None, project=None):
+    """
+    Yields SSE text for one scan until it finishes (or the client goes away).
+    load_status() -> (response, etag) is the cached /scan/{id} builder;
+    project(response) optionally trims it (field projection) before it is sent.
+    """
+    resume = parse_event_id(last_event_id)
+    log_offset, items_sent = resume or (0, 0)
+    last_response = None
+    sent = {}
+    stage = None
+    last_write = time.monotonic()
+
+    while True:
+        if is_disconnected and await is_disconnected():
+            return
+        events = []
+        try:
+            response, _ = await run_io(load_status)
+        except OSError:
+            yield format_event("end", {"status": "not_found"}) # Job deleted
+            return
+
+        if response is not last_response:
+            last_response = response
+            if project:
+                response = project(response)
+            inventory = response.get("inventory") or []
+            progress = {"status": response["status"], "stats": response["stats"]}
+            results = {k: response.get(k) for k in ("stage", "results", "early_steals")}
+            if not resume and not sent:
+                events.append(("snapshot", response))
+                items_sent = len(inventory)
+            else:
+                if progress != sent.get("progress"):
+                    events.append(("progress", progress))
+                if len(inventory) < items_sent:
+                    items_sent = 0 # Inventory was rewritten (e.g. a rerun); resend it whole
+                if len(inventory) > items_sent:
+                    events.append(("items", {"start": items_sent, "items": inventory[items_sent:]}))
+                    items_sent = len(inventory)
+                if results != sent.get("results"):
+                    events.append(("results", results))
+            sent["progress"] = progress
+            sent["results"] = results
+
+        records, new_offset = await run_io(read_new_records, jsonl_file, log_offset)
+        # A fresh connection gets the whole log, replacing whatever the client had
+        reset = not resume and "log" not in sent
+        if records or reset:
+            log_offset = new_offset
+            sent["log"] = True
+            events.append(("log", {"records": records, "reset": reset}))
+            for record in records:
+                if record.get("stage") and record["stage"] != stage:
+                    stage = record["stage"]
+                    events.append(("stage", {"stage": stage}))
+
+        event_id = f"{log_offset}.{items_sent}"
+        for event, data in events:
+            yield format_event(event, data, event_id)
+        if events:
+            last_write = time.monotonic()
+        elif time.monotonic() - last_write >= SSE_KEEPALIVE_SECONDS:
+            yield ": keepalive\n\n"
+            last_write = time.monotonic()
+
+        # Finished and the log drained (finish_scan flushes it before the final snapshot)
+        if response["status"] in TERMINAL_STATUSES and response["stats"] and response["stats"].get("end_time") and not records:
+            yield format_event("end", {"status": response["status"]}, event_id)
+            return
+
+        await asyncio.sleep(SSE_POLL_SECONDS)
@@ -0,0 +1,323 @@
+import re
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+# Cross-scan listing search (data/search.db).
+# Every listing a scan writes is indexed with its analysis, ranking and verification:
+# an FTS5 table over the text (title, description, brand/model, location) plus plain
+# indexed columns for price, rating, verification and scan date. The pipeline re-indexes
+# a scan's items after each stage that writes artifacts, so results are searchable while
+# the scan runs. Like the job catalog, it can be rebuilt from the scans on disk:
+#
+#   python search_index.py --rebuild
+#   python search_index.py --query "aeron" --max-price 400 --days 30
+
+SEARCH_DB_FILE = "search.db"
+# Matches are counted up to this many (counting every hit of a broad query costs more than the page)
+SEARCH_COUNT_LIMIT = 10000
+
+SORTS = {
+    "relevance": "rank",
+    "price": "l.price",
+    "rating": "l.deal_rating",
+    "date": "l.scanned_at",
+}
+
+COLUMNS = [
+    "scan_id", "item_id", "title", "description", "brand_model", "location", "url", "screenshot",
+    "output_dir", "price", "estimated_new_price", "deal_rating", "condition", "tier",
+    "verified", "stage", "query", "scanned_at"
+]
+
+def parse_price(value):
+    """'$1,250' / 'A$400' / 'Free' / 400 -> float (None if there's no number)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if not value:
+        return None
+    text = str(value)
+    if text.strip().lower() == "free":
+        return 0.0
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", text)
+    return float(match.group().replace(",", "")) if match else None
+
+def load_items(path, key=None):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    if key and isinstance(data, dict):
+        data = data.get(key, [])
+    return [item for item in data if isinstance(item, dict) and item.get("id") is not None] if isinstance(data, list) else []
+
+def scan_items(output_dir):
+    """
+    Merged item dicts for a scan, keyed by item id, plus the furthest stage each reached.
+    Later artifacts add to / override the fields of earlier ones.
+    """
+    output_dir = Path(output_dir)
+    items = {}
+    stages = {}
+    for name, key, stage in [
+        ("listings.json", None, "scraped"),
+        ("market_inventory.json", None, "analyzed"),
+        ("potential_buys.json", "potential_buys", "ranked"),
+        ("verified_steals.json", "verified", "verified"),
+    ]:
+        for item in load_items(output_dir / name, key):
+            item_id = str(item["id"])
+            items.setdefault(item_id, {}).update(item)
+            stages[item_id] = stage
+    return items, stages
+
+def index_row(scan, item_id, item, stage):
+    description = item.get("description") or item.get("description_raw") or ""
+    return {
+        "scan_id": scan["scan_id"],
+        "item_id": item_id,
+        "title": item.get("title"),
+        "description": description,
+        "brand_model": item.get("visual_brand_model"),
+        "location": item.get("location"),
+        "url": item.get("url"),
+        "screenshot": item.get("screenshot"),
+        "output_dir": Path(scan["output_dir"]).name,
+        "price": parse_price(item.get("price")),
+        "estimated_new_price": parse_price(item.get("estimated_new_price")),
+        "deal_rating": parse_price(item.get("deal_rating")),
+        "condition": item.get("visual_condition"),
+        "tier": item.get("visual_tier"),
+        "verified": 1 if stage == "verified" else 0,
+        "stage": stage,
+        "query": scan.get("query"),
+        "scanned_at": scan.get("start_time"),
+    }
+
+def fts_query(text):
+    """User text -> FTS5 query: every word must match (as a prefix), quotes are escaped."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+class SearchIndex:
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.created = not self.db_path.exists()
+        self._write_lock = threading.Lock()
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS listings (
+                    id INTEGER PRIMARY KEY,
+                    scan_id TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    title TEXT,
+                    description TEXT,
+                    brand_model TEXT,
+                    location TEXT,
+                    url TEXT,
+                    screenshot TEXT,
+                    output_dir TEXT,
+                    price REAL,
+                    estimated_new_price REAL,
+                    deal_rating REAL,
+                    condition TEXT,
+                    tier TEXT,
+                    verified INTEGER,
+                    stage TEXT,
+                    query TEXT,
+                    scanned_at TEXT,
+                    UNIQUE (scan_id, item_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_listings_price ON listings (price);
+                CREATE INDEX IF NOT EXISTS idx_listings_rating ON listings (deal_rating);
+                CREATE INDEX IF NOT EXISTS idx_listings_scanned ON listings (scanned_at);
+                CREATE VIRTUAL TABLE IF NOT EXISTS listings_fts USING fts5(
+                    title, description, brand_model, location,
+                    content='listings', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+                );
+                -- Keep the FTS index in step with the listings table
+                CREATE TRIGGER IF NOT EXISTS listings_ai AFTER INSERT ON listings BEGIN
+                    INSERT INTO listings_fts (rowid, title, description, brand_model, location)
+                    VALUES (new.id, new.title, new.description, new.brand_model, new.location);
+                END;
+                CREATE TRIGGER IF NOT EXISTS listings_ad AFTER DELETE ON listings BEGIN
+                    INSERT INTO listings_fts (listings_fts, rowid, title, description, brand_model, location)
+                    VALUES ('delete', old.id, old.title, old.description, old.brand_model, old.location);
+                END;
+                CREATE TRIGGER IF NOT EXISTS listings_au AFTER UPDATE ON listings BEGIN
+                    INSERT INTO listings_fts (listings_fts, rowid, title, description, brand_model, location)
+                    VALUES ('delete', old.id, old.title, old.description, old.brand_model, old.location);
+                    INSERT INTO listings_fts (rowid, title, description, brand_model, location)
+                    VALUES (new.id, new.title, new.description, new.brand_model, new.location);
+                END;
+            """)
+        finally:
+            conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _upsert(self, conn, rows):
+        updates = ", ".join(f"{c} = excluded.{c}" for c in COLUMNS if c not in ("scan_id", "item_id"))
+        conn.executemany(
+            f"INSERT INTO listings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)}) "
+            f"ON CONFLICT (scan_id, item_id) DO UPDATE SET {updates}",
+            [[row[c] for c in COLUMNS] for row in rows]
+        )
+
+    def index_scan(self, scan):
+        """
+        (Re)indexes one scan's items from its output dir, in one transaction.
+        scan: audit fields (scan_id, output_dir, query, start_time). Returns items indexed.
+        """
+        if not scan.get("scan_id") or not scan.get("output_dir"):
+            return 0
+        items, stages = scan_items(scan["output_dir"])
+        rows = [index_row(scan, item_id, item, stages[item_id]) for item_id, item in items.items()]
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    self._upsert(conn, rows)
+            finally:
+                conn.close()
+        return len(rows)
+
+    def delete_scan(self, scan_id):
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM listings WHERE scan_id = ?", (scan_id,))
+            finally:
+                conn.close()
+
+    def search(self, text=None, min_price=None, max_price=None, min_rating=None, max_rating=None,
+               since=None, until=None, verified=None, scan_id=None, sort="relevance", order=None,
+               limit=50, offset=0):
+        """
+        Returns (rows, total); total stops at SEARCH_COUNT_LIMIT.
+        since/until compare against the scan's ISO start time.
+        """
+        where = []
+        args = []
+        match = fts_query(text)
+        if match:
+            source = "listings_fts f JOIN listings l ON l.id = f.rowid"
+            where.append("listings_fts MATCH ?")
+            args.append(match)
+            rank = "bm25(listings_fts, 10.0, 1.0, 5.0, 2.0)"
+        else:
+            source = "listings l"
+            rank = "l.scanned_at"
+            if sort == "relevance":
+                sort = "date"
+        for clause, value in [
+            ("l.price >= ?", min_price), ("l.price <= ?", max_price),
+            ("l.deal_rating >= ?", min_rating), ("l.deal_rating <= ?", max_rating),
+            ("l.scanned_at >= ?", since), ("l.scanned_at <= ?", until),
+            ("l.scan_id = ?", scan_id),
+        ]:
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        if verified is not None:
+            where.append("l.verified = ?")
+            args.append(1 if verified else 0)
+        where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+        column = SORTS.get(sort, "rank").replace("rank", rank)
+        # Default: best match (lowest bm25) and cheapest first, highest rating and newest first
+        direction = order or ("asc" if sort in ("relevance", "price") else "desc")
+        direction = "ASC" if str(direction).lower() == "asc" else "DESC"
+        nulls = f"{column} IS NULL, " if sort in ("price", "rating") else ""
+
+        conn = self._connect()
+        try:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM {source} {where_sql} LIMIT {SEARCH_COUNT_LIMIT})", args
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT l.* FROM {source} {where_sql} ORDER BY {nulls}{column} {direction}, l.id DESC LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows], total
+
+    def rebuild(self, data_dir):
+        """Re-indexes every scan with an output dir (from data/jobs/*/audit.json)."""
+        jobs_dir = Path(data_dir) / "jobs"
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM listings")
+                    conn.execute("INSERT INTO listings_fts (listings_fts) VALUES ('rebuild')")
+            finally:
+                conn.close()
+        count = 0
+        if jobs_dir.exists():
+            for audit_file in jobs_dir.glob("*/audit.json"):
+                try:
+                    with open(audit_file, "r") as f:
+                        data = json.load(f)
+                except:
+                    continue
+                data.setdefault("scan_id", audit_file.parent.name)
+                count += self.index_scan(data)
+        return count
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_search_index(data_dir):
+    """Shared index for data_dir. A newly created index is filled from existing scans."""
+    path = Path(data_dir) / SEARCH_DB_FILE
+    with _indexes_lock:
+        if path not in _indexes:
+            index = SearchIndex(path)
+            if index.created:
+                count = index.rebuild(data_dir)
+                if count:
+                    print(f"[*] Search index created, indexed {count} existing listings.")
+            _indexes[path] = index
+        return _indexes[path]
+
+def main():
+    from config import DATA_DIR
+    parser = argparse.ArgumentParser(description="Rebuild or query the cross-scan listing search index")
+    parser.add_argument("--rebuild", action="store_true", help="Re-index every scan")
+    parser.add_argument("--data-dir", default=DATA_DIR, help=f"Data directory (default: {DATA_DIR})")
+    parser.add_argument("--query", help="Search text")
+    parser.add_argument("--max-price", type=float)
+    parser.add_argument("--min-rating", type=float)
+    parser.add_argument("--days", type=float, help="Only scans from the last N days")
+    args = parser.parse_args()
+
+    index_path = Path(args.data_dir) / SEARCH_DB_FILE
+    if args.rebuild:
+        count = SearchIndex(index_path).rebuild(args.data_dir)
+        print(f"Indexed {count} listings into {index_path}")
+    elif args.query or args.max_price is not None or args.min_rating is not None or args.days:
+        from datetime import datetime, timedelta
+        since = (datetime.now() - timedelta(days=args.days)).isoformat() if args.days else None
+        started = time.perf_counter()
+        rows, total = SearchIndex(index_path).search(args.query, max_price=args.max_price, min_rating=args.min_rating, since=since)
+        elapsed = (time.perf_counter() - started) * 1000
+        for row in rows:
+            print(f"  ${row['price'] or 0:>8.0f}  {row['deal_rating'] or '-':>4}  {row['title']}  ({row['scanned_at'][:10] if row['scanned_at'] else '?'}, {row['url']})")
+        print(f"{total} matches in {elapsed:.1f} ms")
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
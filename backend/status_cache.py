@@ -0,0 +1,107 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Response cache for GET /scan/{scan_id}.
+# The dashboard polls every 2 seconds, and each poll used to re-open and parse audit.json
+# and the scan's result artifacts. Responses are now cached per scan, keyed by the
+# (mtime, size) of every file they are built from, so a poll between stage transitions
+# costs a handful of stat() calls. The key also gives the response its ETag: a client
+# sending it back in If-None-Match gets a 304 with no body.
+
+# Artifacts get_scan_status reads from a scan's output dir
+STATUS_ARTIFACTS = [
+    "listings.json",
+    "market_inventory.json",
+    "speculative_verdicts.json",
+    "potential_buys.json",
+    "verified_steals.json",
+]
+
+STATUS_CACHE_SIZE = int(os.getenv("STATUS_CACHE_SIZE", "256"))
+
+def file_signature(paths):
+    """(mtime_ns, size) per path, None for a missing file."""
+    signature = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            signature.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def etag_for(signature):
+    return '"' + hashlib.sha1(repr(signature).encode()).hexdigest()[:20] + '"'
+
+def etag_matches(if_none_match, etag):
+    """If-None-Match check (handles lists, '*' and weak W/ validators)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+class StatusCache:
+    """
+    LRU of scan_id -> (signature, output_dir, response, etag).
+    output_dir is remembered so a hit can be checked without parsing audit.json;
+    if audit.json changes, the signature changes and the entry is rebuilt.
+    """
+    def __init__(self, max_entries=STATUS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def signature(self, audit_file, output_dir):
+        paths = [audit_file]
+        if output_dir:
+            paths += [os.path.join(output_dir, name) for name in STATUS_ARTIFACTS]
+        return file_signature(paths)
+
+    def get(self, scan_id, audit_file, build):
+        """
+        Returns (response, etag or None) for scan_id. build() -> (response, output_dir) parses the
+        files; it only runs when one of them changed since the cached response was built.
+        """
+        with self._lock:
+            entry = self._entries.get(scan_id)
+        if entry:
+            signature, output_dir, response, etag = entry
+            if self.signature(audit_file, output_dir) == signature:
+                with self._lock:
+                    self._entries.move_to_end(scan_id)
+                    self.hits += 1
+                return response, etag
+
+        # Stat before reading: a write racing the build leaves an older signature, so the
+        # next poll rebuilds rather than serving a stale response. If the output dir wasn't
+        # known yet (first poll, or it moved) the response isn't cached or tagged.
+        guess = entry[1] if entry else None
+        signature = self.signature(audit_file, guess)
+        response, output_dir = build()
+        if output_dir != guess:
+            signature = None
+        etag = etag_for((scan_id, signature)) if signature else None
+        with self._lock:
+            self.misses += 1
+            self._entries[scan_id] = (signature, output_dir, response, etag)
+            self._entries.move_to_end(scan_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return response, etag
+
+    def invalidate(self, scan_id):
+        with self._lock:
+            self._entries.pop(scan_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+status_cache = StatusCache()
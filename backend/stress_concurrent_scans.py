@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Concurrency stress test for the scan pipeline.
+# Runs many scans at once through pipeline.run_scan (the same entry point the API and
+# scheduler use), with the stage bodies replaced by fast fakes that write scan-tagged
+# artifacts, print through the log router and share one verdict cache.
+# Afterwards every scan's output dir, artifacts, process.log and checkpoint are checked
+# for cross-talk. No browser, Facebook session or Gemini key is needed.
+#
+#   python stress_concurrent_scans.py --scans 50
+#
+# With --processes, scans are enqueued on the shared queue instead and run by that many
+# separate worker processes (like worker.py nodes). --kill-one SIGKILLs one of them
+# mid-run to check that its leased jobs are re-leased and finished by the others.
+#
+#   python stress_concurrent_scans.py --scans 30 --processes 3 --kill-one
+
+# Set before pipeline/config are imported so every process shares the same data dir
+if "--data-dir" in sys.argv:
+    os.environ["DATA_DIR"] = sys.argv[sys.argv.index("--data-dir") + 1]
+elif not os.getenv("DATA_DIR"):
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="mh_stress_")
+
+import pipeline
+from audit import ScanMonitor
+from deep_dive import VerdictCache, VERDICT_CACHE_FILE
+from job_queue import open_queue, start_workers
+
+STAGE_DELAY = float(os.getenv("STRESS_STAGE_DELAY", "0.02"))
+
+def fake_stage(name):
+    async def run_stage(run):
+        scan_id = run.monitor.scan_id
+        for i in range(3):
+            print(f"{name} step {i} for {scan_id}")
+            await asyncio.sleep(random.uniform(0, STAGE_DELAY))
+
+        if name == "scraper":
+            run.output_dir.mkdir(parents=True, exist_ok=True)
+            run.listings = [{"id": f"{scan_id}-{i}", "scan_id": scan_id} for i in range(5)]
+            artifact = "listings.json"
+            payload = run.listings
+        elif name == "analyze_images":
+            run.inventory = [dict(item, deal_rating=random.randint(1, 10)) for item in run.listings]
+            artifact = "market_inventory.json"
+            payload = run.inventory
+        elif name == "rank_deals":
+            run.ranking = {"potential_buys": run.inventory[:2]}
+            artifact = "potential_buys.json"
+            payload = run.ranking
+        else:
+            # Every scan writes into the one shared cache, like concurrent deep dives do
+            cache = VerdictCache(run.data_dir / VERDICT_CACHE_FILE)
+            for deal in run.ranking["potential_buys"]:
+                cache.put(deal["id"], scan_id, {"verdict": "VERIFIED_DEAL"})
+            cache.save()
+            artifact = "verified_steals.json"
+            payload = {"verified": run.ranking["potential_buys"], "rejected": []}
+
+        with open(run.output_dir / artifact, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+    return run_stage
+
+def check_scan(data_dir, scan_id, seen_dirs):
+    """Returns a list of problems found for one scan."""
+    problems = []
+    job_dir = Path(data_dir) / "jobs" / scan_id
+    with open(job_dir / "audit.json", "r") as f:
+        audit = json.load(f)
+
+    output_dir = Path(audit.get("output_dir") or "")
+    if not audit.get("output_dir") or not output_dir.exists():
+        return [f"{scan_id}: output_dir missing ({audit.get('output_dir')})"]
+    if output_dir in seen_dirs:
+        problems.append(f"{scan_id}: output_dir shared with {seen_dirs[output_dir]}")
+    seen_dirs[output_dir] = scan_id
+
+    for artifact in ["listings.json", "market_inventory.json"]:
+        with open(output_dir / artifact, "r") as f:
+            items = json.load(f)
+        foreign = [item for item in items if item.get("scan_id") != scan_id]
+        if foreign:
+            problems.append(f"{scan_id}: {artifact} has {len(foreign)} items from other scans")
+
+    with open(job_dir / "process.log", "r") as f:
+        for line in f:
+            if " for " in line and "step" in line and scan_id not in line:
+                problems.append(f"{scan_id}: foreign log line: {line.strip()}")
+                break
+
+    with open(job_dir / pipeline.CHECKPOINT_FILE, "r") as f:
+        stages = json.load(f)["stages"]
+    incomplete = [name for name, stage in stages.items() if stage.get("status") != "complete"]
+    if incomplete:
+        problems.append(f"{scan_id}: stages not complete: {incomplete}")
+    if not audit.get("end_time"):
+        problems.append(f"{scan_id}: scan never finished")
+    return problems
+
+def use_fake_stages():
+    for name, stage in pipeline.STAGES.items():
+        stage["run"] = fake_stage(name)
+        # No Chromium in fake runs; llm slots are still contended
+        resources = stage.get("resources", [])
+        stage["resources"] = lambda run, resources=resources: [
+            r for r in (resources(run) if callable(resources) else resources) if r != "browser"
+        ]
+    pipeline.configure_genai = lambda: None
+
+def run_threads(data_dir, scan_ids, params):
+    def run_one(scan_id):
+        monitor = ScanMonitor(scan_id, data_dir=data_dir, query=params["query"])
+        pipeline.run_scan(monitor, dict(params), data_dir)
+
+    threads = [threading.Thread(target=run_one, args=(scan_id,)) for scan_id in scan_ids]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def run_processes(data_dir, scan_ids, params, processes, kill_one):
+    queue = open_queue(data_dir)
+    for scan_id in scan_ids:
+        pipeline.enqueue_scan(scan_id, dict(params), {"query": params["query"]})
+
+    env = dict(os.environ, DATA_DIR=str(data_dir))
+    workers = [
+        subprocess.Popen([sys.executable, __file__, "--worker-mode", "--data-dir", str(data_dir)], env=env)
+        for _ in range(processes)
+    ]
+
+    killed = False
+    try:
+        while True:
+            time.sleep(1)
+            stats = queue.stats()
+            print(f"queued={stats['queued']} running={stats['running']} done={stats['done']} failed={stats['failed']}")
+            if kill_one and not killed and stats["running"] > 0:
+                print(f"Killing worker process {workers[0].pid} mid-run...")
+                workers[0].send_signal(signal.SIGKILL)
+                killed = True
+            if stats["queued"] == 0 and stats["running"] == 0:
+                break
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.terminate()
+                worker.wait()
+    return queue.stats()
+
+def worker_mode():
+    use_fake_stages()
+    start_workers(open_queue(os.environ["DATA_DIR"]), pipeline.run_job, count=2, on_lease_lost=pipeline.lease_lost)
+    while True:
+        time.sleep(1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many concurrent fake scans and check for cross-talk")
+    parser.add_argument("--scans", type=int, default=20, help="Number of concurrent scans (default: 20)")
+    parser.add_argument("--data-dir", help="Data dir to use (default: a new temp dir)")
+    parser.add_argument("--processes", type=int, default=0, help="Run scans through the queue with this many worker processes")
+    parser.add_argument("--kill-one", action="store_true", help="With --processes: SIGKILL one worker mid-run")
+    parser.add_argument("--worker-mode", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_mode:
+        worker_mode()
+        return
+
+    data_dir = Path(os.environ["DATA_DIR"])
+    mode = f"{args.processes} worker processes" if args.processes else "threads"
+    print(f"Running {args.scans} concurrent scans ({mode}) in {data_dir}...")
+
+    use_fake_stages()
+
+    # Same query for every scan, so only the scan id keeps their output dirs apart
+    scan_ids = [str(uuid.uuid4()) for _ in range(args.scans)]
+    params = {"query": "stress test", "location": "sydney", "radius": 10, "min_listings": 5}
+
+    if args.processes:
+        stats = run_processes(data_dir, scan_ids, params, args.processes, args.kill_one)
+        print(f"Queue finished: {stats['done']} done, {stats['failed']} failed.")
+    else:
+        run_threads(data_dir, scan_ids, params)
+
+    problems = []
+    seen_dirs = {}
+    for scan_id in scan_ids:
+        problems.extend(check_scan(data_dir, scan_id, seen_dirs))
+
+    with open(data_dir / VERDICT_CACHE_FILE, "r") as f:
+        cache = json.load(f)
+    missing = [scan_id for scan_id in scan_ids if f"{scan_id}-0" not in cache and f"{scan_id}-1" not in cache]
+    if missing:
+        problems.append(f"Verdict cache lost entries from {len(missing)} scans")
+
+    if problems:
+        print(f"\n❌ {len(problems)} problems:")
+        for problem in problems[:50]:
+            print(f"  - {problem}")
+        sys.exit(1)
+
+    print(f"\n✅ {args.scans} concurrent scans, {len(seen_dirs)} distinct output dirs, no cross-talk.")
+
+if __name__ == "__main__":
+    main()
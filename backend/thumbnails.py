@@ -0,0 +1,146 @@
+import os
+import asyncio
+import hashlib
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from config import DATA_DIR
+from io_pool import run_io
+
+# Resized screenshot variants for the dashboard (GET /thumb/{scan}/{file}?w=).
+# The cards used to load the full-size PNG screenshots straight from /data. Thumbnails
+# are rendered once per (source file version, width, format) on a small worker pool and
+# kept in a size-bounded disk cache (DATA_DIR/thumbs, least recently used evicted first).
+# The cache key is derived from the source's mtime and size, so it doubles as an ETag
+# and responses can be marked immutable.
+
+THUMB_CACHE_DIR = Path(DATA_DIR) / "thumbs"
+THUMB_CACHE_MAX_MB = float(os.getenv("THUMB_CACHE_MAX_MB", "256"))
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "75"))
+# Requested widths snap up to one of these, so the cache holds a few variants per image
+THUMB_WIDTHS = [160, 320, 480, 640, 960, 1280]
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+def snap_width(width):
+    for candidate in THUMB_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return THUMB_WIDTHS[-1]
+
+def resolve_source(scan, file):
+    """Path of a screenshot under DATA_DIR/{scan}/. Raises ValueError for anything else."""
+    root = Path(DATA_DIR).resolve()
+    source = (root / scan / file).resolve()
+    if root not in source.parents or source.suffix.lower() not in IMAGE_EXTENSIONS:
+        raise ValueError("Not a screenshot")
+    return source
+
+def render(source, target, width, fmt):
+    """Resizes source to width (never upscaling) and writes it atomically to target."""
+    with Image.open(source) as img:
+        img.load()
+        if img.width > width:
+            img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        tmp = target.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        img.save(tmp, FORMATS[fmt][0], quality=THUMB_QUALITY)
+    os.replace(tmp, target)
+    return target.stat().st_size
+
+class ThumbnailCache:
+    def __init__(self, cache_dir=THUMB_CACHE_DIR, max_bytes=THUMB_CACHE_MAX_MB * 1024 * 1024, workers=THUMB_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._size = None # Bytes on disk, counted on first use
+        self._rendering = {} # key -> asyncio.Future, so concurrent requests render once
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="thumb")
+        return self._executor
+
+    def key(self, source, width, fmt):
+        st = source.stat() # FileNotFoundError -> 404
+        return hashlib.sha1(f"{source}:{st.st_mtime_ns}:{st.st_size}:{width}:{fmt}".encode()).hexdigest()[:24]
+
+    def path(self, key, fmt):
+        return self.cache_dir / f"{key}.{fmt}"
+
+    def lookup(self, source, width, fmt):
+        """(key, cached path or None). A hit is touched so eviction sees it as recent."""
+        key = self.key(source, width, fmt)
+        target = self.path(key, fmt)
+        try:
+            os.utime(target)
+            return key, target
+        except FileNotFoundError:
+            return key, None
+
+    def _render(self, source, key, width, fmt):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        target = self.path(key, fmt)
+        size = render(source, target, width, fmt)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self.cache_dir.glob("*.*") if not f.name.endswith(".tmp"))
+            else:
+                self._size += size
+            if self._size > self.max_bytes:
+                self._evict(keep=target)
+        return target
+
+    def _evict(self, keep=None):
+        """Deletes least recently used thumbnails (except keep) until the cache is at 90% of its budget."""
+        files = []
+        for f in self.cache_dir.glob("*.*"):
+            try:
+                st = f.stat()
+                files.append((st.st_mtime, st.st_size, f))
+            except FileNotFoundError:
+                pass
+        files.sort()
+        for _, size, f in files:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            if f == keep:
+                continue
+            try:
+                f.unlink()
+                self._size -= size
+            except FileNotFoundError:
+                pass
+
+    async def get(self, source, width, fmt):
+        """Returns (path, key) of the thumbnail, rendering it on the worker pool if needed."""
+        loop = asyncio.get_running_loop()
+        # Hits (stat + touch) go to the API I/O pool, not behind renders
+        key, cached = await run_io(self.lookup, source, width, fmt)
+        if cached:
+            return cached, key
+        pending = self._rendering.get(key)
+        if pending is None:
+            pending = loop.run_in_executor(self.executor(), self._render, source, key, width, fmt)
+            self._rendering[key] = pending
+            pending.add_done_callback(lambda _: self._rendering.pop(key, None))
+        return await asyncio.shield(pending), key
+
+thumbnail_cache = ThumbnailCache()
+
+async def thumbnail(scan, file, width, webp=True):
+    """(path, etag, media type) for a resized screenshot. Raises ValueError / FileNotFoundError."""
+    source = resolve_source(scan, file)
+    fmt = "webp" if webp else "jpeg"
+    path, key = await thumbnail_cache.get(source, snap_width(max(1, width)), fmt)
+    return path, f'"{key}"', FORMATS[fmt][1]
@@ -0,0 +1,60 @@
+import argparse
+import signal
+import time
+from pathlib import Path
+
+from config import DATA_DIR
+from clients import configure_or_exit
+import job_queue
+from job_queue import open_queue, start_workers, stop_workers, node_name, SCAN_WORKERS
+
+# Standalone scan worker.
+# Claims jobs from the shared queue (QUEUE_BACKEND=sqlite on a shared DATA_DIR, or
+# QUEUE_BACKEND=redis with REDIS_URL) and runs them with the same pipeline as the API
+# process. Results land in the shared DATA_DIR, so one dashboard sees every node's scans.
+# Run the API with EMBEDDED_WORKERS=0 to leave all scanning to these processes.
+#
+#   python worker.py --workers 2
+
+def main():
+    parser = argparse.ArgumentParser(description="Marketplace Hunter scan worker")
+    parser.add_argument("--workers", type=int, default=SCAN_WORKERS, help=f"Concurrent scans on this node (default: {SCAN_WORKERS})")
+    parser.add_argument("--browser-slots", type=int, help="Concurrent Chromium instances on this node (default: BROWSER_SLOTS)")
+    parser.add_argument("--llm-slots", type=int, help="Concurrent Gemini-bound stages on this node (default: LLM_SLOTS)")
+    args = parser.parse_args()
+
+    configure_or_exit()
+    Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+
+    if args.browser_slots or args.llm_slots:
+        capacities = dict(job_queue.RESOURCE_SLOTS)
+        if args.browser_slots:
+            capacities["browser"] = args.browser_slots
+        if args.llm_slots:
+            capacities["llm"] = args.llm_slots
+        job_queue.resource_slots = job_queue.ResourceSlots(capacities)
+
+    # Imported after the slot override so pipeline binds this node's slots
+    from pipeline import run_job, lease_lost, start_log_router, stop_log_router
+
+    print(f"[*] Worker {node_name()} using DATA_DIR: {DATA_DIR}")
+    queue = open_queue(DATA_DIR)
+    start_log_router()
+    start_workers(queue, run_job, count=args.workers, on_lease_lost=lease_lost)
+
+    stopping = []
+    def shutdown(signum, frame):
+        # Running jobs stop heartbeating and are re-leased as resumes by another worker
+        print(f"[*] Worker {node_name()} stopping (signal {signum}).")
+        stop_workers()
+        stopping.append(signum)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    while not stopping:
+        time.sleep(1)
+    stop_log_router()
+
+if __name__ == "__main__":
+    main()
@@ -50,6 +50,7 @@ function App() {
     const activeScan = scanData;
     const results = activeScan?.results || [];
     const inventory = activeScan?.inventory || [];
+    const earlySteals = activeScan?.early_steals || [];
 
     return (
         <div className="flex h-screen bg-background text-foreground overflow-hidden">
@@ -164,8 +165,11 @@ function App() {
                                         className="h-6 w-6 opacity-0 group-hover:opacity-100"
                                         onClick={(e) => {
                                             e.stopPropagation();
-                                            deleteJobMutation.mutate(job.scan_id);
-                                            if (scanId === job.scan_id) setScanId(null);
+                                            deleteJobMutation.mutate(job.scan_id, {
+                                                onSuccess: () => {
+                                                    if (scanId === job.scan_id) setScanId(null);
+                                                }
+                                            });
                                         }}
                                     >
                                         <Trash2 className="h-3 w-3 text-destructive" />
@@ -226,11 +230,32 @@ function App() {
                                         }
                                     >
                                         {inventory.map(deal => (
-                                            <DealCard key={deal.id} deal={deal} basePath={(activeScan?.stats as any)?.output_dir} />
+                                            <DealCard key={deal.id} deal={deal} basePath={(activeScan?.stats as any)?.output_dir} scanId={scanId} />
                                         ))}
                                     </Carousel>
                                 )}
 
+                                {/* 2b. Speculative Deep Dive: verified before ranking finished */}
+                                {earlySteals.length > 0 && activeScan?.stage !== 'complete' && (
+                                    <div className="mt-8">
+                                        <Carousel
+                                            title={
+                                                <div className="flex items-center gap-4">
+                                                    <h2 className="text-xl font-bold flex items-center gap-2 text-emerald-300">
+                                                        <span className="h-2 w-2 rounded-full bg-emerald-400 animate-pulse" />
+                                                        Early Verified Picks ({earlySteals.length})
+                                                    </h2>
+                                                    <Separator className="flex-1 bg-emerald-900/30" />
+                                                </div>
+                                            }
+                                        >
+                                            {earlySteals.map(deal => (
+                                                <DealCard key={deal.id} deal={deal} basePath={(activeScan?.stats as any)?.output_dir} scanId={scanId} />
+                                            ))}
+                                        </Carousel>
+                                    </div>
+                                )}
+
                                 {/* 3. Ranking/Deep Dive Phase: Verified Top Picks (Below Inventory) */}
                                 {results && results.length > 0 && activeScan?.stage !== 'scraped' && (
                                     <div className="mt-8">
@@ -246,7 +271,7 @@ function App() {
                                             }
                                         >
                                             {results.map(deal => (
-                                                <DealCard key={deal.id} deal={deal} basePath={(activeScan?.stats as any)?.output_dir} />
+                                                <DealCard key={deal.id} deal={deal} basePath={(activeScan?.stats as any)?.output_dir} scanId={scanId} />
                                             ))}
                                         </Carousel>
                                     </div>
@@ -31,7 +31,7 @@ export interface Deal {
 }
 
 export interface ScanResult {
-    status: 'running' | 'complete' | 'failed';
+    status: 'queued' | 'running' | 'complete' | 'failed' | 'cancelled' | 'aborted';
     stage: 'initializing' | 'scraped' | 'analyzed' | 'ranked' | 'complete';
     stats: {
         total_duration_seconds: number;
@@ -43,16 +43,35 @@ export interface ScanResult {
     } | null;
     results: Deal[] | null;
     inventory?: Deal[] | null;
+    early_steals?: Deal[] | null;
 }
 
 export interface Job {
     scan_id: string;
     start_time: string;
     end_time: string | null;
-    status: 'running' | 'complete' | 'failed';
+    status: 'queued' | 'running' | 'complete' | 'failed' | 'cancelled' | 'aborted';
     query?: string;
     location?: string;
     source?: string;
+    total_cost_usd?: number;
+    total_duration_seconds?: number;
+    counts?: {
+        listings: number | null;
+        inventory: number | null;
+        potential_buys: number | null;
+        verified: number | null;
+    };
+}
+
+export interface JobFilters {
+    limit?: number;
+    offset?: number;
+    query?: string;
+    source?: string;
+    status?: string;
+    sort?: 'start_time' | 'end_time' | 'cost' | 'duration' | 'verified' | 'query';
+    order?: 'asc' | 'desc';
 }
 
 // Scans
@@ -67,24 +86,110 @@ export const startScan = async (query: string, location: string, radius: number,
     return response.data;
 };
 
-export const getScanStatus = async (scanId: string): Promise<ScanResult> => {
-    const response = await axios.get(`${API_URL}/scan/${scanId}`);
+// Dashboard polls ask for the card fields only; descriptions come from getScanItem
+export const getScanStatus = async (scanId: string, params: { fields?: string; offset?: number; limit?: number } = { fields: 'card' }): Promise<ScanResult> => {
+    const response = await axios.get(`${API_URL}/scan/${scanId}`, { params });
     return response.data;
 };
 
-export const getScanLog = async (scanId: string): Promise<{ log: string }> => {
-    const response = await axios.get(`${API_URL}/scan/${scanId}/log`);
+export const getScanItem = async (scanId: string, itemId: string): Promise<{ scan_id: string; item: Deal & Record<string, unknown> }> => {
+    const response = await axios.get(`${API_URL}/scan/${scanId}/items/${encodeURIComponent(itemId)}`);
     return response.data;
 };
 
-export const deleteJob = async (scanId: string): Promise<{ status: string }> => {
+export interface LogRecord {
+    ts: string;
+    level: 'DEBUG' | 'INFO' | 'WARNING' | 'ERROR';
+    stage: string | null;
+    msg: string;
+}
+
+export interface ScanLog {
+    log: string;
+    records?: LogRecord[];
+    cursor?: number;      // Pass back as since to get only newer lines
+    start?: number;
+    size?: number;
+    truncated?: boolean;  // Older lines exist before start (first load is a bounded tail)
+    reset?: boolean;      // since was past the end; this is a fresh tail
+}
+
+export const getScanLog = async (scanId: string, filters?: { stage?: string; level?: string; since?: number; tail?: number }): Promise<ScanLog> => {
+    const response = await axios.get(`${API_URL}/scan/${scanId}/log`, { params: filters });
+    return response.data;
+};
+
+// Server-sent events (progress, items, results, log) for one scan; see useScanEvents
+export const scanEventsUrl = (scanId: string) => `${API_URL}/scan/${scanId}/events?fields=card`;
+
+export const formatLogRecord = (record: LogRecord) => `[${record.ts.slice(11, 19)}] ${record.msg}`;
+
+export const cancelScan = async (scanId: string): Promise<{ status: string; scan_id: string }> => {
+    const response = await axios.post(`${API_URL}/scan/${scanId}/cancel`);
+    return response.data;
+};
+
+export interface DeleteJobResult {
+    status: 'deleting';
+    scan_id: string;
+    task_id: string;      // Background purge, see GET /maintenance/tasks/{task_id}
+    cancelled: boolean;   // The scan was still queued and got cancelled first
+}
+
+// 202: the scan is gone at once, files are purged in the background.
+// 409: the scan is running - cancel it (cancelScan) and delete it once it has stopped.
+export const deleteJob = async (scanId: string): Promise<DeleteJobResult> => {
     const response = await axios.delete(`${API_URL}/scan/${scanId}`);
     return response.data;
 };
 
+export const isScanRunningError = (error: unknown) =>
+    axios.isAxiosError(error) && error.response?.status === 409;
+
 // Jobs
-export const getJobs = async (): Promise<{ jobs: Job[] }> => {
-    const response = await axios.get(`${API_URL}/jobs`);
+export const getJobs = async (filters: JobFilters = {}): Promise<{ jobs: Job[]; total: number; limit: number; offset: number }> => {
+    const response = await axios.get(`${API_URL}/jobs`, { params: filters });
+    return response.data;
+};
+
+// Cross-scan search
+export interface SearchResult {
+    scan_id: string;
+    item_id: string;
+    title: string | null;
+    description: string | null;
+    brand_model: string | null;
+    location: string | null;
+    url: string | null;
+    screenshot: string | null;
+    output_dir: string | null;
+    price: number | null;
+    estimated_new_price: number | null;
+    deal_rating: number | null;
+    verified: number;
+    stage: string;
+    query: string | null;
+    scanned_at: string | null;
+}
+
+export interface SearchFilters {
+    q?: string;
+    min_price?: number;
+    max_price?: number;
+    min_rating?: number;
+    max_rating?: number;
+    since?: string;
+    until?: string;
+    days?: number;
+    verified?: boolean;
+    sort?: 'relevance' | 'price' | 'rating' | 'date';
+    order?: 'asc' | 'desc';
+    limit?: number;
+    offset?: number;
+}
+
+export const searchListings = async (filters: SearchFilters): Promise<{ results: SearchResult[]; total: number; total_capped: boolean; limit: number; offset: number }> => {
+    const response = await axios.get(`${API_URL}/search`, { params: filters });
     return response.data;
 };
 
@@ -100,6 +205,10 @@ export interface Schedule {
     time: string;
     email_to: string;
     active: boolean;
+    speculative?: boolean;
+    max_tokens?: number | null;
+    max_cost_usd?: number | null;
+    max_minutes?: number | null;
     last_run?: string;
 }
 
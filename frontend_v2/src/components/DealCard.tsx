@@ -1,4 +1,5 @@
 import { useState } from "react";
+import { useQuery } from "@tanstack/react-query";
 import { ExternalLink, MapPin, Search, AlertTriangle, CheckCircle, Clock } from "lucide-react";
 import { Card, CardFooter } from "@/components/ui/card";
 import { Button } from "@/components/ui/button";
@@ -10,30 +11,41 @@ import {
     DialogTitle,
     DialogDescription,
 } from "@/components/ui/dialog"; // Need to make Dialog component next
+import { getScanItem } from "@/api";
 import type { Deal } from "@/api";
 
 interface DealCardProps {
     deal: Deal;
     basePath?: string;
+    scanId?: string | null;
 }
 
-// Helper to construct image URL
-const getImageUrl = (deal: Deal, basePath?: string) => {
+// Helper to construct image URL (screenshots are served as resized thumbnails of the given width)
+const getImageUrl = (deal: Deal, basePath?: string, width = 480) => {
     if (deal.image_url && deal.image_url.startsWith('http')) return deal.image_url;
     if (deal.screenshot && basePath) {
         const folderName = basePath.split(/[/\\]/).pop();
         if (folderName) {
-            return `${import.meta.env.VITE_API_URL || 'http://localhost:8000'}/data/${folderName}/${deal.screenshot}`;
+            return `${import.meta.env.VITE_API_URL || 'http://localhost:8000'}/thumb/${folderName}/${deal.screenshot}?w=${width}`;
         }
     }
     return null;
 }
 
-export function DealCard({ deal, basePath }: DealCardProps) {
+export function DealCard({ deal, basePath, scanId }: DealCardProps) {
     const [showModal, setShowModal] = useState(false);
     const [imgError, setImgError] = useState(false);
+    // Status polls carry card fields only; load the full item (description) when opened
+    const { data: detail } = useQuery({
+        queryKey: ['scan-item', scanId, deal.id],
+        queryFn: () => getScanItem(scanId!, String(deal.id)),
+        enabled: showModal && !!scanId && !deal.description,
+        staleTime: Infinity,
+    });
+    const description = deal.description || detail?.item.description;
 
     const imageUrl = getImageUrl(deal, basePath);
+    const fullImageUrl = getImageUrl(deal, basePath, 1280);
     const isSteal = deal.ai_analysis?.is_steal;
     const isVerified = deal.verification?.verified;
     const score = deal.verification?.score || deal.deal_rating || 0;
@@ -150,8 +162,8 @@ export function DealCard({ deal, basePath }: DealCardProps) {
                             <Button variant="ghost" size="icon" onClick={() => setShowModal(false)}>✕</Button>
                         </div>
                         <div className="p-6 overflow-y-auto space-y-6">
-                            {imageUrl && (
-                                <img src={imageUrl} className="w-full rounded-lg border bg-muted" alt="Full view" />
+                            {fullImageUrl && (
+                                <img src={fullImageUrl} className="w-full rounded-lg border bg-muted" alt="Full view" />
                             )}
 
                             {/* Stats Grid */}
@@ -237,7 +249,7 @@ export function DealCard({ deal, basePath }: DealCardProps) {
                             <div className="space-y-2 border-t pt-4">
                                 <div className="text-xs text-muted-foreground uppercase font-bold">Description</div>
                                 <p className="text-sm text-muted-foreground whitespace-pre-wrap">
-                                    {deal.description}
+                                    {description}
                                 </p>
                             </div>
                         </div>
@@ -1,26 +1,106 @@
+import { useEffect } from 'react';
 import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
-import { startScan, getScanStatus, getScanLog, getJobs, deleteJob, runSchedule } from '../api';
+import { startScan, getScanStatus, getScanLog, getJobs, deleteJob, cancelScan, isScanRunningError, runSchedule, scanEventsUrl, formatLogRecord } from '../api';
+import type { ScanResult, Deal, LogRecord, ScanLog } from '../api';
+
+const TERMINAL_STATUSES = ['complete', 'failed', 'cancelled', 'aborted'];
+// Consecutive stream errors before falling back to polling
+const MAX_STREAM_ERRORS = 3;
+
+// Pushes /scan/{id}/events into the ['scan', id] and ['scan-log', id] queries.
+// While the stream is up, ['scan-stream', id] is true and both queries stop polling;
+// if EventSource is unavailable or keeps failing, they poll every 2s as before.
+export const useScanEvents = (scanId: string | null) => {
+    const queryClient = useQueryClient();
+
+    useEffect(() => {
+        if (!scanId || typeof EventSource === 'undefined') return;
+        const source = new EventSource(scanEventsUrl(scanId));
+        let errors = 0;
+
+        const setStreaming = (streaming: boolean) => {
+            queryClient.setQueryData(['scan-stream', scanId], streaming);
+            if (!streaming) {
+                // Restart polling where the stream left off
+                queryClient.invalidateQueries({ queryKey: ['scan', scanId] });
+                queryClient.invalidateQueries({ queryKey: ['scan-log', scanId] });
+            }
+        };
+        const updateScan = (update: (old: ScanResult) => ScanResult) =>
+            queryClient.setQueryData<ScanResult>(['scan', scanId], (old) => (old ? update(old) : old));
+        const on = (event: string, handler: (data: any) => void) =>
+            source.addEventListener(event, (e) => handler(JSON.parse((e as MessageEvent).data)));
+
+        source.onopen = () => {
+            errors = 0;
+            setStreaming(true);
+        };
+        source.onerror = () => {
+            // EventSource reconnects by itself (sending Last-Event-ID); give up after a few failures
+            errors += 1;
+            if (errors >= MAX_STREAM_ERRORS) {
+                source.close();
+                setStreaming(false);
+            }
+        };
+
+        on('snapshot', (data: ScanResult) => queryClient.setQueryData(['scan', scanId], data));
+        on('progress', (data: Pick<ScanResult, 'status' | 'stats'>) => updateScan((old) => ({ ...old, ...data })));
+        on('results', (data: Pick<ScanResult, 'stage' | 'results' | 'early_steals'>) => updateScan((old) => ({ ...old, ...data })));
+        on('items', (data: { start: number; items: Deal[] }) =>
+            updateScan((old) => ({ ...old, inventory: [...(old.inventory || []).slice(0, data.start), ...data.items] })));
+        on('log', (data: { records: LogRecord[]; reset: boolean }) =>
+            queryClient.setQueryData<{ log: string }>(['scan-log', scanId], (old) => {
+                const lines = data.records.map(formatLogRecord).join('\n');
+                if (data.reset || !old?.log) return { log: lines };
+                return { log: lines ? `${old.log}\n${lines}` : old.log };
+            }));
+        on('end', () => {
+            // Finished: nothing more to stream or poll
+            source.close();
+            queryClient.setQueryData(['scan-stream', scanId], true);
+        });
+
+        return () => {
+            source.close();
+            queryClient.setQueryData(['scan-stream', scanId], false);
+        };
+    }, [scanId, queryClient]);
+};
 
 export const useScanStatus = (scanId: string | null) => {
+    const queryClient = useQueryClient();
+    useScanEvents(scanId);
     return useQuery({
         queryKey: ['scan', scanId],
         queryFn: () => getScanStatus(scanId!),
         enabled: !!scanId,
         refetchInterval: (query) => {
             const status = query.state.data?.status;
-            if (status === 'complete' || status === 'failed') return false;
-            return 2000; // Poll every 2s while running
+            if (status && TERMINAL_STATUSES.includes(status)) return false;
+            if (queryClient.getQueryData(['scan-stream', scanId])) return false;
+            return 2000; // Poll every 2s while running (no event stream)
         },
     });
 };
 
 export const useScanLog = (scanId: string | null) => {
+    const queryClient = useQueryClient();
     return useQuery({
         queryKey: ['scan-log', scanId],
-        queryFn: () => getScanLog(scanId!),
+        queryFn: async () => {
+            // Polling fallback: after the first (tail) load, fetch only lines past the cursor
+            const old = queryClient.getQueryData<ScanLog>(['scan-log', scanId]);
+            if (old?.cursor === undefined) return getScanLog(scanId!);
+            const chunk = await getScanLog(scanId!, { since: old.cursor });
+            if (chunk.reset || !old.log) return chunk;
+            return { ...chunk, log: chunk.log ? `${old.log}${chunk.log}` : old.log };
+        },
         enabled: !!scanId,
-        refetchInterval: (query) => {
-            // Stop polling log if scan is done? Maybe keep polling for a bit
+        refetchInterval: () => {
+            if (queryClient.getQueryData(['scan-stream', scanId])) return false;
+            const status = queryClient.getQueryData<ScanResult>(['scan', scanId])?.status;
+            if (status && TERMINAL_STATUSES.includes(status)) return false;
             return 2000;
         }
     });
@@ -29,7 +109,7 @@ export const useScanLog = (scanId: string | null) => {
 export const useJobs = () => {
     return useQuery({
         queryKey: ['jobs'],
-        queryFn: getJobs,
+        queryFn: () => getJobs(),
     });
 };
 
@@ -50,6 +130,13 @@ export const useDeleteJob = () => {
         mutationFn: deleteJob,
         onSuccess: () => {
             queryClient.invalidateQueries({ queryKey: ['jobs'] });
+        },
+        onError: async (error, scanId) => {
+            // Running scans can't be deleted until they have stopped
+            if (isScanRunningError(error) && window.confirm('This scan is still running. Cancel it? You can delete it once it has stopped.')) {
+                await cancelScan(scanId);
+                queryClient.invalidateQueries({ queryKey: ['jobs'] });
+            }
         }
     });
 };